@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class NewRecruitmentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Dash'
+
+    def ready(self):
+        # Connects the receiver that pushes live dashboard updates
+        from . import live  # noqa: F401
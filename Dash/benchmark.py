@@ -0,0 +1,206 @@
+"""Reproducible timings of the dashboard pipeline on synthetic data.
+
+``generate`` writes a seeded, synthetic file with the columns and formats of
+``bank_transactions.csv`` (the real file is a Git LFS pointer in most
+checkouts), and ``run`` times every stage of serving ``dashboard``
+from it: the columnar build, parsing, feature derivation, each shared table
+of ``DashboardData``, and each figure's build and HTML serialisation. The
+results are plain JSON, so runs on different commits can be compared with
+``compare`` (see ``manage.py benchmark_dashboard``).
+
+The aggregates come from wherever the dashboard would take them (rollups,
+the Transaction table or the sample); results record which, since only
+like-for-like runs are comparable.
+"""
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import plotly
+from django.conf import settings
+
+from . import columnar, features, figures, schema
+
+BENCHMARK_DIR = getattr(settings, 'BENCHMARK_DIR', os.path.join(settings.BASE_DIR, 'data', 'benchmark'))
+
+SIZES = {'100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+
+# Rows generated (and held in memory) at a time
+GENERATE_CHUNK = 1_000_000
+
+# Shape of the real data: ~0.85 customers per row, ~9k locations with a few
+# big cities taking most rows, and two and a half months of dates
+CUSTOMERS_PER_ROW = 0.85
+LOCATIONS = 9000
+FIRST_DATE = pd.Timestamp('2016-08-01')
+DAYS = 82
+
+CITIES = ['MUMBAI', 'NEW DELHI', 'BANGALORE', 'GURGAON', 'DELHI', 'NOIDA', 'CHENNAI',
+          'PUNE', 'HYDERABAD', 'THANE', 'KOLKATA', 'AHMEDABAD', 'NAVI MUMBAI', 'JAIPUR']
+
+# Relative transaction volume per hour of the day
+HOURLY = [2, 1, 1, 1, 1, 2, 3, 5, 8, 10, 11, 12, 12, 12, 11, 11, 11, 11, 12, 12, 11, 9, 6, 4]
+
+
+def _unpadded(dates):
+    # The real file writes dates as d/m/yy without leading zeros
+    return [f'{d.day}/{d.month}/{d.strftime("%y")}' for d in dates]
+
+
+def _chunk(rng, start, rows, customers, locations):
+    """Rows ``start`` to ``start + rows`` of a synthetic file."""
+    # Squaring a uniform draw gives some customers many transactions
+    customer = (rng.random(rows) ** 2 * len(customers['dob'])).astype(np.int64)
+    dates = _unpadded(FIRST_DATE + pd.to_timedelta(np.arange(DAYS), unit='D'))
+    hour = rng.choice(24, rows, p=np.asarray(HOURLY) / sum(HOURLY))
+    df = pd.DataFrame({
+        'TransactionID': 'T' + pd.Series(np.arange(start + 1, start + rows + 1)).astype(str),
+        'CustomerID': 'C' + pd.Series(customer + 1_000_000).astype(str),
+        'CustomerDOB': customers['dob'][customer],
+        'CustGender': customers['gender'][customer],
+        'CustLocation': locations['names'][rng.choice(len(locations['names']), rows, p=locations['p'])],
+        'CustAccountBalance': np.round(customers['balance'][customer] * rng.lognormal(0, 0.2, rows), 2),
+        'TransactionDate': np.asarray(dates, dtype=object)[rng.integers(0, DAYS, rows)],
+        'TransactionTime': hour * 10000 + rng.integers(0, 60, rows) * 100 + rng.integers(0, 60, rows),
+        'TransactionAmount (INR)': np.round(rng.lognormal(6, 1.6, rows), 2),
+    })
+    # A sprinkling of missing values, as in the real file
+    for name, rate in (('CustomerDOB', 0.003), ('CustGender', 0.001),
+                       ('CustLocation', 0.0002), ('CustAccountBalance', 0.002)):
+        df.loc[rng.random(rows) < rate, name] = None
+    return df
+
+
+def generate(path, rows, seed=0):
+    """Write ``rows`` synthetic transactions to ``path``; same seed, same file."""
+    rng = np.random.default_rng(seed)
+    n_customers = max(1, int(rows * CUSTOMERS_PER_ROW))
+    births = pd.Timestamp('1950-01-01') + pd.to_timedelta(rng.integers(0, 50 * 365, n_customers), unit='D')
+    dob = np.asarray(_unpadded(births), dtype=object)
+    # The real file uses 1/1/1800 for unknown birth dates
+    dob[rng.random(n_customers) < 0.05] = '1/1/1800'
+    customers = {
+        'dob': dob,
+        'gender': rng.choice(np.array(['M', 'F'], dtype=object), n_customers, p=[0.73, 0.27]),
+        'balance': rng.lognormal(10, 2, n_customers),
+    }
+    weights = 1 / np.arange(1, LOCATIONS + 1) ** 1.1
+    locations = {
+        'names': np.array(CITIES + [f'TOWN {i:04d}' for i in range(LOCATIONS - len(CITIES))], dtype=object),
+        'p': weights / weights.sum(),
+    }
+
+    # Written beside the target and renamed, so a half-written file is never reused
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', newline='') as f:
+            for start in range(0, rows, GENERATE_CHUNK):
+                chunk = _chunk(rng, start, min(GENERATE_CHUNK, rows - start), customers, locations)
+                chunk.to_csv(f, header=start == 0, index=False)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
+
+def dataset(size, seed=0):
+    """Path of the synthetic file for ``size`` (a key of ``SIZES``), generated on first use."""
+    path = os.path.join(BENCHMARK_DIR, f'transactions-{size}-seed{seed}.csv')
+    if not os.path.exists(path):
+        generate(path, SIZES[size], seed)
+    return path
+
+
+def _commit():
+    try:
+        head = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=settings.BASE_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f'{head}-dirty' if dirty else head
+
+
+def _timed(stages, name, func):
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    stages[name] = min(elapsed, stages.get(name, elapsed))
+    return result
+
+
+def _request(source, stages):
+    """One unfiltered dashboard render, stage by stage, from a fresh ``DashboardData``."""
+    data = figures.DashboardData(source)
+    for name in ('aggregates', 'customer_aggregates', 'sketches', 'df', 'filtered_df',
+                 'customer_stats', 'customer_value'):
+        _timed(stages, f'data.{name}', lambda: getattr(data, name))
+    for name, builder in figures.FIGURES.items():
+        fig = _timed(stages, f'figure.{name}', lambda: builder(data))
+        if fig is not None:
+            _timed(stages, f'html.{name}', lambda: figures.render_html(fig))
+
+
+def run(source, repeat=1):
+    """Time every stage of serving the dashboard from ``source``.
+
+    The columnar build is timed cold, once; the request stages are the best
+    of ``repeat`` runs. Times are in seconds.
+    """
+    stages = {}
+    shutil.rmtree(columnar._cache_root(source), ignore_errors=True)
+    _timed(stages, 'ingest', lambda: columnar.ensure_cache(source))
+    df, _ = _timed(stages, 'load', lambda: schema.read_csv(source))
+    _timed(stages, 'features', lambda: features.derive(df))
+    del df
+
+    request = {}
+    for _ in range(repeat):
+        _request(source, request)
+    stages.update(request)
+    data = figures.DashboardData(source)
+    return {
+        'rows': columnar.current_manifest(source)['rows'],
+        'source': os.path.basename(source),
+        'commit': _commit(),
+        'created': datetime.now(timezone.utc).isoformat(),
+        'repeat': repeat,
+        'aggregates': data.aggregates.__name__.rsplit('.', 1)[-1] if data.aggregates else 'sample',
+        'environment': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'plotly': plotly.__version__,
+            'cpus': os.cpu_count(),
+        },
+        'request_seconds': round(sum(request.values()), 4),
+        'peak_rss_mib': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'stages': {name: round(seconds, 4) for name, seconds in stages.items()},
+    }
+
+
+def compare(baseline, result):
+    """Per-stage ``(baseline, current, ratio)`` for stages present in both runs."""
+    rows = {}
+    for name, seconds in result['stages'].items():
+        before = baseline['stages'].get(name)
+        if before is not None:
+            rows[name] = (before, seconds, seconds / before if before else float('inf'))
+    return rows
+
+
+def write(result, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(result, f, indent=2)
@@ -0,0 +1,399 @@
+"""Columnar on-disk cache for the transactions CSV.
+
+The CSV is parsed once, with the explicit types in ``schema``, and every
+column is written as a NumPy ``.npy`` file, so later reads memory-map only the
+columns a view asks for instead of text-parsing the whole file. Identifiers
+are stored as integers, dates as days, and other string columns are
+dictionary encoded (integer codes plus a categories array) and come back as
+pandas categoricals. The derived columns from ``features`` are stored the same
+way, next to the source columns.
+
+Each build lives in its own directory named after the source's SHA-256. A
+small ``manifest.json`` next to those directories records the size and mtime
+the current build was made from; when either changes the file is re-hashed
+and the columns are rebuilt if the content really changed.
+
+Builds also carry a partition index over ``DATE_COLUMN``: row numbers grouped
+by transaction month. ``select_rows`` uses it, together with the location
+dictionary, to push date-range and location filters down into the read. They
+also carry the ``sketches`` of the full data, in ``sketches.json``.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from . import features, schema, sketches
+from .signals import transactions_refreshed
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+# File paths
+Transactions = os.path.join(settings.BASE_DIR, 'data', "bank_transactions.csv")
+CACHE_DIR = getattr(settings, 'COLUMNAR_CACHE_DIR', os.path.join(settings.BASE_DIR, 'data', 'cache'))
+
+# Bump when the on-disk layout changes so old builds are ignored
+FORMAT_VERSION = 6
+
+# With snapshots enabled the cache is only (re)built by `manage.py
+# refresh_snapshots`; readers use the last published build and never look at
+# the source file
+REFRESH_ON_READ = not getattr(settings, 'DASHBOARD_SNAPSHOTS', False)
+
+# Columns filters are pushed down on
+DATE_COLUMN = 'TransactionDate'
+LOCATION_COLUMN = 'CustLocation'
+
+# Rows per chunk fed to the sketches built with the cache
+SKETCH_CHUNKSIZE = 500_000
+
+# Serialises builds between threads; ``_file_lock`` does so between processes
+_build_lock = threading.Lock()
+
+
+def _cache_root(source):
+    name = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(CACHE_DIR, name)
+
+
+def _file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    # Write to a sibling temp file and rename so readers never see half a file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+@contextmanager
+def _file_lock(path):
+    """Hold an exclusive lock on ``path`` (created if missing) across processes."""
+    with open(path, 'a+') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    # Retries for about 10 seconds before raising
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _write_partitions(dates, target):
+    # Rows grouped by month; rows with a missing or unparseable date go in a
+    # trailing 'NaT' bucket
+    months = dates.astype('datetime64[M]')
+    missing = np.isnat(months)
+    present, month_codes = np.unique(months[~missing], return_inverse=True)
+    labels = [str(month) for month in present] + ['NaT']
+    row_months = np.full(len(dates), len(labels) - 1, dtype=np.int32)
+    row_months[~missing] = month_codes
+
+    order = np.argsort(row_months, kind='stable')
+    np.save(os.path.join(target, 'partitions.order.npy'), order.astype(np.int64))
+    offsets = np.searchsorted(row_months[order], np.arange(len(labels) + 1))
+    return {'column': DATE_COLUMN, 'months': labels, 'offsets': offsets.tolist()}
+
+
+def _write_columns(source, target):
+    df, ids = schema.read_csv(source)
+    df = df.join(features.derive(df))
+    columns = {}
+    partitions = None
+    for i, name in enumerate(df.columns):
+        series = df[name]
+        if name in ids:
+            prefix, width = ids[name]
+            np.save(os.path.join(target, f'c{i}.npy'), series.to_numpy())
+            columns[name] = {'kind': 'id', 'file': f'c{i}', 'prefix': prefix, 'width': width}
+        elif isinstance(series.dtype, pd.CategoricalDtype):
+            if not series.cat.categories.is_monotonic_increasing:
+                series = series.cat.reorder_categories(series.cat.categories.sort_values())
+            # Codes keep pandas' smallest integer type (int8 for a handful of values)
+            np.save(os.path.join(target, f'c{i}.codes.npy'), series.cat.codes.to_numpy())
+            np.save(os.path.join(target, f'c{i}.categories.npy'), np.asarray(series.cat.categories, dtype=str))
+            columns[name] = {'kind': 'category', 'file': f'c{i}'}
+        elif pd.api.types.is_datetime64_dtype(series.dtype):
+            dates = series.to_numpy().astype('datetime64[D]')
+            np.save(os.path.join(target, f'c{i}.npy'), dates)
+            columns[name] = {'kind': 'date', 'file': f'c{i}'}
+            if name == DATE_COLUMN:
+                partitions = _write_partitions(dates, target)
+        else:
+            np.save(os.path.join(target, f'c{i}.npy'), series.to_numpy())
+            columns[name] = {'kind': 'numeric', 'file': f'c{i}'}
+    _write_json(os.path.join(target, 'sketches.json'), sketches.to_dict(sketches.summarize(
+        df.iloc[start:start + SKETCH_CHUNKSIZE] for start in range(0, len(df), SKETCH_CHUNKSIZE))))
+    return {'format': FORMAT_VERSION, 'rows': len(df), 'columns': columns, 'partitions': partitions}
+
+
+def _build(source, sha256):
+    root = _cache_root(source)
+    target = os.path.join(root, sha256)
+    layout = _read_json(os.path.join(target, 'columns.json'))
+    if layout is not None and layout.get('format') == FORMAT_VERSION:
+        return target
+
+    # Left over from an older format (or a crashed build)
+    shutil.rmtree(target, ignore_errors=True)
+    tmp = tempfile.mkdtemp(dir=root, prefix='.build-')
+    try:
+        layout = _write_columns(source, tmp)
+        _write_json(os.path.join(tmp, 'columns.json'), layout)
+        try:
+            os.rename(tmp, target)
+        except OSError:
+            # Another worker finished the same build first
+            pass
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return target
+
+
+def _prune(root, keep):
+    for entry in os.listdir(root):
+        path = os.path.join(root, entry)
+        if entry not in keep and os.path.isdir(path) and not entry.startswith('.'):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _is_current(manifest, stat, root):
+    return (manifest is not None and manifest.get('format') == FORMAT_VERSION
+            and manifest['size'] == stat.st_size and manifest['mtime_ns'] == stat.st_mtime_ns
+            and os.path.isdir(os.path.join(root, manifest['sha256'])))
+
+
+def ensure_cache(source=Transactions):
+    """Return the manifest of an up-to-date columnar build of ``source``."""
+    root = _cache_root(source)
+    manifest_path = os.path.join(root, 'manifest.json')
+    stat = os.stat(source)
+
+    manifest = _read_json(manifest_path)
+    if _is_current(manifest, stat, root):
+        return manifest
+
+    os.makedirs(root, exist_ok=True)
+    # Only one worker, in any process, hashes and rebuilds a changed source;
+    # the others wait and then find its manifest current
+    with _build_lock, _file_lock(os.path.join(root, '.lock')):
+        manifest = _read_json(manifest_path)
+        if _is_current(manifest, stat, root):
+            return manifest
+        previous = manifest['sha256'] if manifest else None
+
+        sha256 = _file_sha256(source)
+        target = _build(source, sha256)
+        layout = _read_json(os.path.join(target, 'columns.json'))
+        manifest = {
+            'format': FORMAT_VERSION,
+            'source': os.path.abspath(source),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': sha256,
+            'rows': layout['rows'],
+        }
+        _write_json(manifest_path, manifest)
+        # Keep the previous build for readers that picked up the old manifest
+        _prune(root, {sha256, previous})
+    if sha256 != previous:
+        transactions_refreshed.send(sender=ensure_cache, source=source)
+    return manifest
+
+
+class NotBuilt(LookupError):
+    """No columnar build of the source has been published yet."""
+
+
+def published(source=Transactions):
+    """Manifest of the last published build, without checking the source."""
+    root = _cache_root(source)
+    manifest = _read_json(os.path.join(root, 'manifest.json'))
+    if manifest is None or manifest.get('format') != FORMAT_VERSION:
+        raise NotBuilt(f"No columnar build of {os.path.basename(source)} has been published")
+    return manifest
+
+
+def current_manifest(source=Transactions):
+    """Manifest of the build readers should use (see ``REFRESH_ON_READ``)."""
+    return ensure_cache(source) if REFRESH_ON_READ else published(source)
+
+
+def data_version(source=Transactions):
+    """Content hash of the build currently backing ``source``."""
+    return current_manifest(source)['sha256']
+
+
+def _current_build(source):
+    manifest = current_manifest(source)
+    target = os.path.join(_cache_root(source), manifest['sha256'])
+    return target, _layout(target)
+
+
+@lru_cache(maxsize=8)
+def _layout(target):
+    # Builds are immutable, so their layout can be cached by directory
+    return _read_json(os.path.join(target, 'columns.json'))
+
+
+def select_rows(source=Transactions, start=None, end=None, locations=None):
+    """Row numbers matching a date range and/or a set of locations.
+
+    ``start`` and ``end`` are inclusive dates. Only the month partitions that
+    overlap the range are read, and locations are matched on dictionary codes
+    rather than strings. Returns None when there is nothing to filter on.
+    """
+    if start is None and end is None and not locations:
+        return None
+    target, layout = _current_build(source)
+    rows = None
+
+    if start is not None or end is not None:
+        partitions = layout['partitions']
+        first = pd.Period(start, 'M').strftime('%Y-%m') if start is not None else ''
+        last = pd.Period(end, 'M').strftime('%Y-%m') if end is not None else '9999-12'
+        order = np.load(os.path.join(target, 'partitions.order.npy'), mmap_mode='r')
+        offsets = partitions['offsets']
+        pieces = [order[offsets[i]:offsets[i + 1]] for i, month in enumerate(partitions['months'])
+                  if month != 'NaT' and first <= month <= last]
+        rows = np.sort(np.concatenate(pieces)) if pieces else np.empty(0, dtype=np.int64)
+
+        # Exact bounds within the kept partitions
+        dates = np.load(os.path.join(target, layout['columns'][DATE_COLUMN]['file'] + '.npy'), mmap_mode='r')[rows]
+        keep = np.ones(len(rows), dtype=bool)
+        if start is not None:
+            keep &= dates >= np.datetime64(start, 'D')
+        if end is not None:
+            keep &= dates <= np.datetime64(end, 'D')
+        rows = rows[keep]
+
+    if locations:
+        meta = layout['columns'][LOCATION_COLUMN]
+        categories = np.load(os.path.join(target, meta['file'] + '.categories.npy'))
+        wanted = np.append(np.isin(categories, list(locations)), False)
+        codes = np.load(os.path.join(target, meta['file'] + '.codes.npy'), mmap_mode='r')
+        if rows is None:
+            rows = np.flatnonzero(wanted[codes])
+        else:
+            rows = rows[wanted[codes[rows]]]
+    return rows
+
+
+def load_sketches(source=Transactions):
+    """Full-data top-K and quantile sketches of ``source`` (see ``sketches.summarize``)."""
+    target, _ = _current_build(source)
+    return _sketches(target)
+
+
+@lru_cache(maxsize=8)
+def _sketches(target):
+    return sketches.from_dict(_read_json(os.path.join(target, 'sketches.json')))
+
+
+def distinct_values(column, source=Transactions):
+    """Distinct values of a dictionary-encoded column, sorted."""
+    target, layout = _current_build(source)
+    return np.load(os.path.join(target, layout['columns'][column]['file'] + '.categories.npy'))
+
+
+def load_columns(columns=None, source=Transactions, rows=None):
+    """Load ``columns`` (all of them by default) from the columnar cache.
+
+    Numeric and identifier columns are memory-mapped (identifiers as the
+    integers ``schema.encode_ids`` made of them, see ``format_ids``), string
+    columns are returned as categoricals built from their dictionary codes
+    and dates as datetime64. ``rows`` restricts the read to those row numbers
+    (see ``select_rows``).
+    """
+    target, layout = _current_build(source)
+
+    if columns is None:
+        columns = list(layout['columns'])
+    missing = [name for name in columns if name not in layout['columns']]
+    if missing:
+        raise KeyError(f"Columns not found in {os.path.basename(source)}: {missing}")
+
+    data = {}
+    for name in columns:
+        meta = layout['columns'][name]
+        base = os.path.join(target, meta['file'])
+        if meta['kind'] == 'category':
+            codes = np.load(base + '.codes.npy', mmap_mode='r')
+            if rows is not None:
+                codes = codes[rows]
+            data[name] = pd.Categorical.from_codes(codes, np.load(base + '.categories.npy'))
+        elif meta['kind'] == 'date':
+            values = np.load(base + '.npy', mmap_mode='r')
+            data[name] = (values[rows] if rows is not None else values).astype('datetime64[ns]')
+        else:
+            values = np.load(base + '.npy', mmap_mode='r')
+            data[name] = values[rows] if rows is not None else values
+    # copy=False keeps each column as its own (memory-mapped) block
+    return pd.DataFrame(data, columns=columns, copy=False)
+
+
+def format_ids(column, values, source=Transactions):
+    """Identifier strings for values of ``column`` as returned by ``load_columns``."""
+    _, layout = _current_build(source)
+    meta = layout['columns'][column]
+    if meta['kind'] != 'id':
+        return np.asarray(values, dtype=str).astype(object)
+    return schema.format_ids(values, meta['prefix'], meta['width'])
+
+
+def with_ids_formatted(df, source=Transactions):
+    """Copy of ``df`` with every identifier column back in string form."""
+    _, layout = _current_build(source)
+    ids = {name: format_ids(name, df[name], source) for name in df.columns
+           if layout['columns'].get(name, {}).get('kind') == 'id'}
+    return df.assign(**ids)
+
+
+def iter_chunks(columns=None, source=Transactions, chunksize=500_000, rows=None):
+    """Yield ``columns`` from the cache as consecutive DataFrame chunks.
+
+    At least one chunk is yielded, empty if ``rows`` selects nothing, so
+    consumers still see the columns and their dtypes.
+    """
+    df = load_columns(columns, source=source, rows=rows)
+    for start in range(0, max(len(df), 1), chunksize):
+        yield df.iloc[start:start + chunksize]
@@ -1,68 +1,216 @@
+import hashlib
+import json
 import os
+import shutil
+import tempfile
+import threading
+import numpy as np
 import pandas as pd
 import dash
-from dash import dcc, html
-from dash.dependencies import Input, Output
+from dash import Patch, dcc, html, no_update
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 from django_plotly_dash import DjangoDash
 from django.conf import settings
 import plotly.express as px
 
+from . import columnar
+
 # File path for the data (Ensure this path is correct)
 file_path = os.path.join(settings.BASE_DIR, "data", "StaffJoinedbanklastmonth.xlsx")
-df = pd.read_excel(file_path)
+
+# The parsed workbook, kept in memory and as a columnar copy on disk, both
+# keyed on the file's size and mtime so an edited workbook is picked up
+_loaded = {'key': None, 'df': None}
+_load_lock = threading.Lock()
+
+
+def _write_frame(df, target):
+    columns = {}
+    for i, name in enumerate(df.columns):
+        series = df[name]
+        if series.dtype == object:
+            # Text (or mixed) cells are stored dictionary-encoded
+            series = series.where(series.isna(), series.astype(str)).astype('category')
+            np.save(os.path.join(target, f'c{i}.codes.npy'), series.cat.codes.to_numpy())
+            np.save(os.path.join(target, f'c{i}.categories.npy'), np.asarray(series.cat.categories, dtype=str))
+            columns[str(name)] = {'kind': 'category', 'file': f'c{i}'}
+        else:
+            np.save(os.path.join(target, f'c{i}.npy'), series.to_numpy())
+            columns[str(name)] = {'kind': 'numeric', 'file': f'c{i}'}
+    columnar._write_json(os.path.join(target, 'columns.json'), {'columns': columns})
+
+
+def _read_frame(target):
+    layout = columnar._read_json(os.path.join(target, 'columns.json'))
+    if layout is None:
+        return None
+    data = {}
+    for name, meta in layout['columns'].items():
+        base = os.path.join(target, meta['file'])
+        if meta['kind'] == 'category':
+            data[name] = pd.Categorical.from_codes(np.load(base + '.codes.npy'), np.load(base + '.categories.npy'))
+        else:
+            data[name] = np.load(base + '.npy', allow_pickle=False)
+    return pd.DataFrame(data)
+
+
+def load_staff(path=None):
+    """The staff workbook as a DataFrame, parsed on first use and after it changes."""
+    path = path or file_path
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if _loaded['key'] == key:
+        return _loaded['df']
+
+    with _load_lock:
+        if _loaded['key'] == key:
+            return _loaded['df']
+        root = os.path.join(columnar.CACHE_DIR, os.path.splitext(os.path.basename(path))[0])
+        target = os.path.join(root, f'{stat.st_size}-{stat.st_mtime_ns}')
+        df = _read_frame(target)
+        if df is None:
+            # Only this parse goes through openpyxl; later loads (in any
+            # process) read the columnar copy
+            parsed = pd.read_excel(path)
+            os.makedirs(root, exist_ok=True)
+            tmp = tempfile.mkdtemp(dir=root, prefix='.build-')
+            try:
+                _write_frame(parsed, tmp)
+                os.rename(tmp, target)
+            except OSError:
+                # Another worker finished the same copy first
+                pass
+            finally:
+                shutil.rmtree(tmp, ignore_errors=True)
+            for entry in os.listdir(root):
+                if entry != os.path.basename(target) and not entry.startswith('.'):
+                    shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+            # Served from the copy, so the first load has the same dtypes as later ones
+            df = _read_frame(target)
+            if df is None:
+                df = parsed
+        _loaded['df'], _loaded['key'] = df, key
+    return df
+
 
 # Initialize the Dash app with external Plotly stylesheet
 app = DjangoDash('StaffDashboard', external_stylesheets=['https://cdnjs.cloudflare.com/ajax/libs/plotly.js/2.11.1/plotly.min.css'])
 
-# Function to create graphs
-def create_graphs(df):
-    graphs = []
-    # Debugging the dataframe to ensure it has data and columns
-    print(f"Dataframe columns: {df.columns}")
-    print(f"Dataframe head: {df.head()}")
-
-    # Graph 1: Staff Rank Distribution by Gender
-    count_data = df.groupby(['RANK', 'Gender']).size().reset_index(name='Count')
-    fig1 = px.bar(count_data, x='RANK', y='Count', color='Gender', barmode='group',
-                  title="Staff Rank Distribution by Gender")
-    graphs.append(dcc.Graph(figure=fig1, style={'height': '400px'}))
-
-    # Graph 2: Staff Location Distribution by Gender
-    location_data = df.groupby(['Location', 'Gender']).size().reset_index(name='Count')
-    fig2 = px.bar(location_data, x='Location', y='Count', color='Gender', barmode='group',
-                  title="Staff Location Distribution by Gender")
-    graphs.append(dcc.Graph(figure=fig2, style={'height': '400px'}))
-
-    # Graph 3: Staff Designation Distribution by Gender
-    designation_data = df.groupby(['Designation', 'Gender']).size().reset_index(name='Count')
-    fig3 = px.bar(designation_data, x='Designation', y='Count', color='Gender', barmode='group',
-                  title="Staff Designation Distribution by Gender")
-    graphs.append(dcc.Graph(figure=fig3, style={'height': '400px'}))
-
-    # Graph 4: Staff Region Distribution by Gender
-    region_data = df.groupby(['LOC_NAME', 'Gender']).size().reset_index(name='Count')
-    fig4 = px.bar(region_data, x='LOC_NAME', y='Count', color='Gender', barmode='group',
-                  title="Staff Region Distribution by Gender")
-    graphs.append(dcc.Graph(figure=fig4, style={'height': '400px'}))
-
-    # Return the list of graphs
-    print(f"Created {len(graphs)} graphs")  # Debugging line
-    return graphs
+# Charted dimensions, each broken down by Gender
+DIMENSIONS = {
+    'RANK': "Staff Rank Distribution by Gender",
+    'Location': "Staff Location Distribution by Gender",
+    'Designation': "Staff Designation Distribution by Gender",
+    'LOC_NAME': "Staff Region Distribution by Gender",
+}
+
+# How often open pages check the workbook for changes
+REFRESH_SECONDS = getattr(settings, 'STAFF_DASHBOARD_REFRESH_SECONDS', 60)
+
+# Figures of the current workbook version (see staff_figures)
+_figures = {'key': None, 'graphs': None}
+
+
+def crosstabs(df):
+    """Staff counts of every dimension by Gender, counted in one pass.
+
+    Each row's (dimension value, gender) pair of every dimension becomes one
+    slot of a single array, so one ``bincount`` does all the counting.
+    Returns ``{dimension: DataFrame}`` indexed by value with one column per
+    gender; values with no staff of known gender are left out.
+    """
+    gender = df['Gender'].astype('category')
+    genders = gender.cat.categories
+    gender_codes = gender.cat.codes.to_numpy()
+
+    keys, spans = [], {}
+    offset = 0
+    for name in DIMENSIONS:
+        column = df[name].astype('category')
+        codes = column.cat.codes.to_numpy()
+        known = (codes >= 0) & (gender_codes >= 0)
+        keys.append(offset + codes[known].astype(np.int64) * len(genders) + gender_codes[known])
+        spans[name] = (offset, column.cat.categories)
+        offset += len(column.cat.categories) * len(genders)
+    counts = np.bincount(np.concatenate(keys), minlength=offset)
+
+    tables = {}
+    for name, (start, values) in spans.items():
+        table = pd.DataFrame(counts[start:start + len(values) * len(genders)].reshape(len(values), len(genders)),
+                             index=pd.Index(values, name=name), columns=pd.Index(genders, name='Gender'))
+        tables[name] = table[table.sum(axis=1) > 0]
+    return tables
+
+
+def _fingerprint(*parts):
+    return hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()[:16]
+
+
+def _graph(name, table):
+    counts = table.stack().rename('Count').reset_index()
+    fig = px.bar(counts, x=name, y='Count', color='Gender', barmode='group', title=DIMENSIONS[name])
+    return {
+        'figure': json.loads(fig.to_json()),
+        # Traces are one per gender over the same x values, so a figure with
+        # the same layout token only needs its y arrays replaced
+        'y': [table[gender].tolist() for gender in table.columns],
+        'layout': _fingerprint(name, table.index.tolist(), table.columns.tolist()),
+        'data': _fingerprint(name, table.index.tolist(), table.columns.tolist(), table.to_numpy().tolist()),
+    }
+
+
+def staff_figures():
+    """Figure JSON of every graph for the current workbook, built once per version."""
+    df = load_staff()
+    key = _loaded['key']
+    if _figures['key'] != key:
+        tables = crosstabs(df)
+        _figures['graphs'] = {f'graph-{name.lower()}': _graph(name, table) for name, table in tables.items()}
+        _figures['key'] = key
+    return _figures['graphs']
+
 
 # Layout of the app
 app.layout = html.Div([
     html.H1("Staff Analytics Dashboard", style={'text-align': 'center'}),
-    # Placeholder for the graphs, dynamically updated via callback
-    html.Div(id='graphs-container', style={'display': 'grid', 'grid-template-columns': '1fr 1fr', 'gap': '20px', 'padding': '20px'})
+    dcc.Interval(id='refresh-interval', interval=REFRESH_SECONDS * 1000),
+    # Version tokens of the figures this page already shows
+    dcc.Store(id='figure-versions'),
+    html.Div(
+        id='graphs-container',
+        children=[dcc.Graph(id=f'graph-{name.lower()}', style={'height': '400px'}) for name in DIMENSIONS],
+        style={'display': 'grid', 'grid-template-columns': '1fr 1fr', 'gap': '20px', 'padding': '20px'},
+    ),
 ])
 
-# Callback to dynamically update the graphs
+# Callback to fill the graphs on load and refresh them when the workbook changes
 @app.callback(
-    Output('graphs-container', 'children'),
-    Input('dummy-input', 'value')  # This is a dummy input to trigger the callback
+    [Output(f'graph-{name.lower()}', 'figure') for name in DIMENSIONS] + [Output('figure-versions', 'data')],
+    Input('refresh-interval', 'n_intervals'),
+    State('figure-versions', 'data'),
 )
-def update_graphs(dummy_input):
-    return create_graphs(df)  # Generate the graphs dynamically
+def update_graphs(n_intervals, versions):
+    versions = versions or {}
+    graphs = staff_figures()
+    updates = []
+    for graph_id in (f'graph-{name.lower()}' for name in DIMENSIONS):
+        graph, shown = graphs[graph_id], versions.get(graph_id, {})
+        if shown.get('data') == graph['data']:
+            # Unchanged: nothing is sent for this graph
+            updates.append(no_update)
+        elif shown.get('layout') == graph['layout']:
+            # Same bars, new counts: send just the y values
+            patch = Patch()
+            for i, y in enumerate(graph['y']):
+                patch['data'][i]['y'] = y
+            updates.append(patch)
+        else:
+            updates.append(graph['figure'])
+    if all(update is no_update for update in updates):
+        raise PreventUpdate
+    versions = {graph_id: {'layout': graph['layout'], 'data': graph['data']} for graph_id, graph in graphs.items()}
+    return updates + [versions]
 
 # Ensure the app is running in Django
 if __name__ == '__main__':
@@ -0,0 +1,144 @@
+"""Exact full-data aggregation over byte ranges of the transactions CSV.
+
+The file is cut into newline-aligned byte ranges. Each range is parsed and
+reduced to a ``Partial`` in a process pool: counts and amounts per
+(day, location, hour) bucket, plus count, amount and first and last
+transaction date per customer. Partials merge associatively (sums add,
+first/last take min/max), so ranges can finish in any order and the result
+is exact. These are the same aggregates ``rollups`` keeps.
+
+Each worker holds one range of text at a time, so peak memory is about
+``workers * range_bytes`` plus the merged aggregates, whatever the file size.
+"""
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+from django.conf import settings
+
+from . import features, schema
+
+WORKERS = getattr(settings, 'AGGREGATION_WORKERS', None) or os.cpu_count()
+
+# Size of one unit of work; each worker parses one range at a time
+RANGE_BYTES = 64 * 2 ** 20
+
+COLUMNS = ['TransactionID', 'CustomerID', 'CustLocation', 'TransactionDate', 'TransactionTime', 'TransactionAmount (INR)']
+
+
+def byte_ranges(path, range_bytes=RANGE_BYTES):
+    """``(start, end)`` offsets covering every data line of ``path``.
+
+    The header is skipped and every range ends just after a newline, so each
+    holds whole lines only.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        start = len(f.readline())
+        ranges = []
+        while start < size:
+            f.seek(min(start + range_bytes, size))
+            f.readline()  # run on to the end of the line we landed in
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+class Partial:
+    """Aggregates of some of the file's rows; see ``merge``."""
+
+    def __init__(self, buckets, customers, rows=0, last=(-1, '')):
+        self.buckets = buckets        # (date, location, hour) -> transaction_count, amount_total
+        self.customers = customers    # customer_id -> transaction_count, amount_total, first_transaction, last_transaction
+        self.rows = rows
+        self.last = last              # (end offset, TransactionID) of the last row seen
+
+    @property
+    def last_transaction_id(self):
+        return self.last[1]
+
+    def merge(self, other):
+        buckets = pd.concat([self.buckets, other.buckets])
+        customers = pd.concat([self.customers, other.customers])
+        return Partial(
+            buckets.groupby(level=[0, 1, 2], sort=False).sum(),
+            customers.groupby(level=0, sort=False).agg({
+                'transaction_count': 'sum',
+                'amount_total': 'sum',
+                'first_transaction': 'min',
+                'last_transaction': 'max',
+            }),
+            self.rows + other.rows,
+            max(self.last, other.last),
+        )
+
+
+def _empty():
+    buckets = pd.DataFrame(
+        {'transaction_count': pd.Series(dtype='int64'), 'amount_total': pd.Series(dtype='float64')},
+        index=pd.MultiIndex.from_arrays([[], [], []], names=['date', 'location', 'hour']),
+    )
+    customers = pd.DataFrame({
+        'transaction_count': pd.Series(dtype='int64'),
+        'amount_total': pd.Series(dtype='float64'),
+        'first_transaction': pd.Series(dtype='datetime64[ns]'),
+        'last_transaction': pd.Series(dtype='datetime64[ns]'),
+    }, index=pd.Index([], name='customer_id'))
+    return Partial(buckets, customers)
+
+
+def aggregate_range(path, start, end, header):
+    """Parse ``path[start:end]`` and reduce it to a ``Partial``."""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start)
+    df = pd.read_csv(io.BytesIO(text), header=None, names=header, usecols=COLUMNS, dtype={
+        'TransactionID': str, 'CustomerID': str, 'CustLocation': 'category',
+        'TransactionDate': 'category', 'TransactionTime': 'category', 'TransactionAmount (INR)': 'float64',
+    })
+    if df.empty:
+        return _empty()
+    last = (end, str(df['TransactionID'].iloc[-1]))
+
+    rows = pd.DataFrame({
+        'date': schema.parse_dates(df['TransactionDate']),
+        'location': df['CustLocation'],
+        'hour': features.seconds_of_day(df['TransactionTime']) // 3600,
+        'customer_id': df['CustomerID'],
+        'amount': df['TransactionAmount (INR)'].fillna(0),
+    })
+    rows = rows[rows['date'].notna() & rows['location'].notna() & rows['customer_id'].notna() & (rows['hour'] >= 0)]
+
+    buckets = rows.groupby(['date', 'location', 'hour'], observed=True, sort=False).agg(
+        transaction_count=('amount', 'size'),
+        amount_total=('amount', 'sum'),
+    )
+    buckets.index = buckets.index.set_levels(buckets.index.levels[1].astype(str), level=1)
+    customers = rows.groupby('customer_id', sort=False).agg(
+        transaction_count=('amount', 'size'),
+        amount_total=('amount', 'sum'),
+        first_transaction=('date', 'min'),
+        last_transaction=('date', 'max'),
+    )
+    return Partial(buckets, customers, len(df), last)
+
+
+def aggregate(path, workers=None, range_bytes=RANGE_BYTES):
+    """Aggregate every row of ``path`` using ``workers`` processes."""
+    workers = workers or WORKERS
+    header = pd.read_csv(path, nrows=0).columns.tolist()
+    ranges = byte_ranges(path, range_bytes)
+    result = _empty()
+    if workers <= 1 or len(ranges) <= 1:
+        for start, end in ranges:
+            result = result.merge(aggregate_range(path, start, end, header))
+        return result
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+        futures = [pool.submit(aggregate_range, path, start, end, header) for start, end in ranges]
+        # Fold partials in as they finish so only a few are alive at once
+        for future in as_completed(futures):
+            result = result.merge(future.result())
+    return result
@@ -0,0 +1,117 @@
+"""Derived columns computed once when the columnar cache is built.
+
+``derive`` takes the typed frame from ``schema.read_csv`` and returns the
+per-row features the dashboard used to recompute on every request. They are
+stored alongside the source columns, so views load them like any other
+column. Everything is integer arithmetic on parsed dates and times; rows
+with a missing date or time get -1 in the integer features, which
+``missing_as_na`` turns into NA for charting.
+"""
+import numpy as np
+import pandas as pd
+
+FEATURE_COLUMNS = [
+    'TransactionMonth', 'TransactionDayOfWeek', 'TransactionHour',
+    'AccountBalanceChange', 'CustomerTenure',
+]
+
+# Integer features stored with -1 for a missing date or time (see ``missing_as_na``)
+INTEGER_FEATURES = ['TransactionDayOfWeek', 'TransactionHour', 'CustomerTenure']
+
+# 1970-01-01 was a Thursday (pandas dayofweek 3)
+_EPOCH_DAYOFWEEK = 3
+
+
+def _days(dates):
+    """Days since the epoch as int64, and a mask of missing dates."""
+    days = dates.to_numpy().astype('datetime64[D]')
+    missing = np.isnat(days)
+    return days.astype(np.int64), missing
+
+
+def seconds_of_day(times):
+    """Seconds since midnight for ``HH:MM:SS`` strings or ``HHMMSS`` integers.
+
+    Categoricals are parsed once per distinct value; -1 marks missing or
+    unparseable times.
+    """
+    times = pd.Series(times)
+    if isinstance(times.dtype, pd.CategoricalDtype):
+        parsed = seconds_of_day(times.cat.categories.to_series())
+        codes = times.cat.codes.to_numpy()
+        return np.where(codes >= 0, parsed[codes], -1).astype(np.int32)
+
+    numeric = pd.to_numeric(times, errors='coerce')
+    if numeric.notna().sum() >= times.notna().sum():
+        # HHMMSS stored as a number, e.g. 143207
+        hhmmss = np.nan_to_num(numeric.to_numpy(dtype=np.float64), nan=-1).astype(np.int64)
+        seconds = hhmmss // 10000 * 3600 + hhmmss // 100 % 100 * 60 + hhmmss % 100
+        seconds[hhmmss < 0] = -1
+    else:
+        seconds = pd.to_timedelta(times, errors='coerce').dt.total_seconds().fillna(-1).to_numpy().astype(np.int64)
+    return seconds.astype(np.int32)
+
+
+def _months(days, missing):
+    months = days.astype('datetime64[D]').astype('datetime64[M]')
+    labels = pd.Categorical(np.where(missing, None, months.astype(str)))
+    return labels.remove_unused_categories()
+
+
+def _by_customer(customers, values):
+    # Stable sort keeps each customer's rows in file order
+    order = np.argsort(customers, kind='stable')
+    sorted_customers = customers[order]
+    starts = np.ones(len(order), dtype=bool)
+    starts[1:] = sorted_customers[1:] != sorted_customers[:-1]
+    return order, starts, values[order]
+
+
+def _balance_change(customers, balances):
+    """Change in account balance since the customer's previous transaction."""
+    order, starts, sorted_balances = _by_customer(customers, balances)
+    change = np.zeros(len(order), dtype=np.float64)
+    change[1:] = np.diff(sorted_balances)
+    change[starts] = 0
+    change[np.isnan(change)] = 0
+    result = np.empty_like(change)
+    result[order] = change
+    return result
+
+
+def _tenure(customers, days, missing):
+    """Days since the customer's first transaction."""
+    days = np.where(missing, np.iinfo(np.int64).max, days)
+    order, starts, sorted_days = _by_customer(customers, days)
+    group = np.cumsum(starts) - 1
+    first = np.minimum.reduceat(sorted_days, np.flatnonzero(starts)) if len(order) else sorted_days
+    tenure = np.empty(len(order), dtype=np.int64)
+    tenure[order] = sorted_days - first[group]
+    return np.where(missing, -1, tenure).astype(np.int32)
+
+
+def derive(df):
+    """Feature columns for the typed frame ``df``, indexed like it."""
+    days, missing = _days(df['TransactionDate'])
+    customers = df['CustomerID']
+    customers = customers.cat.codes.to_numpy() if isinstance(customers.dtype, pd.CategoricalDtype) else customers.to_numpy()
+    hours = seconds_of_day(df['TransactionTime']) // 3600
+    return pd.DataFrame({
+        'TransactionMonth': _months(days, missing),
+        'TransactionDayOfWeek': np.where(missing, -1, (days + _EPOCH_DAYOFWEEK) % 7).astype(np.int8),
+        'TransactionHour': np.where(hours >= 0, hours, -1).astype(np.int8),
+        'AccountBalanceChange': _balance_change(customers, df['CustAccountBalance'].to_numpy(dtype=np.float64)),
+        'CustomerTenure': _tenure(customers, days, missing),
+    }, index=df.index)
+
+
+def missing_as_na(df):
+    """Replace the -1s in ``df``'s ``INTEGER_FEATURES`` with NA, in place.
+
+    The columns become nullable ``Int``s, so groupby and value_counts leave
+    those rows out instead of charting a -1 bucket.
+    """
+    for column in INTEGER_FEATURES:
+        if column in df:
+            values = df[column]
+            df[column] = values.where(values >= 0).astype(f'Int{values.dtype.itemsize * 8}')
@@ -0,0 +1,97 @@
+"""Cache of serialised dashboard figures.
+
+Entries live in the ``figures`` cache alias (see ``CACHES`` in settings) and
+are keyed on the data version, the figure name and the request's filter
+parameters, so a refresh of the transactions data naturally misses. The
+local-memory backend evicts least-recently-used entries once ``MAX_ENTRIES``
+is reached and expires entries after ``TIMEOUT`` seconds. Hit and miss
+counts are kept per process.
+
+The data version itself is recorded here too (``version``), so requests
+that only revalidate what they already have read one cache entry instead of
+working the version out from the data.
+"""
+import hashlib
+import json
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.dispatch import receiver
+
+from .signals import transactions_refreshed
+
+CACHE_ALIAS = 'figures'
+
+# Seconds a recorded data version is trusted. Refreshes drop it at once, but
+# only from a cache they share: with the per-process local-memory backend a
+# refresh run by a management command is picked up once this runs out
+VERSION_TIMEOUT = getattr(settings, 'DASHBOARD_VERSION_TIMEOUT', 60)
+
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+_stats_lock = threading.Lock()
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _count(event):
+    with _stats_lock:
+        _stats[event] += 1
+
+
+def make_key(version, name, params=None):
+    params = json.dumps(params or {}, sort_keys=True, default=str)
+    digest = hashlib.sha1(params.encode()).hexdigest()[:12]
+    return f"fig:{version}:{name}:{digest}"
+
+
+def get_or_build(version, name, build, params=None, timeout=None):
+    """Return the cached value for this figure, calling ``build()`` on a miss.
+
+    ``timeout`` overrides the alias' default TTL for this entry.
+    """
+    key = make_key(version, name, params)
+    value = _cache().get(key)
+    if value is not None:
+        _count('hits')
+        return value
+    _count('misses')
+    value = build()
+    if timeout is None:
+        _cache().set(key, value)
+    else:
+        _cache().set(key, value, timeout)
+    return value
+
+
+def version(source, compute):
+    """Data version of ``source`` as recorded in the cache.
+
+    ``compute()`` works it out and is only called when none is recorded, i.e.
+    on first use and after a refresh.
+    """
+    key = make_key('current', 'data-version', {'source': source})
+    value = _cache().get(key)
+    if value is None:
+        value = compute()
+        _cache().set(key, value, VERSION_TIMEOUT)
+    return value
+
+
+def invalidate():
+    """Drop every cached figure."""
+    _cache().clear()
+    _count('invalidations')
+
+
+def stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+@receiver(transactions_refreshed)
+def _on_refresh(sender, **kwargs):
+    # Also drops the recorded data versions
+    invalidate()
@@ -0,0 +1,576 @@
+"""Chart builders for the transactions dashboard.
+
+Every chart is a function registered in ``FIGURES`` under the template
+variable it fills. Builders take a ``DashboardData``, which loads the sampled
+rows and the tables derived from them lazily, so charts served from the
+figure cache never touch the data at all.
+"""
+import os
+import threading
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from django.conf import settings
+
+from . import columnar, features, figure_cache, queries, rollups, sampling, timing
+from .filters import TransactionFilter
+
+Transactions = os.path.join(settings.BASE_DIR, 'data', "bank_transactions.csv")
+
+# Columns the dashboard actually uses; everything else stays on disk
+DASHBOARD_COLUMNS = [
+    'TransactionID', 'CustomerID', 'CustLocation', 'CustAccountBalance',
+    'TransactionDate', 'TransactionTime', 'TransactionAmount (INR)',
+]
+
+SAMPLE_RATE = getattr(settings, 'DASHBOARD_SAMPLE_RATE', 0.01)
+SAMPLE_SEED = getattr(settings, 'DASHBOARD_SAMPLE_SEED', 42)
+
+# 'static': charts reference the shared js/plotly.min.js asset loaded once by
+# the page; 'inline': every chart embeds its own copy of plotly.js
+PLOTLYJS_MODE = getattr(settings, 'DASHBOARD_PLOTLYJS', 'static')
+
+# Above this many customers the segmentation chart is drawn as a fixed-size
+# grid of customer counts plus the top customers by CLV, not one marker each
+SEGMENTATION_MAX_POINTS = getattr(settings, 'DASHBOARD_SEGMENTATION_MAX_POINTS', 2000)
+SEGMENTATION_BINS = 40
+SEGMENTATION_OUTLIERS = 100
+
+TOP_LOCATIONS = ['MUMBAI', 'NEW DELHI', 'DELHI', 'BANGALORE', 'GURGAON']
+
+DAY_MAP = {0: 'Monday', 1: 'Tuesday', 2: 'Wednesday',
+           3: 'Thursday', 4: 'Friday', 5: 'Saturday', 6: 'Sunday'}
+
+# Template variable -> builder, in page order
+FIGURES = {}
+
+
+def figure(name):
+    def register(builder):
+        FIGURES[name] = builder
+        return builder
+    return register
+
+
+def data_version(source=Transactions):
+    """Token that changes whenever the data behind the figures changes."""
+    return f"{columnar.data_version(source)[:16]}-{rollups.version(source)}-{queries.version()}"
+
+
+def current_version(source=Transactions):
+    """``data_version``, read from the figure cache unless the data was refreshed."""
+    return figure_cache.version(source, lambda: data_version(source))
+
+
+def render_html(fig):
+    """Serialise ``fig`` as a bootstrap div plus its figure JSON.
+
+    In ``'static'`` mode plotly.js itself is left out; the page loads it
+    once from static files instead of once per chart.
+    """
+    return fig.to_html(full_html=False, include_plotlyjs=PLOTLYJS_MODE != 'static')
+
+
+def to_html(name, data):
+    """Build figure ``name`` and serialise it; empty if it has no data."""
+    with timing.stage('build', figure=name):
+        fig = FIGURES[name](data)
+    if fig is None:
+        return ''
+    with timing.stage('html', figure=name):
+        return render_html(fig)
+
+
+def to_json(name, data):
+    """Build figure ``name`` as a Plotly JSON spec; empty if it has no data."""
+    with timing.stage('build', figure=name):
+        fig = FIGURES[name](data)
+    if fig is None:
+        return ''
+    with timing.stage('json', figure=name):
+        return fig.to_json()
+
+
+class shared_property(cached_property):
+    """``cached_property`` computed once even when builders run in threads."""
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        cache = instance.__dict__
+        if self.attrname not in cache:
+            with instance._lock:
+                lock = instance._property_locks.setdefault(self.attrname, threading.Lock())
+            with lock:
+                if self.attrname not in cache:
+                    with timing.stage(f'data.{self.attrname}'):
+                        cache[self.attrname] = self.func(instance)
+        return cache[self.attrname]
+
+
+class DashboardData:
+    """Rows and intermediate tables shared by the figure builders.
+
+    Builders may run concurrently (see ``scheduler``), so everything they
+    share is a ``shared_property``.
+    """
+
+    def __init__(self, source=Transactions, filters=None):
+        self.source = source
+        self.filters = filters or TransactionFilter()
+        self._lock = threading.Lock()
+        self._property_locks = {}
+
+    @shared_property
+    def aggregates(self):
+        # Pure sums and counts are computed over all rows by the database:
+        # from the precomputed rollup tables once `manage.py refresh_rollups`
+        # has populated them, else from the indexed Transaction table once
+        # `manage.py load_transactions` has. None means use the sample.
+        if rollups.available(self.source):
+            return rollups
+        if queries.available():
+            return queries
+        return None
+
+    @shared_property
+    def customer_aggregates(self):
+        # Customer rollups aren't broken down by date or location
+        if self.aggregates is rollups and not self.filters:
+            return rollups
+        if queries.available():
+            return queries
+        return None
+
+    @shared_property
+    def sketches(self):
+        # Full-data top-K and quantile sketches built with the columnar cache;
+        # they cover every row, so only unfiltered pages can use them
+        if self.filters:
+            return None
+        return columnar.load_sketches(self.source)
+
+    @property
+    def filter_kwargs(self):
+        return {'start': self.filters.start, 'end': self.filters.end, 'locations': self.filters.locations}
+
+    @property
+    def locations(self):
+        """Locations the temporal charts focus on."""
+        return list(self.filters.locations) or TOP_LOCATIONS
+
+    @property
+    def locations_label(self):
+        return 'Selected Locations' if self.filters.locations else 'Top Locations'
+
+    @shared_property
+    def df(self):
+        # Date and location filters are pushed down into the columnar read
+        rows = columnar.select_rows(self.source, self.filters.start, self.filters.end, self.filters.locations)
+        rate = SAMPLE_RATE
+        if rows is not None:
+            # Keep the expected sample size of an unfiltered page, so narrow
+            # filters are served from (up to) every matching row
+            total = columnar.current_manifest(self.source)['rows']
+            rate = min(1.0, SAMPLE_RATE * total / max(len(rows), 1))
+
+        # Single pass over the cached columns keeping ~1% of rows; a fixed seed
+        # gives the same sample (and the same charts) on every page load
+        df = sampling.bernoulli_sample(
+            columnar.iter_chunks(DASHBOARD_COLUMNS + features.FEATURE_COLUMNS, source=self.source, rows=rows),
+            rate=rate,
+            seed=SAMPLE_SEED,
+        )
+
+        df.rename(columns={
+            'TransactionAmount (INR)': 'TransactionAmount',
+            'CustAccountBalance': 'AccountBalance'
+        }, inplace=True)
+
+        # Month, weekday, hour, balance change and tenure were derived at
+        # ingest (see features.py) over every row, not just the sample
+        df['TransactionMonth'] = df['TransactionMonth'].cat.remove_unused_categories()
+        features.missing_as_na(df)
+        return df
+
+    @shared_property
+    def filtered_df(self):
+        # Temporal Patterns (Filtered for top or selected locations)
+        filtered_df = self.df[self.df['CustLocation'].isin(self.locations)].copy()
+        filtered_df['DayOfWeek'] = filtered_df['TransactionDayOfWeek'].map(DAY_MAP)
+        filtered_df['TransactionMonth'] = filtered_df['TransactionMonth'].cat.remove_unused_categories()
+        return filtered_df
+
+    @shared_property
+    def customer_stats(self):
+        customer_stats = self.df.groupby('CustomerID', observed=True).agg(
+            TotalTransactions=('TransactionID', 'count'),
+            TotalAmount=('TransactionAmount', 'sum'),
+            AverageTransactionAmount=('TransactionAmount', 'mean'),
+            LastTransactionDate=('TransactionDate', 'max')
+        ).reset_index()
+        customer_stats['CustomerID'] = columnar.format_ids('CustomerID', customer_stats['CustomerID'], self.source)
+
+        # Calculate CLV
+        customer_stats['CLV'] = customer_stats['TotalAmount']
+
+        # High Value Transactions flag (top 20%)
+        high_value_threshold = customer_stats['TotalAmount'].quantile(0.8)
+        customer_stats['HighValueCustomer'] = (customer_stats['TotalAmount'] >= high_value_threshold).astype(int)
+        return customer_stats
+
+    @shared_property
+    def customer_value(self):
+        if self.customer_aggregates:
+            return self.customer_aggregates.customer_value(20, quantile=0.8, **self.filter_kwargs)
+        customer_stats = self.customer_stats
+        top_clv = customer_stats.nlargest(20, 'CLV')
+        segment_counts = customer_stats['HighValueCustomer'].value_counts().rename_axis('HighValueCustomer').reset_index(name='Customers')
+        return top_clv, segment_counts
+
+
+# Top Locations by Transaction Amount
+@figure('fig')
+def top_locations(data):
+    if data.aggregates:
+        transaction_amount_per_location = data.aggregates.location_totals(**data.filter_kwargs)
+    elif data.sketches:
+        transaction_amount_per_location = data.sketches['locations'].top(20).rename(
+            columns={'key': 'CustLocation', 'total': 'TransactionAmount'})
+    else:
+        transaction_amount_per_location = data.df.groupby('CustLocation', observed=True)['TransactionAmount'].sum().reset_index()
+    top_20_transaction_amounts = transaction_amount_per_location.nlargest(20, 'TransactionAmount')
+    fig = px.bar(top_20_transaction_amounts,
+                 x='TransactionAmount',
+                 y='CustLocation',
+                 orientation='h',
+                 color='TransactionAmount',
+                 color_continuous_scale='Blues',
+                 title='Top 20 Customer Locations by Total Transaction Amount',
+                 labels={'TransactionAmount': 'Total Transaction Amount (INR)', 'CustLocation': 'Customer Location'},
+                 height=600)
+    fig.update_layout(plot_bgcolor='white')
+    return fig
+
+
+# Top Customers by Transaction Amount
+@figure('fig1')
+def top_customers(data):
+    if data.customer_aggregates:
+        top_customers = data.customer_aggregates.customer_totals(20, **data.filter_kwargs)
+    elif data.sketches:
+        top_customers = data.sketches['customers'].top(20).rename(columns={'key': 'CustomerID', 'total': 'TransactionAmount'})
+        top_customers['CustomerID'] = columnar.format_ids('CustomerID', top_customers['CustomerID'], data.source)
+    else:
+        top_customers = data.df.groupby('CustomerID', observed=True)['TransactionAmount'].sum().nlargest(20).reset_index()
+        top_customers['CustomerID'] = columnar.format_ids('CustomerID', top_customers['CustomerID'], data.source)
+    fig1 = px.bar(top_customers,
+                  x='CustomerID',
+                  y='TransactionAmount',
+                  title='Top 20 Customers by Total Transaction Amount',
+                  labels={'TransactionAmount': 'Total Transaction Amount (INR)', 'CustomerID': 'Customer ID'},
+                  color='TransactionAmount',
+                  color_continuous_scale='Blues')
+    fig1.update_layout(plot_bgcolor='white', xaxis_tickangle=-45)
+    return fig1
+
+
+# Monthly Transactions
+@figure('fig_month')
+def monthly_transactions(data):
+    if data.aggregates:
+        month_counts = data.aggregates.transaction_counts('month', data.locations, data.filters.start, data.filters.end)
+    else:
+        month_counts = data.filtered_df['TransactionMonth'].value_counts().sort_index().reset_index()
+        month_counts.columns = ['Month', 'TotalTransactions']
+    fig_month = px.bar(month_counts, x='Month', y='TotalTransactions',
+                       title=f'Monthly Transaction Count ({data.locations_label})',
+                       color='TotalTransactions',
+                       color_continuous_scale='Blues')
+    fig_month.update_layout(plot_bgcolor='white')
+    return fig_month
+
+
+# Daily Transactions
+@figure('fig_day')
+def daily_transactions(data):
+    if data.aggregates:
+        day_counts = data.aggregates.transaction_counts('weekday', data.locations, data.filters.start, data.filters.end)
+        day_counts['DayOfWeek'] = day_counts['DayOfWeek'].map(DAY_MAP)
+    else:
+        day_counts = data.filtered_df['DayOfWeek'].value_counts().reindex(list(DAY_MAP.values()), fill_value=0).reset_index()
+        day_counts.columns = ['DayOfWeek', 'TotalTransactions']
+    fig_day = px.bar(day_counts, x='DayOfWeek', y='TotalTransactions',
+                     title=f'Daily Transaction Pattern ({data.locations_label})',
+                     color='TotalTransactions',
+                     color_continuous_scale='Blues')
+    fig_day.update_layout(plot_bgcolor='white')
+    return fig_day
+
+
+# Hourly Transactions for top locations
+@figure('fig_hour')
+def hourly_transactions(data):
+    if data.aggregates:
+        hour_counts = data.aggregates.transaction_counts('hour', data.locations, data.filters.start, data.filters.end)
+    else:
+        hour_counts = data.filtered_df['TransactionHour'].value_counts().sort_index().reset_index()
+        hour_counts.columns = ['Hour', 'TotalTransactions']
+    fig_hour = px.bar(hour_counts, x='Hour', y='TotalTransactions',
+                      title=f'Hourly Transaction Pattern ({data.locations_label})',
+                      color='TotalTransactions',
+                      color_continuous_scale='Blues')
+    fig_hour.update_layout(plot_bgcolor='white')
+    return fig_hour
+
+
+# Hourly Transactions (Entire Bank)
+@figure('fig_hour_e')
+def hourly_transactions_all(data):
+    if data.aggregates:
+        hour_counts_e = data.aggregates.transaction_counts('hour', **data.filter_kwargs)
+    else:
+        hour_counts_e = data.df['TransactionHour'].value_counts().sort_index().reset_index()
+        hour_counts_e.columns = ['Hour', 'TotalTransactions']
+    fig_hour_e = px.bar(hour_counts_e, x='Hour', y='TotalTransactions',
+                        title=f"Hourly Transaction Pattern ({'Selected' if data.filters.locations else 'All'} Locations)",
+                        color='TotalTransactions',
+                        color_continuous_scale='Blues')
+    fig_hour_e.update_layout(plot_bgcolor='white')
+    return fig_hour_e
+
+
+# Peak Hours Analysis
+@figure('fig_peak_hours')
+def peak_hours(data):
+    df = data.df
+    peak_hours = list(range(9, 21))
+
+    peak_hour_transactions = df[df['TransactionHour'].isin(peak_hours)]
+    peak_hour_balance_change = peak_hour_transactions.groupby('TransactionHour')['AccountBalanceChange'].mean().reset_index()
+    fig_peak_hours = px.bar(peak_hour_balance_change,
+                            x='TransactionHour',
+                            y='AccountBalanceChange',
+                            title='Average Account Balance change During Peak Hours (9AM-9PM)',
+                            color='AccountBalanceChange',
+                            color_continuous_scale='Blues')
+    fig_peak_hours.update_layout(plot_bgcolor='white')
+    return fig_peak_hours
+
+
+# Peak Days Analysis
+@figure('fig_peak_days')
+def peak_days(data):
+    peak_day_balance_change = data.df.groupby('TransactionDayOfWeek')['AccountBalanceChange'].mean().reset_index()
+    peak_day_balance_change['DayOfWeek'] = peak_day_balance_change['TransactionDayOfWeek'].map(DAY_MAP)
+    fig_peak_days = px.bar(peak_day_balance_change,
+                           x='DayOfWeek',
+                           y='AccountBalanceChange',
+                           title='Average Account Balance change by Day of Week',
+                           color='AccountBalanceChange',
+                           color_continuous_scale='Blues')
+    fig_peak_days.update_layout(plot_bgcolor='white')
+    return fig_peak_days
+
+
+# Heatmap by Hour and Day
+@figure('fig_peak_hour_day')
+def peak_hour_day(data):
+    peak_hour_day_balance_change = data.df.groupby(['TransactionHour', 'TransactionDayOfWeek'])['AccountBalanceChange'].mean().reset_index()
+    peak_hour_day_balance_change['DayOfWeek'] = peak_hour_day_balance_change['TransactionDayOfWeek'].map(DAY_MAP)
+    fig_peak_hour_day = px.density_heatmap(peak_hour_day_balance_change,
+                                           x='TransactionHour',
+                                           y='DayOfWeek',
+                                           z='AccountBalanceChange',
+                                           title='Account Balance change Heatmap by Hour and Day',
+                                           color_continuous_scale='Blues')
+    fig_peak_hour_day.update_layout(plot_bgcolor='white')
+    return fig_peak_hour_day
+
+
+# Customer Lifetime Value
+@figure('fig_clv')
+def customer_lifetime_value(data):
+    top_clv, _ = data.customer_value
+    fig_clv = px.bar(top_clv,
+                     x='CustomerID',
+                     y='CLV',
+                     title='Top 20 Customers by Lifetime Value',
+                     color='HighValueCustomer',
+                     color_continuous_scale='Blues')
+    fig_clv.update_layout(plot_bgcolor='white')
+    return fig_clv
+
+
+# High Value Transactions Over Time
+@figure('fig_high_value')
+def high_value_transactions(data):
+    if data.sketches:
+        # Full-data threshold, and per-month counts above it, from the sketches
+        threshold = data.sketches['amounts'].quantile(0.9)
+        high_value_monthly = pd.DataFrame(
+            [(month, round(sketch.n * (1 - sketch.rank(threshold))))
+             for month, sketch in sorted(data.sketches['amounts_by_month'].items())],
+            columns=['Month', 'HighValueTransactions'])
+    else:
+        df = data.df
+        high_value = df['TransactionAmount'] >= df['TransactionAmount'].quantile(0.9)
+        high_value_monthly = df[high_value].groupby('TransactionMonth', observed=True).size().reset_index()
+        high_value_monthly.columns = ['Month', 'HighValueTransactions']
+    high_value_monthly['Month'] = high_value_monthly['Month'].astype(str)
+    fig_high_value = px.line(high_value_monthly,
+                             x='Month',
+                             y='HighValueTransactions',
+                             title='High-Value Transactions Over Time',
+                             markers=True)
+    fig_high_value.update_layout(plot_bgcolor='white')
+    return fig_high_value
+
+
+# High Value Customer Segmentation
+@figure('fig_pie')
+def high_value_segments(data):
+    _, segment_counts = data.customer_value
+    fig_pie = px.pie(segment_counts,
+                     names='HighValueCustomer',
+                     values='Customers',
+                     title='High-Value Customer Segmentation',
+                     color='HighValueCustomer',
+                     color_discrete_map={0: 'lightgray', 1: 'gold'})
+    fig_pie.update_layout(plot_bgcolor='white')
+    return fig_pie
+
+
+# Revenue vs Transactions
+@figure('fig_revenue_transactions')
+def revenue_transactions(data):
+    if data.aggregates:
+        monthly_data = data.aggregates.monthly_totals(**data.filter_kwargs)
+    else:
+        monthly_data = data.df.groupby('TransactionMonth', observed=True).agg(
+            TotalRevenue=('TransactionAmount', 'sum'),
+            TotalTransactions=('TransactionID', 'count')
+        ).reset_index()
+        monthly_data['TransactionMonth'] = monthly_data['TransactionMonth'].astype(str)
+    fig_revenue_transactions = px.line(monthly_data,
+                                       x='TransactionMonth',
+                                       y=['TotalRevenue', 'TotalTransactions'],
+                                       title='Revenue vs Transactions Over Time',
+                                       markers=True)
+    fig_revenue_transactions.update_layout(plot_bgcolor='white')
+    return fig_revenue_transactions
+
+
+# Customer Tenure Analysis
+@figure('fig_tenure_trans')
+def tenure_transactions(data):
+    tenure_data = data.df.groupby('CustomerTenure')['TransactionAmount'].sum().reset_index()
+    fig_tenure_trans = px.line(tenure_data,
+                               x='CustomerTenure',
+                               y='TransactionAmount',
+                               title='Transaction Volume by Customer Tenure')
+    fig_tenure_trans.update_layout(plot_bgcolor='white')
+    return fig_tenure_trans
+
+
+def _segmentation_grid(stats):
+    """Customers binned by (TotalTransactions, AverageTransactionAmount) plus the top CLV outliers."""
+    x = stats['TotalTransactions'].to_numpy(dtype=np.float64)
+    y = stats['AverageTransactionAmount'].to_numpy(dtype=np.float64)
+    clv = stats['CLV'].to_numpy(dtype=np.float64)
+
+    # One column per transaction count while that fits, then even bins;
+    # amounts are heavy-tailed, so their bins are log-spaced. An empty frame
+    # still gets a (single, empty) column
+    x_low, x_high = (x.min(), x.max()) if len(x) else (0.0, 0.0)
+    if x_high - x_low < SEGMENTATION_BINS:
+        x_edges = np.arange(x_low, x_high + 2) - 0.5
+    else:
+        x_edges = np.linspace(x_low, x_high, SEGMENTATION_BINS + 1)
+    positive = y[y > 0]
+    low = positive.min() if len(positive) else 1.0
+    y_edges = np.geomspace(low, max(y.max(initial=low), low * 1.01), SEGMENTATION_BINS + 1)
+    y = np.clip(y, y_edges[0], y_edges[-1])
+
+    counts, _, _ = np.histogram2d(x, y, bins=[x_edges, y_edges])
+    clv_totals, _, _ = np.histogram2d(x, y, bins=[x_edges, y_edges], weights=clv)
+    fig = go.Figure(go.Heatmap(
+        x=x_edges, y=y_edges,
+        z=np.where(counts.T > 0, counts.T, np.nan),
+        customdata=clv_totals.T,
+        colorscale='Blues',
+        colorbar={'title': 'Customers'},
+        hovertemplate='Customers: %{z}<br>Total CLV: %{customdata:,.0f}<extra></extra>',
+        name='Customers',
+    ))
+
+    outliers = stats.nlargest(SEGMENTATION_OUTLIERS, 'CLV')
+    # Sized relative to the top CLV; without a positive one they all get the base size
+    top = outliers['CLV'].max()
+    sizes = 6 + 18 * np.sqrt(outliers['CLV'].clip(lower=0) / top) if top > 0 else np.full(len(outliers), 6.0)
+    fig.add_trace(go.Scattergl(
+        x=outliers['TotalTransactions'],
+        y=outliers['AverageTransactionAmount'],
+        mode='markers',
+        marker={'size': sizes, 'color': 'gold',
+                'line': {'width': 1, 'color': 'black'}},
+        customdata=np.column_stack([outliers['CustomerID'], outliers['CLV']]),
+        hovertemplate='%{customdata[0]}<br>Transactions: %{x}<br>Average: %{y:,.2f}<br>CLV: %{customdata[1]:,.0f}<extra></extra>',
+        name=f'Top {len(outliers)} customers by CLV',
+    ))
+    fig.update_layout(title='Customer Segmentation', xaxis_title='TotalTransactions',
+                      yaxis_title='AverageTransactionAmount', yaxis_type='log')
+    return fig
+
+
+# Customer Segmentation
+@figure('fig_segmentation')
+def customer_segmentation(data):
+    if data.customer_aggregates:
+        # Every customer, not just those in the sample
+        stats = data.customer_aggregates.customer_activity(**data.filter_kwargs)
+        stats['AverageTransactionAmount'] = stats['CLV'] / stats['TotalTransactions'].clip(lower=1)
+        stats['HighValueCustomer'] = (stats['CLV'] >= stats['CLV'].quantile(0.8)).astype(int)
+    else:
+        stats = data.customer_stats
+    if stats.empty:
+        return None
+    if len(stats) > SEGMENTATION_MAX_POINTS:
+        fig_segmentation = _segmentation_grid(stats)
+        fig_segmentation.update_layout(plot_bgcolor='white')
+        return fig_segmentation
+
+    fig_segmentation = px.scatter(stats,
+                                  x='TotalTransactions',
+                                  y='AverageTransactionAmount',
+                                  size='CLV',
+                                  color='HighValueCustomer',
+                                  title='Customer Segmentation',
+                                  hover_data=['CustomerID'])
+    fig_segmentation.update_layout(plot_bgcolor='white')
+    return fig_segmentation
+
+
+# Age Group Analysis
+@figure('fig_age')
+def age_groups(data):
+    # The sample only has DASHBOARD_COLUMNS, so don't load it just to find
+    # there is no age to chart
+    if 'CustAge' not in DASHBOARD_COLUMNS:
+        return None
+    df = data.df
+    age_group = pd.cut(df['CustAge'], bins=[0, 25, 40, 55, 100],
+                       labels=['<25', '25-40', '40-55', '55+'])
+    age_data = df.groupby(age_group.rename('AgeGroup')).agg(
+        AvgTransactionAmount=('TransactionAmount', 'mean'),
+        TotalCustomers=('CustomerID', 'nunique')
+    ).reset_index()
+    fig_age = px.bar(age_data,
+                     x='AgeGroup',
+                     y='AvgTransactionAmount',
+                     title='Average Transaction Amount by Age Group')
+    fig_age.update_layout(plot_bgcolor='white')
+    return fig_age
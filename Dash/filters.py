@@ -0,0 +1,56 @@
+"""Dashboard filters taken from the request's query string.
+
+``?start=2016-08-01&end=2016-08-07&location=MUMBAI&location=DELHI`` selects an
+inclusive date range and any number of locations; every part is optional.
+"""
+from dataclasses import dataclass
+from datetime import date
+
+from django.utils.http import urlencode
+
+
+@dataclass(frozen=True)
+class TransactionFilter:
+    start: date = None
+    end: date = None
+    locations: tuple = ()
+
+    @classmethod
+    def from_request(cls, request):
+        """Parse the filter parameters; raises ValueError on bad input."""
+        params = request.GET
+        start = _parse_date(params.get('start'), 'start')
+        end = _parse_date(params.get('end'), 'end')
+        if start and end and start > end:
+            raise ValueError("'start' must not be after 'end'")
+        locations = tuple(sorted({value.strip() for value in params.getlist('location') if value.strip()}))
+        return cls(start, end, locations)
+
+    def __bool__(self):
+        return bool(self.start or self.end or self.locations)
+
+    def as_params(self):
+        """JSON-friendly form, used in cache keys."""
+        return {
+            'start': self.start.isoformat() if self.start else None,
+            'end': self.end.isoformat() if self.end else None,
+            'locations': list(self.locations),
+        }
+
+    def querystring(self):
+        params = []
+        if self.start:
+            params.append(('start', self.start.isoformat()))
+        if self.end:
+            params.append(('end', self.end.isoformat()))
+        params.extend(('location', location) for location in self.locations)
+        return urlencode(params)
+
+
+def _parse_date(value, name):
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"'{name}' must be a date in YYYY-MM-DD format") from None
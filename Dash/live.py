@@ -0,0 +1,147 @@
+"""Live dashboard updates over WebSockets.
+
+Unfiltered dashboard pages connect to ``/ws/dashboard/``
+(``DashboardConsumer``), which adds them to the ``GROUP`` channel-layer
+group. Whenever a rollup refresh commits newly appended transactions,
+``delta`` summarises just those rows and the summary is sent to the group:
+
+* ``hours``: new transactions per hour of the day (the whole-bank hourly
+  chart),
+* ``locations``: the new total amount of the locations the rows touched,
+  read from the rollups; only the top ``TOP_LOCATIONS`` are sent, since no
+  other touched location can enter the top locations chart,
+* ``high_value``: new transactions at or above the high-value chart's
+  threshold, counted per month, and the largest of them.
+
+The page applies these with ``Plotly.restyle`` and ``Plotly.extendTraces``
+instead of reloading, and the work per update grows with the new rows, not
+with the data. When the rollups are rebuilt rather than appended to, pages
+are told to reload.
+
+The refresh commands run in their own process, so the web server and the
+commands must share a channel layer (``CHANNEL_LAYERS``, e.g.
+``channels_redis``) for updates to arrive; the in-memory layer only reaches
+pages served by the process doing the refresh.
+"""
+import logging
+
+import pandas as pd
+from asgiref.sync import async_to_sync
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.dispatch import receiver
+
+from . import columnar, rollups
+from .signals import transactions_appended
+
+logger = logging.getLogger(__name__)
+
+ENABLED = getattr(settings, 'DASHBOARD_LIVE_UPDATES', False)
+
+GROUP = 'dashboard-live'
+
+# Bars of the top locations chart (see figures.top_locations)
+TOP_LOCATIONS = 20
+# Quantile of all amounts above which a transaction is high-value, as in
+# figures.high_value_transactions
+HIGH_VALUE_QUANTILE = 0.9
+# New high-value transactions listed per update
+HIGH_VALUE_LISTED = 20
+
+
+def high_value_threshold(source=columnar.Transactions):
+    """Amount from which a transaction counts as high-value, or None without sketches."""
+    try:
+        return columnar.load_sketches(source)['amounts'].quantile(HIGH_VALUE_QUANTILE)
+    except (columnar.NotBuilt, OSError):
+        return None
+
+
+def _location_totals(locations):
+    # Batched to stay below SQLite's limit on bound parameters
+    totals = {}
+    for start in range(0, len(locations), rollups.QUERY_BATCH):
+        batch = rollups.location_totals(locations=locations[start:start + rollups.QUERY_BATCH])
+        totals.update(zip(batch['CustLocation'], batch['TransactionAmount']))
+    return totals
+
+
+def delta(rows, source=columnar.Transactions):
+    """Chart updates for newly appended ``rows`` (CSV column names).
+
+    Must run after the rows are folded into the rollups, whose location
+    totals it reports.
+    """
+    amounts = rows['TransactionAmount (INR)'].fillna(0).astype(float)
+    hours = rows['TransactionHour']
+    hour_counts = hours[hours >= 0].astype(int).value_counts().sort_index()
+
+    touched = rows['CustLocation'].dropna().astype(str).unique().tolist()
+    totals = _location_totals(touched)
+    top = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:TOP_LOCATIONS]
+
+    update = {
+        'type': 'delta',
+        'rows': len(rows),
+        'hours': {'x': hour_counts.index.tolist(), 'y': hour_counts.tolist()},
+        'locations': {'y': [location for location, _ in top], 'x': [total for _, total in top]},
+        'high_value': None,
+    }
+    threshold = high_value_threshold(source)
+    if threshold is not None:
+        high = rows[(amounts >= threshold) & rows['TransactionDate'].notna()]
+        months = high['TransactionDate'].dt.strftime('%Y-%m').value_counts().sort_index()
+        largest = high.assign(amount=amounts[high.index]).nlargest(HIGH_VALUE_LISTED, 'amount')
+        update['high_value'] = {
+            'threshold': threshold,
+            'months': {'x': months.index.tolist(), 'y': months.tolist()},
+            'transactions': [
+                {
+                    'id': str(row.TransactionID),
+                    'customer': str(row.CustomerID),
+                    'location': '' if pd.isna(row.CustLocation) else str(row.CustLocation),
+                    'date': row.TransactionDate.strftime('%Y-%m-%d'),
+                    'amount': row.amount,
+                }
+                for row in largest[['TransactionID', 'CustomerID', 'CustLocation', 'TransactionDate', 'amount']]
+                .itertuples(index=False)
+            ],
+        }
+    return update
+
+
+def broadcast(update):
+    """Send ``update`` to every connected dashboard page."""
+    layer = get_channel_layer()
+    if layer is not None:
+        async_to_sync(layer.group_send)(GROUP, {'type': 'dashboard.update', 'update': update})
+
+
+@receiver(transactions_appended)
+def _on_append(sender, source, rows, **kwargs):
+    if not ENABLED:
+        return
+    try:
+        broadcast({'type': 'reload'} if rows is None else delta(rows, source))
+    except Exception:
+        # A lost update must not fail the refresh that triggered it
+        logger.exception("Failed to send live dashboard update")
+
+
+class DashboardConsumer(AsyncJsonWebsocketConsumer):
+    """Pushes ``delta`` updates to an open dashboard page; receives nothing."""
+
+    async def connect(self):
+        if not ENABLED:
+            await self.close()
+            return
+        await self.channel_layer.group_add(GROUP, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if ENABLED:
+            await self.channel_layer.group_discard(GROUP, self.channel_name)
+
+    async def dashboard_update(self, event):
+        await self.send_json(event['update'])
@@ -0,0 +1,44 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand
+
+from Dash import benchmark
+
+
+class Command(BaseCommand):
+    help = "Time every stage of the dashboard on seeded synthetic transactions and write the results as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', nargs='+', choices=list(benchmark.SIZES), default=['100k'],
+                            help="Dataset sizes to benchmark (default: 100k).")
+        parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic data.")
+        parser.add_argument('--repeat', type=int, default=3,
+                            help="Request stages report the best of this many runs.")
+        parser.add_argument('--output', default=None,
+                            help="Directory for the results (default: BENCHMARK_DIR/results).")
+        parser.add_argument('--compare', default=None, help="Earlier results file to compare against.")
+
+    def handle(self, *args, **options):
+        output = options['output'] or os.path.join(benchmark.BENCHMARK_DIR, 'results')
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+
+        for size in options['rows']:
+            self.stdout.write(f"Benchmarking {size} rows...")
+            result = benchmark.run(benchmark.dataset(size, options['seed']), repeat=options['repeat'])
+            path = os.path.join(output, f"{size}-{result['commit'] or 'unknown'}.json")
+            benchmark.write(result, path)
+
+            if baseline is not None and baseline['rows'] == result['rows']:
+                for name, (before, after, ratio) in benchmark.compare(baseline, result).items():
+                    flag = self.style.ERROR if ratio > 1.1 else self.style.SUCCESS if ratio < 0.9 else str
+                    self.stdout.write(flag(f"  {name:<40} {before * 1000:10.1f} -> {after * 1000:10.1f} ms  x{ratio:.2f}"))
+            else:
+                for name, seconds in result['stages'].items():
+                    self.stdout.write(f"  {name:<40} {seconds * 1000:10.1f} ms")
+            self.stdout.write(self.style.SUCCESS(
+                f"{size}: request {result['request_seconds']:.2f}s, ingest {result['stages']['ingest']:.2f}s, "
+                f"peak RSS {result['peak_rss_mib']:.0f} MiB ({result['aggregates']}); wrote {path}"))
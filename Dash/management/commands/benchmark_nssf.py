@@ -0,0 +1,63 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from Dash import benchmark, nssf
+
+
+def _batches(frame, size):
+    for start in range(0, len(frame), size):
+        yield frame.iloc[start:start + size].copy()
+
+
+class Command(BaseCommand):
+    help = "Time the NSSF EOD reconciliation on synthetic statements and write the results as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', nargs='+', type=int, default=[100_000, 1_000_000],
+                            help="Statement sizes to benchmark (default: 100000 1000000).")
+        parser.add_argument('--unmatched', type=float, default=0.05,
+                            help="Fraction of statement entries without an EOD record.")
+        parser.add_argument('--arraysize', type=int, default=nssf.ARRAYSIZE, help="Rows per batch.")
+        parser.add_argument('--output', default=None,
+                            help="Directory for the results (default: BENCHMARK_DIR/results).")
+
+    def handle(self, *args, **options):
+        output = options['output'] or os.path.join(benchmark.BENCHMARK_DIR, 'results')
+        size = options['arraysize']
+        for rows in options['rows']:
+            eod, statement = nssf.synthetic_day(rows, unmatched=options['unmatched'])
+            stages = {}
+
+            started = time.perf_counter()
+            keys = nssf.MatchKeys()
+            for batch in _batches(eod, size):
+                keys.add(batch['BANK'])
+            keys.index
+            stages['keys'] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            for batch in _batches(statement, size):
+                nssf.statement_records(batch, keys)
+            stages['match'] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            with open(os.devnull, 'w') as f:
+                summary = nssf.reconcile(_batches(eod, size), _batches(statement, size), f)
+            stages['reconcile'] = time.perf_counter() - started
+
+            result = {
+                'rows': rows,
+                'unmatched': summary['unmatched'],
+                'records': summary['records'],
+                'arraysize': size,
+                'commit': benchmark._commit(),
+                'rows_per_second': round(rows / stages['reconcile']),
+                'stages': {name: round(seconds, 4) for name, seconds in stages.items()},
+            }
+            path = os.path.join(output, f"nssf-{rows}-{result['commit'] or 'unknown'}.json")
+            benchmark.write(result, path)
+            self.stdout.write(self.style.SUCCESS(
+                f"{rows:,} rows: keys {stages['keys']:.2f}s, match {stages['match']:.2f}s, "
+                f"reconcile {stages['reconcile']:.2f}s ({result['rows_per_second']:,} rows/s); wrote {path}"))
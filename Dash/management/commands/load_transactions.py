@@ -0,0 +1,115 @@
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from Dash import columnar, features
+from Dash.models import Transaction
+from Dash.signals import transactions_refreshed
+
+# CSV column -> Transaction field
+FIELDS = {
+    'TransactionID': 'transaction_id',
+    'CustomerID': 'customer_id',
+    'CustomerDOB': 'customer_dob',
+    'CustGender': 'gender',
+    'CustLocation': 'location',
+    'CustAccountBalance': 'account_balance',
+    'TransactionDate': 'transaction_date',
+    'TransactionTime': 'transaction_time',
+    'TransactionAmount (INR)': 'amount',
+}
+
+# Trade durability for speed while loading; a failed load is simply rerun
+SQLITE_LOAD_PRAGMAS = {
+    'synchronous': 'OFF',
+    'journal_mode': 'MEMORY',
+    'temp_store': 'MEMORY',
+    'cache_size': -262144,  # KiB, i.e. 256 MiB of page cache
+}
+
+
+@contextmanager
+def load_pragmas():
+    """Apply ``SQLITE_LOAD_PRAGMAS`` for the duration of the load."""
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    with connection.cursor() as cursor:
+        previous = {}
+        for pragma, value in SQLITE_LOAD_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma}')
+            previous[pragma] = cursor.fetchone()[0]
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+        try:
+            yield
+        finally:
+            for pragma, value in previous.items():
+                cursor.execute(f'PRAGMA {pragma} = {value}')
+
+
+def _insert_sql():
+    fields = [Transaction._meta.get_field(name) for name in FIELDS.values()]
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(field.column) for field in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    unique = quote(Transaction._meta.get_field('transaction_id').column)
+    # Rows already loaded are skipped, so rerunning after an append only adds the new ones
+    return (f'INSERT INTO {quote(Transaction._meta.db_table)} ({columns}) VALUES ({placeholders}) '
+            f'ON CONFLICT ({unique}) DO NOTHING')
+
+
+def _rows(chunk):
+    """Chunk of CSV rows as tuples of database values, in ``FIELDS`` order."""
+    # HHMMSS integers in the source file, HH:MM:SS strings in some exports
+    seconds = pd.Series(features.seconds_of_day(chunk['TransactionTime']), index=chunk.index)
+    times = pd.to_datetime(seconds.where(seconds >= 0), unit='s')
+    values = {
+        'TransactionID': chunk['TransactionID'].astype(str),
+        'CustomerID': chunk['CustomerID'].astype(str),
+        'CustomerDOB': chunk['CustomerDOB'].astype(str).replace('nan', ''),
+        'CustGender': chunk['CustGender'].astype(str).replace('nan', ''),
+        'CustLocation': chunk['CustLocation'].astype(str).replace('nan', ''),
+        'CustAccountBalance': chunk['CustAccountBalance'].astype(float).round(2),
+        'TransactionDate': chunk['TransactionDate'].dt.strftime('%Y-%m-%d'),
+        'TransactionTime': times.dt.strftime('%H:%M:%S'),
+        'TransactionAmount (INR)': chunk['TransactionAmount (INR)'].astype(float).round(2),
+    }
+    # NaN / NaT become NULL
+    columns = [values[name].astype(object).where(values[name].notna(), None).tolist() for name in FIELDS]
+    return list(zip(*columns))
+
+
+class Command(BaseCommand):
+    help = "Bulk-load the transactions file into the indexed Transaction table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=columnar.Transactions, help="Transactions CSV to read.")
+        parser.add_argument('--batch-size', type=int, default=100_000, help="Rows inserted per database transaction.")
+        parser.add_argument('--replace', action='store_true', help="Delete every loaded transaction first.")
+
+    def handle(self, *args, **options):
+        sql = _insert_sql()
+        before = Transaction.objects.count()
+        started = time.perf_counter()
+        read = 0
+        with load_pragmas():
+            if options['replace']:
+                Transaction.objects.all().delete()
+                before = 0
+            for chunk in columnar.iter_chunks(list(FIELDS), source=options['source'], chunksize=options['batch_size']):
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.executemany(sql, _rows(columnar.with_ids_formatted(chunk, options['source'])))
+                read += len(chunk)
+                if options['verbosity'] > 1:
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(f"{read} rows read ({read / elapsed:,.0f} rows/s)")
+        elapsed = time.perf_counter() - started
+
+        added = Transaction.objects.count() - before
+        if added:
+            transactions_refreshed.send(sender=Command, source=options['source'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {added} new of {read} rows in {elapsed:.1f}s ({read / max(elapsed, 1e-9):,.0f} rows/s)"))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from Dash import columnar, engine, rollups
+
+
+class Command(BaseCommand):
+    help = "Fold new rows from the transactions file into the dashboard rollup tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=columnar.Transactions, help="Transactions CSV to read.")
+        parser.add_argument('--batch-size', type=int, default=200_000, help="Rows applied per database transaction.")
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Drop existing rollups and rebuild them from the whole file in parallel.")
+        parser.add_argument('--workers', type=int, default=engine.WORKERS, help="Processes used by --rebuild.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['rebuild']:
+            totals = engine.aggregate(options['source'], workers=options['workers'])
+            rollups.replace(totals, options['source'])
+            added = totals.rows
+        else:
+            added = rollups.refresh(options['source'], batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Applied {added} new rows in {elapsed:.1f}s"))
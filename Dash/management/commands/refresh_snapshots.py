@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from Dash import columnar, snapshots
+
+
+class Command(BaseCommand):
+    help = "Rebuild the dashboard data and publish it as a new snapshot, once or periodically."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=columnar.Transactions, help="Transactions CSV to read.")
+        parser.add_argument('--interval', type=float, default=0,
+                            help="Keep running, refreshing every INTERVAL seconds (default: refresh once).")
+        parser.add_argument('--keep', type=int, default=snapshots.KEEP, help="Snapshots to keep on disk.")
+        parser.add_argument('--force', action='store_true', help="Publish even if the data hasn't changed.")
+
+    def refresh(self, options):
+        started = time.perf_counter()
+        meta = snapshots.publish(options['source'], keep=options['keep'], force=options['force'])
+        elapsed = time.perf_counter() - started
+        if meta is None:
+            self.stdout.write(f"Data unchanged; still serving {snapshots.current(options['source']).version}")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Published snapshot {meta['version']} in {elapsed:.1f}s"))
+
+    def handle(self, *args, **options):
+        if not options['interval']:
+            self.refresh(options)
+            return
+        while True:
+            try:
+                self.refresh(options)
+            except Exception as e:
+                # The previous snapshot keeps being served; try again next round
+                self.stderr.write(self.style.ERROR(f"Refresh failed: {e!r}"))
+            time.sleep(options['interval'])
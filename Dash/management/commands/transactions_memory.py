@@ -0,0 +1,38 @@
+import pandas as pd
+from django.core.management.base import BaseCommand
+
+from Dash import columnar, schema
+
+
+def _mib(n):
+    return f"{n / 2 ** 20:,.1f} MiB"
+
+
+class Command(BaseCommand):
+    help = "Report the in-memory size of every column of the typed transactions data."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=columnar.Transactions, help="Transactions CSV to read.")
+        parser.add_argument('--compare', action='store_true',
+                            help="Also load the CSV with pandas' inferred types and show the difference.")
+
+    def handle(self, *args, **options):
+        source = options['source']
+        # Memory-mapped columns count as resident here, as they are once a view touches them
+        report = schema.memory_report(columnar.load_columns(source=source))
+        if options['compare']:
+            inferred = schema.memory_report(pd.read_csv(source))
+            report['inferred_dtype'] = inferred['dtype']
+            report['inferred_bytes'] = inferred['bytes']
+
+        for name, row in report.iterrows():
+            line = f"{name:<26} {row['dtype']:<16} {_mib(row['bytes']):>12} {row['bytes_per_row']:6.1f} B/row"
+            if options['compare']:
+                line += f"   (inferred {row['inferred_dtype']:<8} {_mib(row['inferred_bytes']):>12})"
+            self.stdout.write(line)
+
+        total = report['bytes'].sum()
+        summary = f"Total {_mib(total)}"
+        if options['compare']:
+            summary += f" vs {_mib(report['inferred_bytes'].sum())} inferred"
+        self.stdout.write(self.style.SUCCESS(summary))
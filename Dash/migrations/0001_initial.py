@@ -0,0 +1,51 @@
+# Generated by Django 5.1.6 on 2026-10-18 16:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer_id', models.CharField(max_length=32, unique=True)),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('amount_total', models.FloatField(db_index=True, default=0)),
+                ('first_transaction', models.DateField()),
+                ('last_transaction', models.DateField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255, unique=True)),
+                ('rows_processed', models.BigIntegerField(default=0)),
+                ('last_transaction_id', models.CharField(blank=True, max_length=32)),
+                ('data_version', models.CharField(blank=True, max_length=64)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TransactionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('location', models.CharField(max_length=100)),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('amount_total', models.FloatField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['location', 'date'], name='Dash_transa_locatio_5b2813_idx'), models.Index(fields=['hour'], name='Dash_transa_hour_69b476_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'location', 'hour'), name='unique_rollup_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Dash', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Transaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_id', models.CharField(max_length=32, unique=True)),
+                ('customer_id', models.CharField(max_length=32)),
+                ('customer_dob', models.CharField(blank=True, max_length=16)),
+                ('gender', models.CharField(blank=True, max_length=1)),
+                ('location', models.CharField(blank=True, max_length=100)),
+                ('account_balance', models.FloatField(null=True)),
+                ('transaction_date', models.DateField(null=True)),
+                ('transaction_time', models.TimeField(null=True)),
+                ('amount', models.FloatField(null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['customer_id', 'transaction_date'], name='Dash_transa_custome_cc2aba_idx'), models.Index(fields=['location', 'transaction_date'], name='Dash_transa_locatio_6e9526_idx'), models.Index(fields=['transaction_date'], name='Dash_transa_transac_42ea4c_idx')],
+            },
+        ),
+    ]
@@ -1,3 +1,69 @@
 from django.db import models
 
-# Create your models here.
+
+class Transaction(models.Model):
+    """One row of the bank transactions file."""
+    transaction_id = models.CharField(max_length=32, unique=True)
+    customer_id = models.CharField(max_length=32)
+    customer_dob = models.CharField(max_length=16, blank=True)
+    gender = models.CharField(max_length=1, blank=True)
+    location = models.CharField(max_length=100, blank=True)
+    account_balance = models.FloatField(null=True)
+    transaction_date = models.DateField(null=True)
+    transaction_time = models.TimeField(null=True)
+    amount = models.FloatField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer_id', 'transaction_date']),
+            models.Index(fields=['location', 'transaction_date']),
+            models.Index(fields=['transaction_date']),
+        ]
+
+    def __str__(self):
+        return self.transaction_id
+
+
+class TransactionRollup(models.Model):
+    """Transaction count and amount for one (day, location, hour) bucket."""
+    date = models.DateField()
+    location = models.CharField(max_length=100)
+    hour = models.PositiveSmallIntegerField()
+    transaction_count = models.PositiveIntegerField(default=0)
+    amount_total = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'location', 'hour'], name='unique_rollup_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['location', 'date']),
+            models.Index(fields=['hour']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.location} {self.hour:02d}h"
+
+
+class CustomerRollup(models.Model):
+    """Running totals for a single customer."""
+    customer_id = models.CharField(max_length=32, unique=True)
+    transaction_count = models.PositiveIntegerField(default=0)
+    amount_total = models.FloatField(default=0, db_index=True)
+    first_transaction = models.DateField()
+    last_transaction = models.DateField()
+
+    def __str__(self):
+        return self.customer_id
+
+
+class RollupState(models.Model):
+    """How far into a source file the rollups have been brought up to date."""
+    source = models.CharField(max_length=255, unique=True)
+    rows_processed = models.BigIntegerField(default=0)
+    last_transaction_id = models.CharField(max_length=32, blank=True)
+    data_version = models.CharField(max_length=64, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} ({self.rows_processed} rows)"
@@ -0,0 +1,616 @@
+"""Daily NSSF EOD collections file (formerly the body of ``ok.py``).
+
+``run`` builds the file for one statement date from two queries against the
+PROFITS (``PRFPRD``) schema:
+
+* ``EOD_QUERY``: the header (H), detail (D) and trailer (T) records of the
+  NSSF collection accounts, and
+* ``STATEMENT_QUERY``: every entry on the NSSF statement account that day.
+
+Statement entries whose first 14 characters of comments match no EOD record
+are added as extra D records, and the trailer is updated with the D record
+count and the account's closing balance. Both queries are streamed in
+``fetchmany`` batches of ``ARRAYSIZE`` rows and the file is written as the
+rows arrive, with no intermediate file; what is held in memory is the set of
+EOD keys and one fingerprint per written record (for de-duplication), not
+the rows themselves.
+
+The module has no Django dependency. ``connect_oracle`` opens the production
+connection (cx_Oracle and the local ``dbconn`` credentials module);
+``connect_sqlite`` opens a local SQLite stand-in with the same tables (see
+``SQLITE_SCHEMA``) and the Oracle functions the queries use.
+
+``backfill`` re-runs a range of days, a few at a time over a bounded
+``ConnectionPool``; each day's file is written and reported on its own, so
+one failed day leaves the others (and its own earlier file) intact.
+"""
+import os
+import queue
+import re
+import smtplib
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from email import encoders
+from email.mime.base import MIMEBase
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+import numpy as np
+import pandas as pd
+
+# Rows per round trip; large batches keep network round trips (and Python
+# per-call overhead) small on high-volume days
+ARRAYSIZE = 20_000
+
+# The account NSSF collections are credited to
+STATEMENT_ACCOUNT = '3100003712'
+
+OUTPUT = 'NSSFCRDB.csv'
+# One file per statement date when backfilling
+BACKFILL_OUTPUT = 'NSSFCRDB-{date:%Y%m%d}.csv'
+# Days (and so connections) processed at once when backfilling
+BACKFILL_WORKERS = 4
+SHARE_PATH = "\\\\\\\\10.222.140.144\\d\\d\\MIS\\Reports\\EOD"
+
+MAIL_HOST = '10.222.140.233'
+MAIL_FROM = "cente_reports@centenarybank.co.ug"
+MAIL_TO = ['mis@centenarybank.co.ug']
+MAIL_CC = ['MIS@centenarybank.co.ug']
+
+# Fields of the EOD file's records, by position. D records put the bank
+# transaction number in CRDB and the comments in BANK, and so on; only the
+# header record matches these names.
+EOD_COLUMNS = ['HEAD', 'CRDB', 'BANK', 'ACCOUNT_NUMBER', 'SURNAME',
+               'STATEMENT_DATE', 'PREV_ACC_BALANCE', 'CURRENCY_CODE', 'NARRATION']
+
+EOD_QUERY = """
+WITH t
+     AS (SELECT distinct pa.account_number,
+                pa.dep_acc_number,
+                c0.surname,
+                c.short_descr currency_code,
+                TO_DATE(:trxdate_from, 'yyyy/mm/dd') statement_date,
+                bp.bank_name
+           FROM PRFPRD.bank_parameters bp,
+                PRFPRD.cp_agreement a
+                JOIN PRFPRD.deposit_account d
+                   ON d.account_number = a.tp_dep_account_no
+                JOIN PRFPRD.profits_account pa
+                   ON     pa.dep_acc_number = d.account_number
+                      AND pa.secondary_acc != '1'
+                JOIN PRFPRD.currency c
+                   ON d.fk_currencyid_curr = c.id_currency
+                LEFT JOIN PRFPRD.customer c0 ON c0.cust_id = pa.cust_id
+          WHERE a.cp_agreement_no IN (10084, 61)),
+     g
+     AS (SELECT distinct ROW_NUMBER ()
+                OVER (
+                   ORDER BY fk_deposit_accoacc, trans_ser_num, entry_ser_num)
+                   seq_no,
+                COUNT (*) OVER () cnt,
+
+                B.DIAS_REFERENCE_NO  AS bank_transaction_number,
+                f.prev_acc_balance,
+                f.reverse_flag,
+                f.value_date,
+                case when B.CP_AGREEMENT_NO=61 then 'E'
+                      when B.CP_AGREEMENT_NO=10084 then 'I'
+                        else 'M' END narration,
+                f.trx_date,
+                f.debit_credit_flag,
+                f.entry_amount,
+                f.entry_comments,
+                f.cheque_number
+                ,TRIM(SUBSTR (b.orig_ref_no, 4,26))
+
+            AS transaction_narration
+           FROM PRFPRD.cp_trx_recording t2
+         INNER JOIN
+           PRFPRD.fst_demand_extrait f
+            ON     t2.trx_date = f.trx_date
+               AND t2.trx_unit = f.trx_unit
+               AND t2.trx_usr = f.trx_usr
+               AND t2.trx_credit_sn = f.trx_sn
+         INNER JOIN PRFPRD.cp_ol_collection b
+            ON     b.trx_date = t2.trx_date
+             and b.trx_unit = t2.trx_unit
+               AND b.trx_usr = t2.trx_usr
+               AND b.trx_usr_sn_gl = t2.trx_sn
+               AND B.CP_AGREEMENT_NO IN ('61', '10084')
+         inner join
+                t
+               on fk_deposit_accoacc = t.dep_acc_number
+               AND f.trx_date = t.statement_date
+                LEFT JOIN PRFPRD.generic_detail g
+                   ON     g.parameter_type = 'WSDES'
+                      AND g.short_description = 'NSSF'
+          )
+    SELECT  distinct 'H' head,
+            'CRDB' CRDB,
+            'CENTENARY BANK' BANK,
+            t.account_number,
+            t.surname,
+            TO_CHAR (t.statement_date, 'YYYYMMDD'),
+            TO_CHAR (g.prev_acc_balance, '999999999990.00'),
+            currency_code,
+            ''
+    FROM t LEFT JOIN g ON g.seq_no = 1
+UNION ALL
+    SELECT distinct 'D',
+            to_char(g.bank_transaction_number),
+            g.entry_comments,
+            DECODE(g.cheque_number, 0, '', g.cheque_number),
+            TO_CHAR (g.entry_amount, '999999999990'),
+            DECODE (g.debit_credit_flag, '1', 'D', 'C'),
+            TO_CHAR (g.trx_date, 'YYYYMMDD'),
+              TO_CHAR (g.value_date, 'YYYYMMDD'),
+            narration
+
+    FROM g
+UNION ALL
+    SELECT  distinct 'T',
+            to_char(NVL(g.cnt, 0)),
+            TO_CHAR (NVL (DECODE (debit_credit_flag, '1', -1, 1) * entry_amount + g.prev_acc_balance, 0), '999999999990'),
+            TO_CHAR (t.statement_date, 'YYYYMMDD'),
+            '',
+            '',
+            '',
+            '',
+            ''
+    FROM t LEFT JOIN g ON g.seq_no = g.cnt
+"""
+
+STATEMENT_QUERY = """
+SELECT TRX_SN SN,TRANS_SER_NUM, A.TRX_UNIT UNIT, TO_CHAR(TRX_DATE,'DD Mon YYYY') TRANSACTIONDATE,a.TIMESTAMP, A.TRX_USR USERID,A.ID_TRANSACT TRANSACTIONS,A.ID_JUSTIFIC JUSTIFICation,A.ENTRY_AMOUNT ENTRYAMOUNT, case     when A.DEBIT_CREDIT_FLAG = '1' then A.PREV_ACC_BALANCE - A.ENTRY_AMOUNT   else A.PREV_ACC_BALANCE + A.ENTRY_AMOUNT     end AS Balance,        case         when A.DEBIT_CREDIT_FLAG = '1' then 'D'        else 'C'    end AS DRCR, A.CHEQUE_NUMBER CHEQUENO,A.ENTRY_COMMENTS||' '|| a.COMMENTS1||' '||a.comments2||' '||a.comments3||' '||a.comments4 COMMENTS from prfprd.FST_DEMAND_EXTRAIT A, prfprd.PROFITS_ACCOUNT  B WHERE A.FK_DEPOSIT_ACCOACC = B.DEP_ACC_NUMBER AND B.ACCOUNT_NUMBER=:account AND A.TRX_DATE  = TO_DATE (:trxdate_to, 'dd-mm-yyyy') order by A.TIMESTAMP asc
+"""
+
+
+def fetch(conn, query, params, arraysize=ARRAYSIZE):
+    """Run ``query`` and yield its rows as DataFrames of up to ``arraysize`` rows.
+
+    Column names are upper-cased, as Oracle reports them.
+    """
+    cursor = conn.cursor()
+    cursor.arraysize = arraysize
+    if hasattr(cursor, 'prefetchrows'):
+        # cx_Oracle: fill the first batch with the execute round trip
+        cursor.prefetchrows = arraysize + 1
+    try:
+        cursor.execute(query, params)
+        columns = [description[0].upper() for description in cursor.description]
+        while True:
+            rows = cursor.fetchmany(arraysize)
+            if not rows:
+                break
+            yield pd.DataFrame.from_records(rows, columns=columns)
+    finally:
+        cursor.close()
+
+
+class MatchKeys:
+    """EOD match keys, hashed once into an index that every statement batch probes."""
+
+    def __init__(self):
+        self._parts = []
+        self._index = None
+        self.has_null = False
+
+    def add(self, keys):
+        keys = pd.Series(keys)
+        self.has_null = self.has_null or bool(keys.isna().any())
+        self._parts.append(keys.dropna().unique())
+        self._index = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            values = np.concatenate(self._parts) if self._parts else np.empty(0, dtype=object)
+            self._index = pd.Index(pd.unique(values), dtype=object)
+        return self._index
+
+    def missing(self, keys):
+        """Mask of ``keys`` with no EOD record: the anti-join."""
+        keys = pd.Series(keys)
+        missing = self.index.get_indexer(keys) < 0
+        if self.has_null:
+            # NULL comments match NULL comments, as they did in pd.merge
+            missing &= keys.notna().to_numpy()
+        return missing
+
+
+def statement_records(batch, keys):
+    """D records for the statement entries of ``batch`` missing from ``keys``.
+
+    Returns the records, indexed by their match key, and the earliest of
+    their dates as DDMMYYYY (None when every entry matched).
+    """
+    bank = batch['COMMENTS'].str[:14]
+    missing = keys.missing(bank)
+    rows = batch[missing]
+    # Parsed once; every date field is formatted from the same values
+    timestamps = pd.to_datetime(rows['TIMESTAMP'], dayfirst=True)
+    date = timestamps.dt.strftime('%Y%m%d')
+    records = pd.DataFrame({
+        'HEAD': 'D',
+        'CRDB': (date + rows['TRANS_SER_NUM'].astype(int).astype(str)).str.strip(),
+        'BANK': bank[missing].str.strip(),
+        'ACCOUNT_NUMBER': '',
+        'SURNAME': rows['ENTRYAMOUNT'].astype('int64'),
+        'STATEMENT_DATE': rows['DRCR'],
+        'PREV_ACC_BALANCE': date,
+        'CURRENCY_CODE': date,
+    })
+    # Indexed by match key, the order the old outer merge emitted them in
+    records.index = bank[missing]
+    return records, (timestamps.dt.strftime('%d%m%Y').min() if len(rows) else None)
+
+
+# Second key for the 128-bit record fingerprints (two 64-bit hashes)
+_HASH_KEY = '4e53534645534f44'
+
+
+class _Writer:
+    """Writes batches of EOD records as CSV, dropping repeats and trailing empty fields."""
+
+    TRAILING_COMMAS = re.compile(',+$', re.MULTILINE)
+
+    def __init__(self, f):
+        self.f = f
+        # Fingerprints of the records written so far, kept sorted
+        self.seen = np.empty(0, dtype='S16')
+        self.written = 0
+
+    def _unseen(self, fingerprints):
+        """Mask of the first occurrence of each fingerprint not written before."""
+        unique, first = np.unique(fingerprints, return_index=True)
+        # A binary search of the sorted fingerprints, so a batch costs its own
+        # size rather than a pass over everything written so far
+        at = np.searchsorted(self.seen, unique)
+        found = np.zeros(len(unique), dtype=bool)
+        if len(self.seen):
+            found = self.seen[np.minimum(at, len(self.seen) - 1)] == unique
+        keep = np.zeros(len(fingerprints), dtype=bool)
+        keep[first[~found]] = True
+        self.seen = np.insert(self.seen, at[~found], unique[~found])
+        return keep
+
+    def write(self, records):
+        if records.empty:
+            return
+        text = records.astype(object).where(records.notna(), '').astype(str)
+        # Repeats are judged before stripping, as drop_duplicates did, on a
+        # 128-bit fingerprint per record: two 64-bit hashes side by side
+        hashes = np.column_stack([
+            pd.util.hash_pandas_object(text, index=False).to_numpy(),
+            pd.util.hash_pandas_object(text, index=False, hash_key=_HASH_KEY).to_numpy(),
+        ])
+        keep = self._unseen(hashes.view('S16').ravel())
+        body = text[keep].copy()
+        # Only text columns can carry padding
+        strings = records.columns[records.dtypes == object]
+        body[strings] = body[strings].apply(lambda column: column.str.strip())
+        self.f.write(self.TRAILING_COMMAS.sub('', body.to_csv(header=False, index=False, lineterminator='\n')))
+        self.written += int(keep.sum())
+
+
+def reconcile(eod, statement, f):
+    """Write the EOD file from batches of the two queries' rows to ``f``; returns a summary.
+
+    ``eod`` yields DataFrames of ``EOD_QUERY`` rows and ``statement`` of
+    ``STATEMENT_QUERY`` rows (see ``fetch``); the EOD batches are consumed
+    first.
+    """
+    writer = _Writer(f)
+    keys = MatchKeys()
+    held, trailers, unmatched = [], [], []
+    header_seen = False
+    detail_count = unmatched_count = 0
+    closing_balance = file_date = None
+
+    for batch in eod:
+        batch.columns = EOD_COLUMNS
+        keys.add(batch['BANK'])
+        head = batch['HEAD']
+        headers, details = batch[head == 'H'], batch[head == 'D']
+        trailers.append(batch[head == 'T'])
+        detail_count += int(details['CRDB'].notna().sum())
+        if len(headers):
+            writer.write(headers)
+            header_seen = True
+            for pending in held:
+                writer.write(pending)
+            held = []
+        # Details normally follow the header; any that come first wait for it
+        if header_seen:
+            writer.write(details)
+        else:
+            held.append(details)
+    for pending in held:
+        writer.write(pending)
+
+    for batch in statement:
+        records, first_date = statement_records(batch, keys)
+        closing_balance = batch['BALANCE'].iloc[-1]
+        # Usually a small fraction of the statement, so they are held and
+        # written in key order at the end
+        unmatched.append(records)
+        detail_count += len(records)
+        unmatched_count += len(records)
+        if first_date is not None:
+            file_date = min(first_date, file_date) if file_date else first_date
+    if unmatched:
+        writer.write(pd.concat(unmatched).sort_index(kind='stable'))
+
+    if closing_balance is None:
+        raise LookupError("No statement entries")
+    trailer = pd.concat(trailers, ignore_index=True) if trailers else pd.DataFrame(columns=EOD_COLUMNS)
+    trailer['CRDB'] = detail_count
+    trailer['BANK'] = closing_balance
+    writer.write(trailer)
+    return {'records': writer.written, 'details': detail_count, 'unmatched': unmatched_count, 'file_date': file_date}
+
+
+def run(conn, statement_date, output=OUTPUT, arraysize=ARRAYSIZE):
+    """Write the EOD file for ``statement_date`` to ``output`` and return a summary.
+
+    The file is written beside ``output`` and renamed into place, so
+    ``output`` is either complete or untouched.
+    """
+    started = time.perf_counter()
+    directory = os.path.dirname(os.path.abspath(output))
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', newline='') as f:
+            eod = fetch(conn, EOD_QUERY, {'trxdate_from': statement_date.strftime('%Y/%m/%d')}, arraysize)
+            statement = fetch(conn, STATEMENT_QUERY, {
+                'trxdate_to': statement_date.strftime('%d-%m-%Y'),
+                'account': STATEMENT_ACCOUNT,
+            }, arraysize)
+            try:
+                summary = reconcile(eod, statement, f)
+            except LookupError:
+                raise LookupError(f"No statement entries on {STATEMENT_ACCOUNT} for {statement_date:%Y-%m-%d}") from None
+        os.replace(tmp, output)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return {
+        'date': statement_date.strftime('%Y-%m-%d'),
+        'output': output,
+        **summary,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def synthetic_day(rows, unmatched=0.05, seed=0, statement_date=datetime(2025, 3, 10)):
+    """EOD and statement rows for a made-up day with ``rows`` collections.
+
+    Shaped like the two queries' results; a fraction ``unmatched`` of the
+    statement entries has no EOD record. For benchmarks (see
+    ``manage.py benchmark_nssf``).
+    """
+    rng = np.random.default_rng(seed)
+    day = statement_date.strftime('%Y%m%d')
+    serial = np.arange(1, rows + 1)
+    references = pd.Series(serial + 10 ** 9).astype(str)
+    amounts = rng.integers(1_000, 500_000, rows).astype(np.float64)
+    comments = 'NSSF' + references
+    eod = pd.DataFrame({
+        'HEAD': 'D', 'CRDB': 'D' + references, 'BANK': comments, 'ACCOUNT_NUMBER': None,
+        'SURNAME': amounts.astype(np.int64).astype(str), 'STATEMENT_DATE': np.where(serial % 10, 'C', 'D'),
+        'PREV_ACC_BALANCE': day, 'CURRENCY_CODE': day, 'NARRATION': np.where(serial % 3, 'E', 'I'),
+    })
+    header = pd.DataFrame([['H', 'CRDB', 'CENTENARY BANK', '3100000061', 'NSSF', day, '1.00', 'UGX', None]],
+                          columns=EOD_COLUMNS)
+    trailer = pd.DataFrame([['T', str(rows), '0', day, None, None, None, None, None]], columns=EOD_COLUMNS)
+    missing = rng.random(rows) < unmatched
+    timestamps = statement_date + pd.to_timedelta(np.sort(rng.integers(8 * 3600, 18 * 3600, rows)), unit='s')
+    statement = pd.DataFrame({
+        'SN': serial + 100_000, 'TRANS_SER_NUM': serial + 500_000, 'UNIT': 102,
+        'TRANSACTIONDATE': statement_date.strftime('%d %b %Y'), 'TIMESTAMP': timestamps, 'USERID': 'USR2',
+        'TRANSACTIONS': 3, 'JUSTIFICATION': 4, 'ENTRYAMOUNT': amounts,
+        'BALANCE': 1_000_000 + np.cumsum(amounts), 'DRCR': 'C', 'CHEQUENO': 0,
+        'COMMENTS': np.where(missing, 'MISS' + references, comments) + ' X Y  ',
+    })
+    return pd.concat([header, eod, trailer], ignore_index=True), statement
+
+
+def send_report(output, file_date, host=MAIL_HOST):
+    """Mail ``output`` to MIS for the FTP hand-off."""
+    message = MIMEMultipart()
+    message['From'] = MAIL_FROM
+    message['To'] = ','.join(MAIL_TO)
+    message['CC'] = ','.join(MAIL_CC)
+    message['Subject'] = f"Centenary Bank EOD File for NSSF {file_date}"
+    message.attach(MIMEText(
+        f"Good Morning MIS,\nKindly receive NSSF EOD File under path below, "
+        f"pick it annd have it shared via ftp\n\n {SHARE_PATH}", 'plain'))
+    with open(output, 'rb') as attachment:
+        part = MIMEBase('application', 'octet-stream')
+        part.set_payload(attachment.read())
+    encoders.encode_base64(part)
+    part.add_header('Content-Disposition', f"attachment; filename= {os.path.basename(output)}")
+    message.attach(part)
+    server = smtplib.SMTP(host)
+    try:
+        server.send_message(message)
+    finally:
+        server.quit()
+
+
+def connect_oracle():
+    import cx_Oracle
+    import dbconn
+
+    return cx_Oracle.connect(dbconn.user, dbconn.password, dbconn.dns)
+
+
+# Oracle functions the queries use, for the SQLite stand-in. Dates are
+# stored as ISO text ('YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS').
+_DATE_TOKENS = [('YYYY', '%Y'), ('HH24', '%H'), ('MI', '%M'), ('SS', '%S'),
+                ('MM', '%m'), ('DD', '%d'), ('MON', '%b')]
+
+
+def _strftime_format(oracle_format):
+    pattern = re.compile('|'.join(token for token, _ in _DATE_TOKENS), re.IGNORECASE)
+    formats = dict(_DATE_TOKENS)
+    return pattern.sub(lambda m: formats[m.group(0).upper()], oracle_format)
+
+
+def _to_date(text, oracle_format):
+    if text is None:
+        return None
+    return datetime.strptime(text, _strftime_format(oracle_format)).strftime('%Y-%m-%d')
+
+
+def _to_char(value, oracle_format=None):
+    if value is None or oracle_format is None:
+        return None if value is None else str(value)
+    if re.fullmatch(r'[90,]+(\.[90]+)?', oracle_format):
+        # Numeric mask: right-aligned, with Oracle's leading sign position
+        decimals = len(oracle_format.split('.')[1]) if '.' in oracle_format else 0
+        return f'{float(value):{len(oracle_format) + 1}.{decimals}f}'
+    return datetime.fromisoformat(str(value)).strftime(_strftime_format(oracle_format))
+
+
+def _decode(value, *args):
+    for search, result in zip(args[0::2], args[1::2]):
+        if value == search or str(value) == str(search):
+            return result
+    return args[-1] if len(args) % 2 else None
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bank_parameters (bank_name TEXT);
+CREATE TABLE IF NOT EXISTS cp_agreement (cp_agreement_no INTEGER, tp_dep_account_no INTEGER);
+CREATE TABLE IF NOT EXISTS deposit_account (account_number INTEGER, fk_currencyid_curr INTEGER);
+CREATE TABLE IF NOT EXISTS profits_account (account_number TEXT, dep_acc_number INTEGER,
+                                            secondary_acc TEXT, cust_id INTEGER);
+CREATE TABLE IF NOT EXISTS currency (id_currency INTEGER, short_descr TEXT);
+CREATE TABLE IF NOT EXISTS customer (cust_id INTEGER, surname TEXT);
+CREATE TABLE IF NOT EXISTS cp_trx_recording (trx_date TEXT, trx_unit INTEGER, trx_usr TEXT,
+                                             trx_sn INTEGER, trx_credit_sn INTEGER);
+CREATE TABLE IF NOT EXISTS fst_demand_extrait (
+    trx_date TEXT, trx_unit INTEGER, trx_usr TEXT, trx_sn INTEGER,
+    fk_deposit_accoacc INTEGER, trans_ser_num INTEGER, entry_ser_num INTEGER,
+    prev_acc_balance REAL, reverse_flag TEXT, value_date TEXT, debit_credit_flag TEXT,
+    entry_amount REAL, entry_comments TEXT DEFAULT '', cheque_number INTEGER DEFAULT 0,
+    timestamp TIMESTAMP, id_transact INTEGER, id_justific INTEGER,
+    comments1 TEXT DEFAULT '', comments2 TEXT DEFAULT '', comments3 TEXT DEFAULT '', comments4 TEXT DEFAULT '');
+CREATE INDEX IF NOT EXISTS fst_demand_extrait_account ON fst_demand_extrait (fk_deposit_accoacc, trx_date);
+CREATE TABLE IF NOT EXISTS cp_ol_collection (trx_date TEXT, trx_unit INTEGER, trx_usr TEXT, trx_usr_sn_gl INTEGER,
+                                             cp_agreement_no TEXT, dias_reference_no TEXT, orig_ref_no TEXT);
+CREATE TABLE IF NOT EXISTS generic_detail (parameter_type TEXT, short_description TEXT);
+"""
+
+
+def connect_sqlite(path, create=False):
+    """Connection whose ``PRFPRD`` schema is the SQLite database at ``path``.
+
+    With ``create`` the stand-in tables are created if missing. Unlike
+    Oracle, SQLite treats '' as distinct from NULL and NULL || text as NULL,
+    so stand-in text columns should hold '' rather than NULL.
+    """
+    # TIMESTAMP columns come back as datetimes, as they do from Oracle
+    sqlite3.register_converter('TIMESTAMP', lambda value: datetime.fromisoformat(value.decode()))
+    conn = sqlite3.connect(':memory:', detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+    conn.execute("ATTACH DATABASE ? AS PRFPRD", (path,))
+    if create:
+        conn.executescript(SQLITE_SCHEMA.replace('CREATE TABLE IF NOT EXISTS ', 'CREATE TABLE IF NOT EXISTS PRFPRD.')
+                           .replace('CREATE INDEX IF NOT EXISTS ', 'CREATE INDEX IF NOT EXISTS PRFPRD.'))
+    conn.create_function('TO_DATE', 2, _to_date, deterministic=True)
+    conn.create_function('TO_CHAR', 1, _to_char, deterministic=True)
+    conn.create_function('TO_CHAR', 2, _to_char, deterministic=True)
+    conn.create_function('DECODE', -1, _decode, deterministic=True)
+    conn.create_function('NVL', 2, lambda value, default: default if value is None else value, deterministic=True)
+    return conn
+
+
+class ConnectionPool:
+    """At most ``size`` connections from ``connect``, opened as needed.
+
+    ``connection()`` lends one out for a ``with`` block. A connection whose
+    block raised is closed rather than reused, since it may be mid-query.
+    """
+
+    def __init__(self, connect, size):
+        self.connect = connect
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self):
+        with self.slots:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                conn = self.connect()
+            try:
+                yield conn
+            except BaseException:
+                conn.close()
+                raise
+            self.idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def backfill(first, last, connect=connect_oracle, workers=BACKFILL_WORKERS, output=BACKFILL_OUTPUT,
+             skip_existing=False, arraysize=ARRAYSIZE):
+    """Write the EOD file of every day from ``first`` to ``last`` (inclusive).
+
+    ``output`` is formatted with ``date`` for each day's path. Days run
+    ``workers`` at a time, each on a pooled connection; a day that fails is
+    reported and the rest carry on. Re-running a range rewrites the same
+    files (with ``skip_existing``, days whose file exists are left alone).
+
+    Returns one summary per day, in date order; failed days have ``error``
+    in place of the record counts.
+    """
+    days = [first + timedelta(days=offset) for offset in range((last - first).days + 1)]
+    pool = ConnectionPool(connect, workers)
+
+    def one(day):
+        path = output.format(date=day)
+        if skip_existing and os.path.exists(path):
+            return {'date': day.strftime('%Y-%m-%d'), 'output': path, 'skipped': True, 'seconds': 0.0}
+        started = time.perf_counter()
+        try:
+            with pool.connection() as conn:
+                return run(conn, day, path, arraysize)
+        except Exception as e:
+            return {
+                'date': day.strftime('%Y-%m-%d'),
+                'output': path,
+                'error': f'{type(e).__name__}: {e}',
+                'seconds': round(time.perf_counter() - started, 3),
+            }
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='nssf-backfill') as executor:
+            return list(executor.map(one, days))
+    finally:
+        pool.close()
+
+
+def main(statement_date=None, output=OUTPUT, mail=True, connect=connect_oracle):
+    """Yesterday's file, written and mailed as the scheduled job does."""
+    statement_date = statement_date or datetime.today() - timedelta(days=1)
+    conn = connect()
+    try:
+        summary = run(conn, statement_date, output)
+    finally:
+        conn.close()
+    if mail:
+        send_report(output, summary['file_date'])
+    return summary
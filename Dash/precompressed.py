@@ -0,0 +1,106 @@
+"""Conditional GETs and precompressed bodies for the dashboard views.
+
+Each response is identified by the data version it was rendered from, the
+page or figure name and the request's parameters (filters, sampling, ...),
+the same parts the figure cache keys on. ``respond`` turns that into a weak
+``ETag`` and answers a matching ``If-None-Match`` (or, where the view knows
+when the data last changed, ``If-Modified-Since``) with a 304 before
+anything is rendered.
+
+Otherwise the body is rendered once, compressed with gzip and, when the
+``brotli`` package is installed, brotli, and the encodings are kept together
+in the figure cache; requests get whichever their ``Accept-Encoding``
+prefers. ``Cache-Control: no-cache`` makes browsers revalidate on every
+visit, so a refreshed wall screen costs a 304 while the data is unchanged.
+"""
+import gzip
+import hashlib
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from . import figure_cache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = 9
+# Bodies are compressed once per data version, so favour size over speed;
+# 11 (the maximum) is several times slower again for little gain
+BROTLI_QUALITY = 9
+
+# Bodies smaller than this are sent as they are
+MIN_SIZE = 512
+
+
+def etag(version, name, params=None):
+    """Weak ETag of the response for ``name`` at ``version`` with ``params``."""
+    digest = hashlib.sha1(figure_cache.make_key(version, name, params).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def encode(body):
+    """``body`` as ``{content coding: bytes}``; 'identity' is always present."""
+    if isinstance(body, str):
+        body = body.encode()
+    encoded = {'identity': body}
+    if len(body) >= MIN_SIZE:
+        encoded['gzip'] = gzip.compress(body, GZIP_LEVEL, mtime=0)
+        if brotli is not None:
+            encoded['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+    return encoded
+
+
+def _accepted(request):
+    """Content codings the client accepts, by preference (q-values)."""
+    accepted = {}
+    for item in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = item.strip().partition(';')
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def choose(request, encoded):
+    """The best coding of ``encoded`` for ``request``."""
+    accepted = _accepted(request)
+    best, best_q = 'identity', 0.0
+    # Smallest first, so ties go to the better compression
+    for coding in ('br', 'gzip'):
+        q = accepted.get(coding, accepted.get('*', 0.0))
+        if coding in encoded and q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def respond(request, version, name, params, build, content_type, last_modified=None):
+    """Response for ``name`` at ``version``, or a 304 if the client has it.
+
+    ``build()`` returns the body and is only called when the figure cache
+    has no encodings of it. ``last_modified`` is a Unix timestamp, if known.
+    """
+    tag = etag(version, name, params)
+    response = get_conditional_response(request, etag=tag, last_modified=last_modified)
+    if response is None:
+        encoded = figure_cache.get_or_build(version, f'{name}.encoded', lambda: encode(build()), params)
+        coding = choose(request, encoded)
+        response = HttpResponse(encoded[coding], content_type=content_type)
+        if coding != 'identity':
+            response['Content-Encoding'] = coding
+    response['ETag'] = tag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_vary_headers(response, ('Accept-Encoding',))
+    patch_cache_control(response, no_cache=True)
+    return response
@@ -0,0 +1,119 @@
+"""Dashboard aggregates computed by the database from ``Transaction`` rows.
+
+Once ``manage.py load_transactions`` has filled the table, every helper here
+is a ``values().annotate()`` query over the indexed columns. The helpers take
+the same arguments and return the same DataFrame shapes as their ``rollups``
+counterparts, but unlike the customer rollups they honour date and location
+filters.
+"""
+import pandas as pd
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import ExtractHour, ExtractIsoWeekDay, TruncMonth
+
+from .models import Transaction
+
+
+def available():
+    """True once ``load_transactions`` has put any rows in the table."""
+    return Transaction.objects.exists()
+
+
+def version():
+    """Short token that changes whenever rows are loaded or removed."""
+    stats = Transaction.objects.aggregate(last=Max('id'), n=Count('id'))
+    if not stats['n']:
+        return 'none'
+    return f"{stats['n']}.{stats['last']}"
+
+
+def _transactions(start=None, end=None, locations=None):
+    transactions = Transaction.objects.all()
+    if start is not None:
+        transactions = transactions.filter(transaction_date__gte=start)
+    if end is not None:
+        transactions = transactions.filter(transaction_date__lte=end)
+    if locations:
+        transactions = transactions.filter(location__in=locations)
+    return transactions
+
+
+def location_totals(start=None, end=None, locations=None):
+    rows = _transactions(start, end, locations).values('location').annotate(total=Sum('amount'))
+    return pd.DataFrame(
+        [(row['location'], row['total'] or 0) for row in rows],
+        columns=['CustLocation', 'TransactionAmount'],
+    ).astype({'TransactionAmount': float})
+
+
+def customer_totals(limit=20, start=None, end=None, locations=None):
+    rows = (_transactions(start, end, locations).values('customer_id')
+            .annotate(total=Sum('amount')).order_by('-total')
+            .values_list('customer_id', 'total')[:limit])
+    return pd.DataFrame(list(rows), columns=['CustomerID', 'TransactionAmount']).astype({'TransactionAmount': float})
+
+
+def customer_activity(start=None, end=None, locations=None):
+    """Every customer's transaction count and total amount (CLV)."""
+    rows = (_transactions(start, end, locations).values('customer_id')
+            .annotate(n=Count('id'), total=Sum('amount')).values_list('customer_id', 'n', 'total'))
+    return pd.DataFrame(list(rows), columns=['CustomerID', 'TotalTransactions', 'CLV']).fillna({'CLV': 0}).astype(
+        {'TotalTransactions': 'int64', 'CLV': float})
+
+
+def transaction_counts(by, locations=None, start=None, end=None):
+    """Transaction counts grouped by ``'month'``, ``'weekday'`` or ``'hour'``.
+
+    Weekdays are numbered like pandas' ``dayofweek`` (Monday=0) and always
+    cover the whole week.
+    """
+    transactions = _transactions(start, end, locations)
+
+    if by == 'month':
+        rows = (transactions.filter(transaction_date__isnull=False)
+                .annotate(key=TruncMonth('transaction_date')).values('key').annotate(n=Count('id')))
+        counts = pd.DataFrame([(row['key'].strftime('%Y-%m'), row['n']) for row in rows], columns=['Month', 'TotalTransactions'])
+        return counts.astype({'TotalTransactions': 'int64'}).sort_values('Month').reset_index(drop=True)
+    if by == 'weekday':
+        rows = (transactions.filter(transaction_date__isnull=False)
+                .annotate(key=ExtractIsoWeekDay('transaction_date')).values('key').annotate(n=Count('id')))
+        counts = pd.Series({row['key'] - 1: row['n'] for row in rows}, dtype='int64')
+        counts = counts.reindex(range(7), fill_value=0)
+        return pd.DataFrame({'DayOfWeek': counts.index, 'TotalTransactions': counts.values})
+    if by == 'hour':
+        rows = (transactions.filter(transaction_time__isnull=False)
+                .annotate(key=ExtractHour('transaction_time')).values('key').annotate(n=Count('id')).order_by('key'))
+        counts = pd.DataFrame([(row['key'], row['n']) for row in rows], columns=['Hour', 'TotalTransactions'])
+        return counts.astype('int64')
+    raise ValueError(f"Unknown grouping {by!r}")
+
+
+def monthly_totals(start=None, end=None, locations=None):
+    rows = (_transactions(start, end, locations).filter(transaction_date__isnull=False)
+            .annotate(month=TruncMonth('transaction_date')).values('month')
+            .annotate(revenue=Sum('amount'), n=Count('id')).order_by('month'))
+    return pd.DataFrame(
+        [(row['month'].strftime('%Y-%m'), row['revenue'] or 0, row['n']) for row in rows],
+        columns=['TransactionMonth', 'TotalRevenue', 'TotalTransactions'],
+    ).astype({'TotalRevenue': float, 'TotalTransactions': 'int64'})
+
+
+def customer_value(limit=20, quantile=0.8, start=None, end=None, locations=None):
+    """Top customers by lifetime value plus the high-value segment sizes.
+
+    Per-customer totals are summed by the database; only one row per
+    customer comes back to find the ``quantile`` threshold.
+    """
+    rows = _transactions(start, end, locations).values('customer_id').annotate(total=Sum('amount'))
+    totals = pd.DataFrame(list(rows.values_list('customer_id', 'total')), columns=['CustomerID', 'CLV'])
+    if totals.empty:
+        return (pd.DataFrame(columns=['CustomerID', 'CLV', 'HighValueCustomer']),
+                pd.DataFrame(columns=['HighValueCustomer', 'Customers']))
+    totals['CLV'] = totals['CLV'].fillna(0).astype(float)
+    threshold = totals['CLV'].quantile(quantile)
+    totals['HighValueCustomer'] = (totals['CLV'] >= threshold).astype(int)
+    high_value = int(totals['HighValueCustomer'].sum())
+
+    top = totals.nlargest(limit, 'CLV').reset_index(drop=True)
+    segments = pd.DataFrame({'HighValueCustomer': [0, 1], 'Customers': [len(totals) - high_value, high_value]})
+    return top, segments
+
@@ -0,0 +1,303 @@
+"""Materialised dashboard aggregates kept in the database.
+
+``TransactionRollup`` holds counts and amounts per (day, location, hour) and
+``CustomerRollup`` running totals per customer. ``refresh`` folds any rows
+appended to the transactions file since the last run into those tables, and
+the query helpers below return DataFrames shaped like the ones
+``views.dashboard`` used to compute from raw rows.
+"""
+import os
+
+import pandas as pd
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import ExtractIsoWeekDay, TruncMonth
+
+from . import columnar
+from .models import CustomerRollup, RollupState, TransactionRollup
+from .signals import transactions_appended, transactions_refreshed
+
+SOURCE_COLUMNS = [
+    'TransactionID', 'CustomerID', 'CustLocation',
+    'TransactionDate', 'TransactionHour', 'TransactionAmount (INR)',
+]
+
+# Stay below SQLite's limit on bound parameters per statement
+QUERY_BATCH = 900
+
+
+def _prepare(rows):
+    rows = rows.dropna(subset=['CustomerID', 'CustLocation', 'TransactionDate'])
+    rows = rows[rows['TransactionHour'] >= 0]
+    return pd.DataFrame({
+        'date': rows['TransactionDate'].dt.date,
+        'location': rows['CustLocation'].astype(str),
+        'hour': rows['TransactionHour'].astype(int),
+        'customer_id': rows['CustomerID'].astype(str),
+        'amount': rows['TransactionAmount (INR)'].fillna(0).astype(float),
+    })
+
+
+def _in_batches(values):
+    values = list(values)
+    for start in range(0, len(values), QUERY_BATCH):
+        yield values[start:start + QUERY_BATCH]
+
+
+def _merge_buckets(rows):
+    new = rows.groupby(['date', 'location', 'hour']).agg(
+        transaction_count=('amount', 'size'),
+        amount_total=('amount', 'sum'),
+    )
+    existing = {}
+    for dates in _in_batches(new.index.unique(level='date')):
+        for bucket in TransactionRollup.objects.filter(date__in=dates):
+            existing[(bucket.date, bucket.location, bucket.hour)] = bucket
+
+    buckets = []
+    for totals in new.itertuples():
+        date, location, hour = totals.Index
+        old = existing.get((date, location, hour))
+        buckets.append(TransactionRollup(
+            date=date,
+            location=location,
+            hour=hour,
+            transaction_count=int(totals.transaction_count) + (old.transaction_count if old else 0),
+            amount_total=float(totals.amount_total) + (old.amount_total if old else 0),
+        ))
+    TransactionRollup.objects.bulk_create(
+        buckets,
+        batch_size=QUERY_BATCH // 5,
+        update_conflicts=True,
+        unique_fields=['date', 'location', 'hour'],
+        update_fields=['transaction_count', 'amount_total'],
+    )
+
+
+def _merge_customers(rows):
+    new = rows.groupby('customer_id').agg(
+        transaction_count=('amount', 'size'),
+        amount_total=('amount', 'sum'),
+        first_transaction=('date', 'min'),
+        last_transaction=('date', 'max'),
+    )
+    existing = {}
+    for ids in _in_batches(new.index):
+        for customer in CustomerRollup.objects.filter(customer_id__in=ids):
+            existing[customer.customer_id] = customer
+
+    customers = []
+    for totals in new.itertuples():
+        old = existing.get(totals.Index)
+        customer = CustomerRollup(
+            customer_id=totals.Index,
+            transaction_count=int(totals.transaction_count),
+            amount_total=float(totals.amount_total),
+            first_transaction=totals.first_transaction,
+            last_transaction=totals.last_transaction,
+        )
+        if old:
+            customer.transaction_count += old.transaction_count
+            customer.amount_total += old.amount_total
+            customer.first_transaction = min(customer.first_transaction, old.first_transaction)
+            customer.last_transaction = max(customer.last_transaction, old.last_transaction)
+        customers.append(customer)
+    CustomerRollup.objects.bulk_create(
+        customers,
+        batch_size=QUERY_BATCH // 5,
+        update_conflicts=True,
+        unique_fields=['customer_id'],
+        update_fields=['transaction_count', 'amount_total', 'first_transaction', 'last_transaction'],
+    )
+
+
+def apply(rows):
+    """Fold new raw transaction rows (CSV column names) into the rollups."""
+    prepared = _prepare(rows)
+    if prepared.empty:
+        return
+    with transaction.atomic():
+        _merge_buckets(prepared)
+        _merge_customers(prepared)
+
+
+def reset():
+    """Drop every rollup so the next ``refresh`` rebuilds from scratch."""
+    with transaction.atomic():
+        TransactionRollup.objects.all().delete()
+        CustomerRollup.objects.all().delete()
+        RollupState.objects.all().delete()
+
+
+def refresh(source=columnar.Transactions, batch_size=200_000):
+    """Bring the rollups up to date with ``source``; returns rows added.
+
+    Rows appended since the last refresh are applied incrementally. If the
+    file was rewritten rather than appended to, everything is rebuilt.
+    """
+    name = os.path.basename(source)
+    df = columnar.load_columns(SOURCE_COLUMNS, source=source)
+    transaction_ids = columnar.format_ids('TransactionID', df['TransactionID'], source)
+    version = columnar.data_version(source)
+    state, _ = RollupState.objects.get_or_create(source=name)
+
+    done = state.rows_processed
+    # The rollups hold one source at a time, so a first refresh of this one
+    # also clears whatever another source left there
+    if not done or done > len(df) or transaction_ids[done - 1] != state.last_transaction_id:
+        reset()
+        state, done = RollupState.objects.create(source=name), 0
+    # Rows are only deltas to pages drawn from earlier rollups; anything
+    # else (a first build or a rebuild) replaces them
+    appending = done > 0
+
+    for start in range(done, len(df), batch_size):
+        batch = columnar.with_ids_formatted(df.iloc[start:start + batch_size], source)
+        with transaction.atomic():
+            apply(batch)
+            state.rows_processed = start + len(batch)
+            state.last_transaction_id = batch['TransactionID'].iloc[-1]
+            state.data_version = version
+            state.save()
+        if appending:
+            transactions_appended.send(sender=refresh, source=source, rows=batch)
+    if len(df) > done:
+        if not appending:
+            transactions_appended.send(sender=refresh, source=source, rows=None)
+        transactions_refreshed.send(sender=refresh, source=source)
+    return len(df) - done
+
+
+def replace(totals, source=columnar.Transactions):
+    """Replace every rollup with ``totals``, an ``engine.Partial`` of all of ``source``."""
+    buckets = totals.buckets.reset_index()
+    customers = totals.customers.reset_index()
+    with transaction.atomic():
+        reset()
+        TransactionRollup.objects.bulk_create(
+            (TransactionRollup(date=row.date.date(), location=row.location, hour=int(row.hour),
+                               transaction_count=int(row.transaction_count), amount_total=float(row.amount_total))
+             for row in buckets.itertuples(index=False)),
+            batch_size=QUERY_BATCH // 5,
+        )
+        CustomerRollup.objects.bulk_create(
+            (CustomerRollup(customer_id=row.customer_id, transaction_count=int(row.transaction_count),
+                            amount_total=float(row.amount_total), first_transaction=row.first_transaction.date(),
+                            last_transaction=row.last_transaction.date())
+             for row in customers.itertuples(index=False)),
+            batch_size=QUERY_BATCH // 5,
+        )
+        RollupState.objects.create(
+            source=os.path.basename(source),
+            rows_processed=totals.rows,
+            last_transaction_id=totals.last_transaction_id,
+        )
+    transactions_appended.send(sender=replace, source=source, rows=None)
+    transactions_refreshed.send(sender=replace, source=source)
+
+
+def available(source=columnar.Transactions):
+    """True once a refresh of ``source`` has populated the rollups."""
+    return RollupState.objects.filter(source=os.path.basename(source), rows_processed__gt=0).exists()
+
+
+def version(source=columnar.Transactions):
+    """Short token that changes whenever a refresh of ``source`` applies new rows."""
+    state = RollupState.objects.filter(source=os.path.basename(source)).first()
+    if state is None:
+        return 'none'
+    return f"{state.rows_processed}.{state.updated_at.timestamp():.0f}"
+
+
+def _buckets(start=None, end=None, locations=None):
+    buckets = TransactionRollup.objects.all()
+    if start is not None:
+        buckets = buckets.filter(date__gte=start)
+    if end is not None:
+        buckets = buckets.filter(date__lte=end)
+    if locations:
+        buckets = buckets.filter(location__in=locations)
+    return buckets
+
+
+def location_totals(start=None, end=None, locations=None):
+    rows = _buckets(start, end, locations).values('location').annotate(total=Sum('amount_total'))
+    return pd.DataFrame(
+        [(row['location'], row['total']) for row in rows],
+        columns=['CustLocation', 'TransactionAmount'],
+    ).astype({'TransactionAmount': float})
+
+
+def _unfiltered(start, end, locations):
+    # Customer rollups are lifetime totals, not broken down by date or location
+    if start is not None or end is not None or locations:
+        raise ValueError("Customer rollups can't be filtered by date or location")
+
+
+def customer_totals(limit=20, start=None, end=None, locations=None):
+    _unfiltered(start, end, locations)
+    rows = CustomerRollup.objects.order_by('-amount_total').values_list('customer_id', 'amount_total')[:limit]
+    return pd.DataFrame(list(rows), columns=['CustomerID', 'TransactionAmount']).astype({'TransactionAmount': float})
+
+
+def customer_activity(start=None, end=None, locations=None):
+    """Every customer's transaction count and total amount (CLV)."""
+    _unfiltered(start, end, locations)
+    rows = CustomerRollup.objects.values_list('customer_id', 'transaction_count', 'amount_total')
+    return pd.DataFrame(list(rows), columns=['CustomerID', 'TotalTransactions', 'CLV']).astype(
+        {'TotalTransactions': 'int64', 'CLV': float})
+
+
+def transaction_counts(by, locations=None, start=None, end=None):
+    """Transaction counts grouped by ``'month'``, ``'weekday'`` or ``'hour'``.
+
+    Weekdays are numbered like pandas' ``dayofweek`` (Monday=0) and always
+    cover the whole week.
+    """
+    buckets = _buckets(start, end, locations)
+
+    if by == 'month':
+        rows = buckets.annotate(key=TruncMonth('date')).values('key').annotate(n=Sum('transaction_count'))
+        counts = pd.DataFrame([(row['key'].strftime('%Y-%m'), row['n']) for row in rows], columns=['Month', 'TotalTransactions'])
+        return counts.astype({'TotalTransactions': 'int64'}).sort_values('Month').reset_index(drop=True)
+    if by == 'weekday':
+        rows = buckets.annotate(key=ExtractIsoWeekDay('date')).values('key').annotate(n=Sum('transaction_count'))
+        counts = pd.Series({row['key'] - 1: row['n'] for row in rows}, dtype='int64')
+        counts = counts.reindex(range(7), fill_value=0)
+        return pd.DataFrame({'DayOfWeek': counts.index, 'TotalTransactions': counts.values})
+    if by == 'hour':
+        rows = buckets.values('hour').annotate(n=Sum('transaction_count')).order_by('hour')
+        counts = pd.DataFrame([(row['hour'], row['n']) for row in rows], columns=['Hour', 'TotalTransactions'])
+        return counts.astype('int64')
+    raise ValueError(f"Unknown grouping {by!r}")
+
+
+def monthly_totals(start=None, end=None, locations=None):
+    rows = (_buckets(start, end, locations).annotate(month=TruncMonth('date')).values('month')
+            .annotate(revenue=Sum('amount_total'), n=Sum('transaction_count')).order_by('month'))
+    return pd.DataFrame(
+        [(row['month'].strftime('%Y-%m'), row['revenue'], row['n']) for row in rows],
+        columns=['TransactionMonth', 'TotalRevenue', 'TotalTransactions'],
+    ).astype({'TotalRevenue': float, 'TotalTransactions': 'int64'})
+
+
+def customer_value(limit=20, quantile=0.8, start=None, end=None, locations=None):
+    """Top customers by lifetime value plus the high-value segment sizes.
+
+    The high-value threshold is the ``quantile`` of customer totals, read
+    as a single offset lookup on the ``amount_total`` index.
+    """
+    _unfiltered(start, end, locations)
+    customers = CustomerRollup.objects.all()
+    total = customers.count()
+    if not total:
+        return (pd.DataFrame(columns=['CustomerID', 'CLV', 'HighValueCustomer']),
+                pd.DataFrame(columns=['HighValueCustomer', 'Customers']))
+    threshold = customers.order_by('amount_total').values_list('amount_total', flat=True)[int(quantile * (total - 1))]
+    high_value = customers.filter(amount_total__gte=threshold).count()
+
+    top = pd.DataFrame(list(customers.order_by('-amount_total').values_list('customer_id', 'amount_total')[:limit]),
+                       columns=['CustomerID', 'CLV'])
+    top['HighValueCustomer'] = (top['CLV'] >= threshold).astype(int)
+    segments = pd.DataFrame({'HighValueCustomer': [0, 1], 'Customers': [total - high_value, high_value]})
+    return top, segments
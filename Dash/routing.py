@@ -0,0 +1,7 @@
+from django.urls import path
+
+from . import live
+
+websocket_urlpatterns = [
+    path('ws/dashboard/', live.DashboardConsumer.as_asgi()),
+]
@@ -0,0 +1,48 @@
+"""Single-pass row sampling over chunked transaction reads.
+
+Both samplers consume an iterable of DataFrame chunks (from
+``columnar.iter_chunks``) and touch every row exactly once, so no line count
+or skip list is needed up front. With a fixed seed the same source yields the
+same sample on every call.
+"""
+import numpy as np
+import pandas as pd
+
+
+def bernoulli_sample(chunks, rate, seed=None):
+    """Keep each row independently with probability ``rate``."""
+    if not 0 < rate <= 1:
+        raise ValueError(f"Sample rate must be in (0, 1], got {rate}")
+    rng = np.random.default_rng(seed)
+    kept = [chunk[rng.random(len(chunk)) < rate] for chunk in chunks]
+    if not kept:
+        return pd.DataFrame()
+    return pd.concat(kept, ignore_index=True)
+
+
+def reservoir_sample(chunks, k, seed=None):
+    """Uniform sample of exactly ``k`` rows (or all rows if there are fewer).
+
+    Every row gets a random key and the ``k`` smallest keys seen so far are
+    kept, which is equivalent to classic reservoir sampling but vectorised
+    per chunk. Row order in the result follows the source.
+    """
+    rng = np.random.default_rng(seed)
+    reservoir = None
+    keys = np.empty(0)
+    offset = 0
+    for chunk in chunks:
+        chunk = chunk.set_axis(np.arange(offset, offset + len(chunk)))
+        offset += len(chunk)
+        chunk_keys = rng.random(len(chunk))
+        if reservoir is None:
+            reservoir, keys = chunk, chunk_keys
+        else:
+            reservoir = pd.concat([reservoir, chunk])
+            keys = np.concatenate([keys, chunk_keys])
+        if len(keys) > k:
+            smallest = np.argpartition(keys, k)[:k]
+            reservoir, keys = reservoir.iloc[smallest], keys[smallest]
+    if reservoir is None:
+        return pd.DataFrame()
+    return reservoir.sort_index().reset_index(drop=True)
@@ -0,0 +1,57 @@
+"""Run independent figure builds concurrently.
+
+Each task is a zero-argument callable (typically a ``figure_cache`` lookup
+that builds and serialises one chart on a miss). Tasks run in a thread
+pool of ``DASHBOARD_FIGURE_WORKERS`` threads; the tables they share come
+from ``DashboardData``, whose properties are computed once even when several
+builders ask for them at the same time. With one worker the tasks simply run
+in order.
+"""
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+WORKERS = getattr(settings, 'DASHBOARD_FIGURE_WORKERS', 4)
+
+
+def _timed(name, task):
+    started = time.perf_counter()
+    try:
+        return task(), time.perf_counter() - started
+    finally:
+        logger.debug("Built %s in %.1f ms", name, (time.perf_counter() - started) * 1000)
+
+
+def _in_thread(name, task):
+    try:
+        return _timed(name, task)
+    finally:
+        # Worker threads get their own database connections; don't leak them
+        connections.close_all()
+
+
+def run(tasks, workers=None):
+    """Run ``{name: callable}`` and return ``(results, timings)``.
+
+    Both are dicts keyed by name, in the order of ``tasks``; timings are in
+    seconds. The first exception raised by a task is re-raised.
+    """
+    workers = WORKERS if workers is None else workers
+    if workers <= 1 or len(tasks) <= 1:
+        done = {name: _timed(name, task) for name, task in tasks.items()}
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, len(tasks)), thread_name_prefix='figures') as pool:
+            # Each task runs in a copy of the caller's context, so per-request
+            # state such as timing's collected stages follows it into the pool
+            futures = {name: pool.submit(contextvars.copy_context().run, _in_thread, name, task)
+                       for name, task in tasks.items()}
+            done = {name: future.result() for name, future in futures.items()}
+    results = {name: result for name, (result, _) in done.items()}
+    timings = {name: elapsed for name, (_, elapsed) in done.items()}
+    return results, timings
@@ -0,0 +1,140 @@
+"""Explicit column types for the transactions file.
+
+``read_csv`` reads the file with a fixed dtype per column instead of letting
+pandas infer one, and returns it in its most compact form:
+
+* identifiers such as ``C1010011`` become integers (see ``encode_ids``),
+* low-cardinality strings become categoricals,
+* amounts become float32 when every value survives the round trip to the
+  paisa, float64 otherwise,
+* dates are parsed with ``DATE_FORMAT`` as they are read.
+
+``memory_report`` shows what each column of a DataFrame costs.
+"""
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+# strftime format of TransactionDate / CustomerDOB in the source file
+DATE_FORMAT = getattr(settings, 'TRANSACTION_DATE_FORMAT', '%d/%m/%y')
+
+ID = 'id'
+CATEGORY = 'category'
+AMOUNT = 'amount'
+DATE = 'date'
+
+COLUMNS = {
+    'TransactionID': ID,
+    'CustomerID': ID,
+    'CustomerDOB': CATEGORY,
+    'CustGender': CATEGORY,
+    'CustLocation': CATEGORY,
+    'CustAccountBalance': AMOUNT,
+    'TransactionDate': DATE,
+    'TransactionTime': CATEGORY,
+    'TransactionAmount (INR)': AMOUNT,
+}
+
+# How the CSV reader sees each kind before it is compacted
+_READ_DTYPES = {ID: str, CATEGORY: 'category', AMOUNT: 'float64', DATE: 'category'}
+
+# Largest rounding error float32 may introduce on an amount
+AMOUNT_TOLERANCE = 0.005
+
+
+def encode_ids(values):
+    """Split identifiers like ``C0056707`` into a shared prefix and integers.
+
+    Returns ``(numbers, prefix, width)`` where ``width`` is the zero-padded
+    digit count (0 when the digits are never padded), or None if the values
+    don't all share one prefix followed by digits.
+    """
+    parts = pd.Series(values, dtype=object).str.extract(r'^(\D*)(\d+)$')
+    if parts[1].isna().any():
+        return None
+    prefixes = parts[0].unique()
+    if len(prefixes) != 1:
+        return None
+    digits = parts[1]
+    widths = digits.str.len()
+    padded = digits.str.startswith('0') & (widths > 1)
+    if padded.any():
+        if widths.nunique() != 1:
+            return None
+        width = int(widths.iloc[0])
+    else:
+        width = 0
+    numbers = digits.astype(np.int64).to_numpy()
+    if numbers.max(initial=0) < np.iinfo(np.int32).max:
+        numbers = numbers.astype(np.int32)
+    return numbers, prefixes[0], width
+
+
+def format_ids(numbers, prefix, width=0):
+    """Inverse of ``encode_ids``: integers back to identifier strings."""
+    digits = pd.Series(numbers).astype(str)
+    if width:
+        digits = digits.str.zfill(width)
+    return (prefix + digits).to_numpy(dtype=object)
+
+
+def compact_amounts(values):
+    """float32 if no value moves by more than ``AMOUNT_TOLERANCE``, else float64."""
+    values = np.asarray(values, dtype=np.float64)
+    narrow = values.astype(np.float32)
+    error = np.abs(narrow.astype(np.float64) - values)
+    if np.nanmax(error, initial=0) <= AMOUNT_TOLERANCE:
+        return narrow
+    return values
+
+
+def parse_dates(values, date_format=None):
+    """Parse date strings with a fixed format; unparseable values become NaT."""
+    values = pd.Series(values)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Parse each distinct date once
+        categories = pd.to_datetime(values.cat.categories, format=date_format or DATE_FORMAT, errors='coerce')
+        return pd.Series(categories.take(values.cat.codes.to_numpy(), allow_fill=True, fill_value=pd.NaT), index=values.index)
+    return pd.to_datetime(values, format=date_format or DATE_FORMAT, errors='coerce')
+
+
+def read_csv(source, columns=None):
+    """Read ``source`` with the explicit schema into a compact DataFrame.
+
+    Identifier columns that ``encode_ids`` can't split are kept as
+    categoricals. Returns the frame and, per identifier column, the
+    ``(prefix, width)`` needed to format its integers again.
+    """
+    header = pd.read_csv(source, nrows=0).columns
+    names = [name for name in header if columns is None or name in columns]
+    dtypes = {name: _READ_DTYPES[COLUMNS.get(name, CATEGORY)] for name in names}
+    df = pd.read_csv(source, usecols=names, dtype=dtypes)
+
+    ids = {}
+    for name in names:
+        kind = COLUMNS.get(name, CATEGORY)
+        if kind == ID:
+            encoded = encode_ids(df[name])
+            if encoded is None:
+                df[name] = df[name].astype('category')
+            else:
+                numbers, prefix, width = encoded
+                df[name] = numbers
+                ids[name] = (prefix, width)
+        elif kind == AMOUNT:
+            df[name] = compact_amounts(df[name])
+        elif kind == DATE:
+            df[name] = parse_dates(df[name])
+    return df, ids
+
+
+def memory_report(df):
+    """Bytes used by each column of ``df`` (strings and categories included)."""
+    usage = df.memory_usage(index=False, deep=True)
+    report = pd.DataFrame({
+        'dtype': df.dtypes.astype(str),
+        'bytes': usage,
+        'bytes_per_row': usage / max(len(df), 1),
+    })
+    report.index.name = 'column'
+    return report
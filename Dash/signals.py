@@ -0,0 +1,10 @@
+from django.dispatch import Signal
+
+# Sent with ``source`` (path of the transactions file) whenever the data the
+# dashboard reads from changes: a columnar rebuild or a rollup refresh
+transactions_refreshed = Signal()
+
+# Sent with ``source`` and ``rows`` (the newly appended rows, CSV column
+# names) once a rollup refresh has committed them; ``rows`` is None when the
+# rollups were rebuilt from scratch instead
+transactions_appended = Signal()
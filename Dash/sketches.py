@@ -0,0 +1,225 @@
+"""Bounded-memory summaries of the full transactions data.
+
+``SpaceSaving`` tracks the heaviest keys (e.g. customers by total amount) and
+``KLL`` approximates quantiles. Both are fed chunk by chunk in one streaming
+pass, can be merged (summaries of different chunks or workers combine into
+the summary of their union) and round-trip through plain dicts for storage
+as JSON.
+
+Error bounds:
+
+* ``SpaceSaving(capacity)``: each reported total over-estimates the true
+  total by at most its ``error``, and every error is at most
+  ``total_weight / capacity``. A key whose true total exceeds that is
+  guaranteed to be tracked.
+* ``KLL(k)``: the rank of a returned quantile is off by about ``1.7 / k`` of
+  the row count (with high probability), using O(k log(n / k)) memory.
+"""
+import numpy as np
+import pandas as pd
+
+# Summaries kept with every columnar build (see ``summarize``)
+LOCATION_CAPACITY = 1000
+CUSTOMER_CAPACITY = 10_000
+QUANTILE_K = 200
+
+
+class SpaceSaving:
+    """Weighted Space-Saving heavy-hitters summary."""
+
+    def __init__(self, capacity=1000):
+        self.capacity = capacity
+        self.total = 0.0
+        self.counts = pd.Series(dtype=np.float64)
+        self.errors = pd.Series(dtype=np.float64)
+
+    @property
+    def floor(self):
+        """Largest total an untracked key can have."""
+        if len(self.counts) < self.capacity:
+            return 0.0
+        return float(self.counts.min())
+
+    def update(self, keys, weights=None):
+        """Add one chunk of ``keys`` (with per-row ``weights``, default 1)."""
+        keys = pd.Series(keys)
+        weights = pd.Series(1.0 if weights is None else np.asarray(weights, dtype=np.float64), index=keys.index)
+        exact = weights.groupby(keys.to_numpy(), sort=False).sum()
+        chunk = SpaceSaving(max(self.capacity, len(exact)))
+        chunk.total = float(weights.sum())
+        chunk.counts = exact.astype(np.float64)
+        chunk.errors = pd.Series(0.0, index=exact.index)
+        self.merge(chunk)
+        return self
+
+    def merge(self, other):
+        """Fold ``other`` into this summary (Agarwal et al.'s mergeable rule)."""
+        # A key missing from one summary may still have had up to its floor there
+        index = self.counts.index.union(other.counts.index)
+        counts = (self.counts.reindex(index, fill_value=self.floor)
+                  + other.counts.reindex(index, fill_value=other.floor))
+        errors = (self.errors.reindex(index, fill_value=self.floor)
+                  + other.errors.reindex(index, fill_value=other.floor))
+        keep = counts.nlargest(self.capacity).index
+        self.counts, self.errors = counts[keep], errors[keep]
+        self.total += other.total
+        return self
+
+    def top(self, n):
+        """The ``n`` heaviest keys: ``key``, ``total``, ``error`` and ``guaranteed``.
+
+        ``guaranteed`` marks keys certain to belong in the true top ``n``.
+        """
+        counts = self.counts.nlargest(n + 1)
+        lower = counts - self.errors[counts.index]
+        runner_up = counts.iloc[n] if len(counts) > n else self.floor
+        top = pd.DataFrame({
+            'key': counts.index[:n],
+            'total': counts.to_numpy()[:n],
+            'error': self.errors[counts.index].to_numpy()[:n],
+        })
+        top['guaranteed'] = lower.to_numpy()[:n] >= runner_up
+        return top
+
+    def to_dict(self):
+        return {
+            'capacity': self.capacity,
+            'total': self.total,
+            'keys': self.counts.index.tolist(),
+            'counts': self.counts.tolist(),
+            'errors': self.errors.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['capacity'])
+        sketch.total = data['total']
+        sketch.counts = pd.Series(data['counts'], index=data['keys'], dtype=np.float64)
+        sketch.errors = pd.Series(data['errors'], index=data['keys'], dtype=np.float64)
+        return sketch
+
+
+class KLL:
+    """KLL quantile sketch (Karnin, Lang and Liberty)."""
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # Compact an even number of items: every other one moves up a
+                # level with twice the weight, starting at a random offset
+                odd = items[:len(items) % 2]
+                pairs = items[len(odd):]
+                promoted = pairs[self._rng.integers(2)::2]
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                self.levels[level] = odd
+            level += 1
+
+    def update(self, values):
+        """Add one chunk of values; NaNs are skipped."""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        self.n += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+        return self
+
+    def _weighted(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(values), 2 ** level) for level, values in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], np.cumsum(weights[order])
+
+    def quantile(self, q):
+        """Approximate ``q``-quantile (``q`` may be an array); NaN when empty."""
+        items, cumulative = self._weighted()
+        if not len(items):
+            return np.nan if np.ndim(q) == 0 else np.full(np.shape(q), np.nan)
+        positions = np.searchsorted(cumulative, np.asarray(q) * cumulative[-1], side='left')
+        return items[np.minimum(positions, len(items) - 1)]
+
+    def rank(self, value):
+        """Approximate fraction of values strictly below ``value``."""
+        items, cumulative = self._weighted()
+        if not len(items):
+            return np.nan
+        below = np.searchsorted(items, value, side='left')
+        return cumulative[below - 1] / cumulative[-1] if below else 0.0
+
+    def to_dict(self):
+        return {'k': self.k, 'n': self.n, 'levels': [items.tolist() for items in self.levels]}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['k'])
+        sketch.n = data['n']
+        sketch.levels = [np.asarray(items, dtype=np.float64) for items in data['levels']]
+        return sketch
+
+
+def summarize(chunks):
+    """One pass over typed transaction chunks (see ``columnar``) into sketches.
+
+    Returns top locations and customers by amount, the quantiles of
+    transaction amounts, and the same quantiles per ``TransactionMonth``.
+    Chunks are summarised independently and merged, exactly as summaries
+    from separate workers would be.
+    """
+    locations = SpaceSaving(LOCATION_CAPACITY)
+    customers = SpaceSaving(CUSTOMER_CAPACITY)
+    amounts = KLL(QUANTILE_K, seed=0)
+    monthly = {}
+    for i, chunk in enumerate(chunks):
+        amount = chunk['TransactionAmount (INR)'].to_numpy(dtype=np.float64)
+        locations.merge(SpaceSaving(LOCATION_CAPACITY).update(chunk['CustLocation'].to_numpy(), amount))
+        customers.merge(SpaceSaving(CUSTOMER_CAPACITY).update(chunk['CustomerID'].to_numpy(), amount))
+        # Every row, including the undated ones the monthly sketches leave out
+        amounts.merge(KLL(QUANTILE_K, seed=i).update(amount))
+        for month, rows in pd.Series(amount).groupby(chunk['TransactionMonth'].to_numpy(), sort=False):
+            sketch = KLL(QUANTILE_K, seed=i).update(rows.to_numpy())
+            if month in monthly:
+                monthly[month].merge(sketch)
+            else:
+                monthly[month] = sketch
+    return {'locations': locations, 'customers': customers, 'amounts': amounts, 'amounts_by_month': monthly}
+
+
+def to_dict(summary):
+    return {
+        'locations': summary['locations'].to_dict(),
+        'customers': summary['customers'].to_dict(),
+        'amounts': summary['amounts'].to_dict(),
+        'amounts_by_month': {month: sketch.to_dict() for month, sketch in summary['amounts_by_month'].items()},
+    }
+
+
+def from_dict(data):
+    return {
+        'locations': SpaceSaving.from_dict(data['locations']),
+        'customers': SpaceSaving.from_dict(data['customers']),
+        'amounts': KLL.from_dict(data['amounts']),
+        'amounts_by_month': {month: KLL.from_dict(sketch) for month, sketch in data['amounts_by_month'].items()},
+    }
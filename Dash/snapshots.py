@@ -0,0 +1,176 @@
+"""Immutable, versioned snapshots of the dashboard pages.
+
+``publish`` (run by ``manage.py refresh_snapshots``) rebuilds the columnar
+cache, brings the rollups up to date and renders every chart of the
+dashboard and the combined page, unfiltered, into a new directory under
+``SNAPSHOT_DIR``. Only once that directory is complete does it replace
+``current.json``, the pointer readers follow, so a request sees either the
+old snapshot or the new one and a failed or slow refresh leaves the old one
+in place.
+
+With ``DASHBOARD_SNAPSHOTS`` enabled the views serve unfiltered pages straight
+from the current snapshot and compute filtered ones from the published
+columnar build (see ``columnar.REFRESH_ON_READ``), so nothing on the request
+path reads, hashes or even stats the CSV.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.http import HttpResponse
+
+from . import columnar, figures, rollups, scheduler
+
+logger = logging.getLogger(__name__)
+
+ENABLED = getattr(settings, 'DASHBOARD_SNAPSHOTS', False)
+SNAPSHOT_DIR = getattr(settings, 'DASHBOARD_SNAPSHOT_DIR', os.path.join(settings.BASE_DIR, 'data', 'snapshots'))
+
+# Snapshots kept on disk, so readers still holding an older pointer can finish
+KEEP = 3
+
+POINTER = 'current.json'
+
+
+class Snapshot:
+    """One published snapshot; read-only."""
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+
+    @property
+    def version(self):
+        return self.meta['version']
+
+    def read(self, page, filename):
+        """Contents of one rendered file, or '' if the snapshot doesn't have it."""
+        try:
+            with open(os.path.join(self.path, page, filename)) as f:
+                return f.read()
+        except FileNotFoundError:
+            return ''
+
+    def page(self, page):
+        """Chart HTML of ``page`` by template variable."""
+        return {name: self.read(page, f'{name}.html') for name in self.meta['pages'].get(page, [])}
+
+
+def _root(source):
+    name = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(SNAPSHOT_DIR, name)
+
+
+def _write(path, text):
+    # Sibling temp file plus rename, so readers never see half a file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def current(source=figures.Transactions):
+    """The snapshot ``current.json`` points at, or None before the first publish."""
+    root = _root(source)
+    try:
+        with open(os.path.join(root, POINTER)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return Snapshot(os.path.join(root, meta['version']), meta)
+
+
+def not_published():
+    return HttpResponse(
+        "The dashboard data hasn't been published yet; run `manage.py refresh_snapshots`.",
+        status=503, content_type='text/plain', headers={'Retry-After': '60'},
+    )
+
+
+def _render(name, data):
+    fig = figures.FIGURES[name](data)
+    if fig is None:
+        return None
+    return figures.render_html(fig), fig.to_json()
+
+
+def _render_pages(source):
+    from .testing import combined_figures
+
+    data = figures.DashboardData(source)
+    rendered, timings = scheduler.run({name: lambda name=name: _render(name, data) for name in figures.FIGURES})
+    pages = {'dashboard': {}, 'combined': {}}
+    for name, result in rendered.items():
+        if result is not None:
+            html, spec = result
+            pages['dashboard'][f'{name}.html'] = html
+            pages['dashboard'][f'{name}.json'] = spec
+    for name, html in combined_figures(source).items():
+        pages['combined'][f'{name}.html'] = html
+    return pages, timings
+
+
+def _prune(root, keep, current_version):
+    snapshots = sorted(entry for entry in os.listdir(root)
+                       if os.path.isdir(os.path.join(root, entry)) and not entry.startswith('.'))
+    for entry in snapshots[:-max(keep, 1)]:
+        if entry != current_version:
+            shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+
+
+def publish(source=figures.Transactions, keep=KEEP, force=False):
+    """Render and publish a new snapshot of ``source``; returns its metadata.
+
+    Returns None without publishing when the data hasn't changed since the
+    current snapshot, unless ``force`` is set.
+    """
+    started = time.perf_counter()
+    root = _root(source)
+    os.makedirs(root, exist_ok=True)
+
+    columnar.ensure_cache(source)
+    if rollups.available(source):
+        rollups.refresh(source)
+    data_version = figures.data_version(source)
+
+    previous = current(source)
+    if previous is not None and previous.meta['data_version'] == data_version and not force:
+        return None
+
+    now = datetime.now(timezone.utc)
+    version = f"{now:%Y%m%dT%H%M%S}-{hashlib.sha1(data_version.encode()).hexdigest()[:8]}"
+    tmp = tempfile.mkdtemp(dir=root, prefix='.build-')
+    try:
+        pages, timings = _render_pages(source)
+        for page, files in pages.items():
+            os.makedirs(os.path.join(tmp, page))
+            for filename, text in files.items():
+                with open(os.path.join(tmp, page, filename), 'w') as f:
+                    f.write(text)
+        meta = {
+            'version': version,
+            'data_version': data_version,
+            'source': os.path.abspath(source),
+            'created': now.isoformat(),
+            'pages': {page: sorted({os.path.splitext(filename)[0] for filename in files})
+                      for page, files in pages.items()},
+            'timings': {name: round(seconds, 4) for name, seconds in timings.items()},
+            'seconds': round(time.perf_counter() - started, 3),
+        }
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.rename(tmp, os.path.join(root, version))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    # The swap: readers follow the pointer to the complete directory
+    _write(os.path.join(root, POINTER), json.dumps(meta, indent=2))
+    _prune(root, keep, version)
+    logger.info("Published snapshot %s in %.1fs", version, meta['seconds'])
+    return meta
@@ -1,21 +1,23 @@
 import plotly.express as px
-import pandas as pd
 import os
 from django.shortcuts import render
 from django.conf import settings
 
+from . import columnar, figures, snapshots
+
 # File paths
 Transactions = os.path.join(settings.BASE_DIR, 'data', "bank_transactions.csv")
 
-def combined_dashboard(request):
-    # Load data
-    df = pd.read_csv(Transactions)
+def combined_figures(source=Transactions):
+    """HTML of the combined dashboard's charts, by template variable."""
+    # Load only the columns used below from the columnar cache
+    df = columnar.load_columns(['CustomerID', 'CustLocation', 'TransactionAmount (INR)'], source=source)
 
     # Clean column name if necessary
     df.rename(columns={'TransactionAmount (INR)': 'TransactionAmount'}, inplace=True)
 
     # Aggregate transaction amounts per location
-    transaction_amount_per_location = df.groupby('CustLocation')['TransactionAmount'].sum().reset_index()
+    transaction_amount_per_location = df.groupby('CustLocation', observed=True)['TransactionAmount'].sum().reset_index()
 
     # Get top 20 locations by total transaction amount
     top_20_transaction_amounts = transaction_amount_per_location.nlargest(20, 'TransactionAmount')
@@ -44,12 +46,13 @@ def combined_dashboard(request):
 
     # Aggregate top 20 customers by total transaction amount
     top_customers = (
-        df.groupby('CustomerID')['TransactionAmount']
+        df.groupby('CustomerID', observed=True)['TransactionAmount']
         .sum()
         .sort_values(ascending=False)
         .head(20)
         .reset_index()
     )
+    top_customers['CustomerID'] = columnar.format_ids('CustomerID', top_customers['CustomerID'], source)
 
     # Create an interactive bar chart for top 20 customers
     fig1 = px.bar(
@@ -78,11 +81,22 @@ def combined_dashboard(request):
     fig1.update_traces(texttemplate='%{text:.2s}', textposition='outside')
 
     # Convert figures to HTML for embedding in the template
-    fig_html = fig.to_html(full_html=False)
-    fig1_html = fig1.to_html(full_html=False)
+    return {
+        'fig': figures.render_html(fig),
+        'fig1': figures.render_html(fig1),
+    }
+
+
+def combined_dashboard(request):
+    if snapshots.ENABLED:
+        # Pre-rendered by `manage.py refresh_snapshots`
+        snapshot = snapshots.current(Transactions)
+        if snapshot is None:
+            return snapshots.not_published()
+        context = snapshot.page('combined')
+    else:
+        context = combined_figures(Transactions)
 
     # Render the dashboard template with the figures
-    return render(request, 'visualization/plotly_chart.html', {
-        'fig': fig_html,
-        'fig1': fig1_html,
-    })
+    context['plotlyjs_static'] = figures.PLOTLYJS_MODE == 'static'
+    return render(request, 'visualization/plotly_chart.html', context)
@@ -1,3 +1,994 @@
-from django.test import TestCase
+import gzip
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import warnings
+from datetime import date, datetime, timedelta, timezone
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from dash import Patch, no_update
+from dash.exceptions import PreventUpdate
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from . import (benchmark, columnar, dash_app, engine, features, figure_cache, figures, live, nssf, queries, rollups,
+               sampling, schema, sketches, snapshots, timing, views)
+from .filters import TransactionFilter
+from .models import CustomerRollup, RollupState, Transaction, TransactionRollup
+from .signals import transactions_appended, transactions_refreshed
+
+# Pages link static files, which have no manifest until collectstatic runs
+STATIC_FILES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+class SyntheticSourceMixin:
+    """A small seeded transactions file with its own columnar cache."""
+
+    rows = 2000
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp = tempfile.mkdtemp()
+        cls.source = benchmark.generate(os.path.join(cls.tmp, 'transactions.csv'), cls.rows, seed=1)
+        cls.edit_source(cls.source)
+        cls.patches = [
+            mock.patch.object(columnar, 'CACHE_DIR', os.path.join(cls.tmp, 'cache')),
+            mock.patch.object(views, 'Transactions', cls.source),
+        ]
+        for patch in cls.patches:
+            patch.start()
+        columnar.ensure_cache(cls.source)
+
+    @classmethod
+    def edit_source(cls, path):
+        """Change the generated file before its cache is built."""
+
+    @classmethod
+    def tearDownClass(cls):
+        for patch in cls.patches:
+            patch.stop()
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+        super().tearDownClass()
+
+
+class ParseDatesTests(SimpleTestCase):
+    def test_missing_categorical_dates_are_nat(self):
+        values = pd.Series(['01/02/16', None, '03/04/16'], dtype='category')
+        parsed = schema.parse_dates(values, '%d/%m/%y')
+        self.assertEqual(parsed[0], pd.Timestamp('2016-02-01'))
+        self.assertTrue(pd.isna(parsed[1]))
+        self.assertEqual(parsed[2], pd.Timestamp('2016-04-03'))
+
+    def test_unparseable_dates_are_nat(self):
+        parsed = schema.parse_dates(pd.Series(['01/02/16', 'not a date']), '%d/%m/%y')
+        self.assertEqual(parsed[0], pd.Timestamp('2016-02-01'))
+        self.assertTrue(pd.isna(parsed[1]))
+
+
+class SamplingTests(SimpleTestCase):
+    def chunks(self):
+        frame = pd.DataFrame({'a': range(1000), 'b': [1.5] * 1000})
+        return [frame.iloc[start:start + 100] for start in range(0, 1000, 100)]
+
+    def test_bernoulli_sample_is_deterministic_with_a_seed(self):
+        first = sampling.bernoulli_sample(self.chunks(), 0.1, seed=3)
+        second = sampling.bernoulli_sample(self.chunks(), 0.1, seed=3)
+        pd.testing.assert_frame_equal(first, second)
+        self.assertTrue(50 < len(first) < 150)
+
+    def test_empty_chunk_keeps_columns_and_dtypes(self):
+        empty = pd.DataFrame({'a': pd.Series(dtype='int64'), 'b': pd.Series(dtype='float64')})
+        sample = sampling.bernoulli_sample([empty], 0.5, seed=0)
+        self.assertEqual(list(sample.columns), ['a', 'b'])
+        self.assertEqual(list(sample.dtypes), list(empty.dtypes))
+
+    def test_reservoir_sample_keeps_k_rows_in_source_order(self):
+        sample = sampling.reservoir_sample(self.chunks(), 50, seed=0)
+        self.assertEqual(len(sample), 50)
+        self.assertTrue(sample['a'].is_monotonic_increasing)
+
+    def test_rejects_bad_rates(self):
+        with self.assertRaises(ValueError):
+            sampling.bernoulli_sample(self.chunks(), 0)
+
+
+class EmptyFilterTests(SyntheticSourceMixin, TestCase):
+    def test_iter_chunks_yields_typed_empty_chunk(self):
+        rows = columnar.select_rows(self.source, date(2030, 1, 1), date(2030, 1, 7))
+        chunks = list(columnar.iter_chunks(['TransactionDate', 'CustLocation'], source=self.source, rows=rows))
+        self.assertEqual(len(chunks), 1)
+        self.assertTrue(chunks[0].empty)
+        self.assertEqual(list(chunks[0].columns), ['TransactionDate', 'CustLocation'])
+
+    def test_figures_of_a_filter_matching_nothing(self):
+        data = figures.DashboardData(self.source, TransactionFilter(start=date(2030, 1, 1), end=date(2030, 1, 7)))
+        self.assertTrue(data.df.empty)
+        self.assertIn('TransactionMonth', data.df.columns)
+        for name in figures.FIGURES:
+            figures.to_json(name, data)
+
+    def test_figure_api_of_a_filter_matching_nothing(self):
+        client = Client()
+        # Charts of counts are drawn empty; the segmentation has nothing to plot
+        for name, status in (('fig_month', 200), ('fig_peak_hours', 200), ('fig_segmentation', 404)):
+            response = client.get(f'/tms/api/figures/{name}/', {'start': '2030-01-01', 'end': '2030-01-07'})
+            self.assertEqual(response.status_code, status, name)
+            if status == 200:
+                self.assertEqual(set(json.loads(response.content)), {'data', 'layout'})
+
+    def test_unfiltered_figure_api(self):
+        client = Client()
+        response = client.get(reverse('figure_json', args=['fig_month']))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        spec = json.loads(response.content)
+        self.assertEqual(set(spec), {'data', 'layout'})
+        self.assertEqual(spec['data'][0]['type'], 'bar')
+        self.assertTrue(response['ETag'])
+        again = client.get(reverse('figure_json', args=['fig_month']), headers={'if-none-match': response['ETag']})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b'')
+
+
+class LoadTransactionsTests(SyntheticSourceMixin, TransactionTestCase):
+    # The load sets SQLite pragmas, which cannot change inside a transaction
+    def test_loads_hhmmss_times(self):
+        call_command('load_transactions', source=self.source, stdout=open(os.devnull, 'w'))
+        self.assertEqual(Transaction.objects.count(), self.rows)
+        self.assertFalse(Transaction.objects.filter(transaction_time=None).exists())
+        hours = queries.transaction_counts('hour')
+        self.assertEqual(hours['TotalTransactions'].sum(), self.rows)
+
+
+class ConditionalResponseTests(SyntheticSourceMixin, TestCase):
+    def setUp(self):
+        figure_cache.invalidate()
+        self.url = reverse('figure_json', args=['fig_month'])
+
+    def test_revalidation_reads_only_the_version_token(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        with mock.patch.object(figures, 'data_version') as data_version, self.assertNumQueries(0):
+            response = self.client.get(self.url, headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        data_version.assert_not_called()
+
+    def test_refresh_changes_the_etag(self):
+        tag = self.client.get(self.url)['ETag']
+        transactions_refreshed.send(sender=None, source=self.source)
+        with mock.patch.object(figures, 'data_version', return_value='refreshed'):
+            response = self.client.get(self.url, headers={'if-none-match': tag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], tag)
+
+    def test_body_is_gzipped_when_accepted(self):
+        plain = self.client.get(self.url)
+        compressed = self.client.get(self.url, headers={'accept-encoding': 'gzip, deflate'})
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertIn('Accept-Encoding', compressed['Vary'])
+        self.assertEqual(compressed['ETag'], plain['ETag'])
+
+    @override_settings(STORAGES=STATIC_FILES)
+    def test_dashboard_page_revalidates(self):
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('dashboard'), headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+
+class TimingTests(SyntheticSourceMixin, TestCase):
+    def setUp(self):
+        figure_cache.invalidate()
+        for patch in (mock.patch.object(timing, 'ENABLED', True), mock.patch.dict(timing._histograms, clear=True)):
+            patch.start()
+            self.addCleanup(patch.stop)
+        # The middleware is loaded with the first request of a client
+        self.client = Client()
+
+    @override_settings(STORAGES=STATIC_FILES)
+    def test_server_timing_lists_the_stages(self):
+        with mock.patch.object(views, 'LAZY_CHARTS', False):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        stages = [entry.split(';dur=')[0] for entry in response['Server-Timing'].split(', ')]
+        for name in ('version', 'figures', 'template', 'fig_month.build', 'fig_month.html'):
+            self.assertIn(name, stages)
+        self.assertEqual(stages[-1], 'total')
+
+    def test_metrics_in_prometheus_text_format(self):
+        self.client.get(reverse('figure_json', args=['fig_month']))
+        self.client.get(reverse('figure_json', args=['fig_month']))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        lines = response.content.decode().splitlines()
+        self.assertIn('# TYPE dashboard_request_seconds histogram', lines)
+        self.assertIn('dashboard_request_seconds_count{view="figure_json"} 2', lines)
+        self.assertIn('dashboard_request_seconds_bucket{view="figure_json",le="+Inf"} 2', lines)
+        self.assertIn('dashboard_figure_seconds_count{figure="fig_month",stage="build"} 1', lines)
+        self.assertIn('# TYPE dashboard_figure_cache_total counter', lines)
+        counters = figure_cache.stats()
+        for event in ('hits', 'misses'):
+            self.assertIn(f'dashboard_figure_cache_total{{event="{event}"}} {counters[event]}', lines)
+
+    def test_middleware_unused_when_disabled(self):
+        with mock.patch.object(timing, 'ENABLED', False):
+            with self.assertRaises(MiddlewareNotUsed):
+                timing.ServerTimingMiddleware(lambda request: None)
+            self.assertEqual(Client().get(reverse('metrics')).status_code, 404)
+
+
+class StaffDashboardTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.path = os.path.join(self.tmp, 'staff.xlsx')
+        for patch in (mock.patch.object(columnar, 'CACHE_DIR', os.path.join(self.tmp, 'cache')),
+                      mock.patch.dict(dash_app._loaded, {'key': None, 'df': None}),
+                      mock.patch.dict(dash_app._figures, {'key': None, 'graphs': None})):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def staff(self, rows=40, seed=0):
+        rng = np.random.default_rng(seed)
+        df = pd.DataFrame({
+            'Gender': rng.choice(['Female', 'Male'], rows),
+            'RANK': rng.choice(['Officer', 'Manager', 'Clerk'], rows),
+            'Location': rng.choice(['Accra', 'Kumasi', 'Tamale', None], rows),
+            'Designation': rng.choice(['Teller', 'Analyst'], rows),
+            'LOC_NAME': rng.choice(['South', 'North'], rows),
+            'StaffID': np.arange(rows),
+        })
+        df.loc[0, 'Gender'] = None
+        return df
+
+    def write(self, df, mtime):
+        df.to_excel(self.path, index=False)
+        os.utime(self.path, ns=(mtime, mtime))
+
+    def test_crosstabs_match_pandas(self):
+        df = self.staff()
+        tables = dash_app.crosstabs(df)
+        self.assertEqual(list(tables), list(dash_app.DIMENSIONS))
+        for name, table in tables.items():
+            pd.testing.assert_frame_equal(table, pd.crosstab(df[name], df['Gender']), check_names=False)
+            self.assertEqual(table.index.name, name)
+
+    def test_loaded_once_then_read_from_the_columnar_copy(self):
+        df = self.staff()
+        self.write(df, 1_700_000_000_000_000_000)
+        loaded = dash_app.load_staff(self.path)
+        self.assertEqual(loaded['StaffID'].tolist(), df['StaffID'].tolist())
+        self.assertEqual(loaded['RANK'].astype(str).tolist(), df['RANK'].tolist())
+        self.assertTrue(loaded['Location'].isna().any())
+        copies = os.listdir(os.path.join(columnar.CACHE_DIR, 'staff'))
+        self.assertEqual(len(copies), 1)
+        self.assertTrue(any(name.endswith('.npy') for name in os.listdir(os.path.join(columnar.CACHE_DIR, 'staff', copies[0]))))
+
+        with mock.patch.object(dash_app.pd, 'read_excel') as read_excel:
+            self.assertIs(dash_app.load_staff(self.path), loaded)
+            # As a new process would: the parse is read back from disk
+            dash_app._loaded.update(key=None, df=None)
+            pd.testing.assert_frame_equal(dash_app.load_staff(self.path), loaded)
+        read_excel.assert_not_called()
+
+    def test_changed_mtime_reloads(self):
+        self.write(self.staff(seed=0), 1_700_000_000_000_000_000)
+        first = dash_app.load_staff(self.path)
+        changed = self.staff(seed=1)
+        self.write(changed, 1_700_000_060_000_000_000)
+        second = dash_app.load_staff(self.path)
+        self.assertIsNot(second, first)
+        self.assertEqual(second['RANK'].astype(str).tolist(), changed['RANK'].tolist())
+        # The copy of the old version is dropped
+        self.assertEqual(len(os.listdir(os.path.join(columnar.CACHE_DIR, 'staff'))), 1)
+
+    def test_update_graphs_sends_only_what_changed(self):
+        df = self.staff()
+        self.write(df, 1_700_000_000_000_000_000)
+        with mock.patch.object(dash_app, 'file_path', self.path):
+            *shown, versions = dash_app.update_graphs(None, None)
+            self.assertEqual([figure['data'][0]['type'] for figure in shown], ['bar'] * len(dash_app.DIMENSIONS))
+            self.assertEqual(set(versions), {f'graph-{name.lower()}' for name in dash_app.DIMENSIONS})
+
+            # Unchanged workbook: the Store token matches, so nothing is sent
+            with self.assertRaises(PreventUpdate):
+                dash_app.update_graphs(1, versions)
+
+            # One rank changes: only that graph's counts are sent, as a Patch
+            df.loc[1, 'RANK'] = 'Clerk' if df.loc[1, 'RANK'] != 'Clerk' else 'Officer'
+            self.write(df, 1_700_000_060_000_000_000)
+            *updates, changed = dash_app.update_graphs(2, versions)
+            self.assertIsInstance(updates[0], Patch)
+            self.assertTrue(all(update is no_update for update in updates[1:]))
+            table = dash_app.crosstabs(df)['RANK']
+            operations = updates[0].to_plotly_json()['operations']
+            self.assertEqual([op['params']['value'] for op in operations], [table[g].tolist() for g in table.columns])
+            self.assertNotEqual(changed['graph-rank'], versions['graph-rank'])
+            self.assertEqual(changed['graph-location'], versions['graph-location'])
+
+            # A new rank changes the bars themselves: the whole figure is sent
+            df.loc[1, 'RANK'] = 'Director'
+            self.write(df, 1_700_000_120_000_000_000)
+            *updates, _ = dash_app.update_graphs(3, changed)
+            self.assertIn('Director', updates[0]['data'][0]['x'] + updates[0]['data'][1]['x'])
+            self.assertTrue(all(update is no_update for update in updates[1:]))
+
+
+@override_settings(STORAGES=STATIC_FILES)
+class DashboardStreamTests(SyntheticSourceMixin, TestCase):
+    def setUp(self):
+        figure_cache.invalidate()
+        self.url = reverse('dashboard_stream')
+
+    async def stream(self, **headers):
+        response = await self.async_client.get(self.url, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        return response, [chunk.decode() async for chunk in response.streaming_content]
+
+    async def test_shell_then_one_script_per_figure(self):
+        response, chunks = await self.stream()
+        self.assertEqual(response['X-Accel-Buffering'], 'no')
+        shell = chunks[0]
+        self.assertNotIn('<script>showStreamedFigure(', shell)
+        for name in figures.FIGURES:
+            self.assertIn(f'data-figure="{name}"', shell)
+        scripts = chunks[1:-1]
+        self.assertEqual(sorted(script.split('"')[1] for script in scripts), sorted(figures.FIGURES))
+        for script in scripts:
+            self.assertTrue(script.startswith('<script>showStreamedFigure('))
+            self.assertTrue(script.rstrip().endswith(', false);</script>'))
+        self.assertIn('</body>', chunks[-1])
+
+    async def test_failed_build_is_sent_as_failed(self):
+        get_or_build = figure_cache.get_or_build
+
+        def failing(version, key, build, params):
+            if key == 'fig_month.json':
+                raise RuntimeError("build failed")
+            return get_or_build(version, key, build, params)
+
+        with mock.patch.object(figure_cache, 'get_or_build', failing), self.assertLogs('Dash.views', 'ERROR'):
+            _, chunks = await self.stream()
+        scripts = {script.split('"')[1]: script for script in chunks[1:-1]}
+        self.assertEqual(scripts['fig_month'], views._figure_script('fig_month', failed=True))
+        self.assertTrue(scripts['fig_month'].rstrip().endswith('"fig_month", null, true);</script>'))
+        self.assertTrue(scripts['fig_peak_hours'].rstrip().endswith(', false);</script>'))
+
+    async def test_matching_etag_is_not_modified(self):
+        response, _ = await self.stream()
+        again = await self.async_client.get(self.url, headers={'if-none-match': response['ETag']})
+        self.assertEqual(again.status_code, 304)
+        self.assertFalse(again.streaming)
+
+    def test_figure_script_escapes_less_than(self):
+        script = views._figure_script('fig_month', json.dumps({'layout': {'title': '</script><b>'}}))
+        self.assertEqual(script.count('</script>'), 1)
+        self.assertIn('\\u003c/script>\\u003cb>', script)
+        payload = script[len('<script>showStreamedFigure("fig_month", '):-len(', false);</script>\n')]
+        self.assertEqual(json.loads(payload), {'layout': {'title': '</script><b>'}})
+
+
+class AgeGroupsTests(SimpleTestCase):
+    def test_skipped_without_loading_the_sample(self):
+        data = figures.DashboardData('transactions.csv')
+        with mock.patch.object(figures.DashboardData, 'df', new_callable=mock.PropertyMock) as df:
+            self.assertIsNone(figures.age_groups(data))
+        df.assert_not_called()
+
+
+class SegmentationGridTests(SimpleTestCase):
+    def stats(self, rows, seed=0):
+        rng = np.random.default_rng(seed)
+        total = rng.integers(1, 200, rows)
+        average = rng.lognormal(8, 1.5, rows)
+        return pd.DataFrame({'CustomerID': [f'C{i}' for i in range(rows)], 'TotalTransactions': total,
+                             'AverageTransactionAmount': average, 'CLV': total * average})
+
+    def test_bins_count_every_customer(self):
+        stats = self.stats(5000)
+        heatmap, outliers = figures._segmentation_grid(stats).data
+        z = np.asarray(heatmap.z, dtype=np.float64)
+        self.assertEqual(z.shape, (figures.SEGMENTATION_BINS, figures.SEGMENTATION_BINS))
+        self.assertEqual(np.nansum(z), len(stats))
+        self.assertAlmostEqual(np.nansum(heatmap.customdata) / stats['CLV'].sum(), 1)
+        self.assertEqual(len(outliers.x), figures.SEGMENTATION_OUTLIERS)
+        top = stats['CLV'].nlargest(figures.SEGMENTATION_OUTLIERS)
+        self.assertEqual(min(outliers.customdata[:, 1].astype(float)), top.min())
+
+    def test_small_frames(self):
+        for rows in (0, 1, 3):
+            stats = self.stats(rows)
+            fig = figures._segmentation_grid(stats)
+            fig.to_json()
+            heatmap, outliers = fig.data
+            self.assertEqual(np.nansum(np.asarray(heatmap.z, dtype=np.float64)), rows, rows)
+            self.assertEqual(len(outliers.x), rows)
+
+    def test_one_customer_without_spend(self):
+        stats = self.stats(1).assign(AverageTransactionAmount=0.0, CLV=0.0)
+        heatmap, outliers = figures._segmentation_grid(stats).data
+        self.assertEqual(np.nansum(np.asarray(heatmap.z, dtype=np.float64)), 1)
+        self.assertEqual(list(outliers.marker.size), [6])
+
+
+class SnapshotTests(SyntheticSourceMixin, TestCase):
+    def setUp(self):
+        figure_cache.invalidate()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        # Snapshot versions are stamped to the second, so each publish gets its own
+        clock = (datetime(2025, 3, 10, tzinfo=timezone.utc) + timedelta(minutes=i) for i in range(100))
+        for patch in (mock.patch.object(snapshots, 'ENABLED', True),
+                      mock.patch.object(snapshots, 'SNAPSHOT_DIR', self.root),
+                      mock.patch.object(snapshots, 'datetime', mock.Mock(now=lambda tz: next(clock)))):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.url = reverse('figure_json', args=['fig'])
+
+    def published_versions(self):
+        root = snapshots._root(self.source)
+        return sorted(entry for entry in os.listdir(root) if os.path.isdir(os.path.join(root, entry)))
+
+    def test_unavailable_before_the_first_publish(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '60')
+
+    @override_settings(STORAGES=STATIC_FILES)
+    def test_views_serve_the_snapshot(self):
+        meta = snapshots.publish(self.source)
+        snapshot = snapshots.current(self.source)
+        self.assertEqual(snapshot.version, meta['version'])
+        # Nothing is computed on the request path
+        with mock.patch.object(figures, 'DashboardData', side_effect=AssertionError("computed on request")), \
+                mock.patch.object(views, 'LAZY_CHARTS', False):
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content.decode(), snapshot.read('dashboard', 'fig.json'))
+            page = self.client.get(reverse('dashboard')).content.decode()
+        self.assertIn(snapshot.read('dashboard', 'fig1.html'), page)
+
+    def test_unchanged_data_is_not_republished(self):
+        out = StringIO()
+        call_command('refresh_snapshots', source=self.source, stdout=out)
+        call_command('refresh_snapshots', source=self.source, stdout=out)
+        self.assertIn('Published snapshot', out.getvalue())
+        self.assertIn('Data unchanged', out.getvalue())
+        self.assertEqual(len(self.published_versions()), 1)
+
+    def test_failed_publish_keeps_the_current_snapshot(self):
+        meta = snapshots.publish(self.source)
+        pointer = os.path.join(snapshots._root(self.source), snapshots.POINTER)
+        with open(pointer) as f:
+            before = f.read()
+        with mock.patch.object(snapshots, '_render_pages', side_effect=RuntimeError("render failed")):
+            with self.assertRaises(RuntimeError):
+                snapshots.publish(self.source, force=True)
+        with open(pointer) as f:
+            self.assertEqual(f.read(), before)
+        self.assertEqual(snapshots.current(self.source).version, meta['version'])
+        # The half-built directory is gone too
+        self.assertFalse([entry for entry in os.listdir(snapshots._root(self.source)) if entry.startswith('.build-')])
+        self.assertEqual(self.published_versions(), [meta['version']])
+
+    def test_old_snapshots_are_pruned(self):
+        versions = [snapshots.publish(self.source, keep=2, force=True)['version'] for _ in range(4)]
+        self.assertEqual(self.published_versions(), versions[-2:])
+        self.assertEqual(snapshots.current(self.source).version, versions[-1])
+
+
+class MissingFeatureTests(SyntheticSourceMixin, TestCase):
+    @classmethod
+    def edit_source(cls, path):
+        df = pd.read_csv(path)
+        df.loc[::5, 'TransactionTime'] = None
+        df.loc[::7, 'TransactionDate'] = None
+        df.to_csv(path, index=False)
+
+    def setUp(self):
+        patch = mock.patch.object(figures, 'SAMPLE_RATE', 1.0)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.data = figures.DashboardData(self.source)
+
+    def test_sentinels_load_as_na(self):
+        df = self.data.df
+        for column in features.INTEGER_FEATURES:
+            self.assertTrue(df[column].isna().any(), column)
+            self.assertTrue((df[column].dropna() >= 0).all(), column)
+
+    def test_no_missing_bucket_in_charts(self):
+        for name, axis in (('fig_hour_e', 'x'), ('fig_peak_hours', 'x'), ('fig_tenure_trans', 'x'),
+                           ('fig_peak_hour_day', 'x'), ('fig_day', 'x'), ('fig_peak_days', 'x')):
+            values = list(getattr(figures.FIGURES[name](self.data).data[0], axis))
+            self.assertNotIn(-1, values, name)
+            self.assertFalse(any(pd.isna(value) for value in values), name)
+
+
+class GrowingSourceMixin:
+    """A generated transactions file that tests can append the rest of to."""
+
+    rows = 2000
+    initial = 1500
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        with open(benchmark.generate(os.path.join(self.tmp, 'full.csv'), self.rows, seed=2)) as f:
+            self.lines = f.readlines()
+        self.source = os.path.join(self.tmp, 'transactions.csv')
+        with open(self.source, 'w') as f:
+            f.writelines(self.lines[:self.initial + 1])
+        patch = mock.patch.object(columnar, 'CACHE_DIR', os.path.join(self.tmp, 'cache'))
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def append_rest(self):
+        with open(self.source, 'a') as f:
+            f.writelines(self.lines[self.initial + 1:])
+
+
+class FilterTests(SimpleTestCase):
+    def parse(self, query):
+        return TransactionFilter.from_request(RequestFactory().get('/', query))
+
+    def test_parses_dates_and_locations(self):
+        filters = self.parse({'start': '2016-08-01', 'end': '2016-08-07', 'location': ['DELHI', ' MUMBAI', 'DELHI', '']})
+        self.assertEqual(filters, TransactionFilter(date(2016, 8, 1), date(2016, 8, 7), ('DELHI', 'MUMBAI')))
+        self.assertEqual(TransactionFilter.from_request(RequestFactory().get(f'/?{filters.querystring()}')), filters)
+
+    def test_no_parameters_is_no_filter(self):
+        self.assertFalse(self.parse({}))
+
+    def test_rejects_bad_dates(self):
+        with self.assertRaises(ValueError):
+            self.parse({'start': '08/01/2016'})
+        with self.assertRaises(ValueError):
+            self.parse({'start': '2016-08-07', 'end': '2016-08-01'})
+
+
+class FilteredDataTests(SyntheticSourceMixin, TestCase):
+    def test_select_rows_matches_dates_and_locations(self):
+        df = columnar.load_columns(['TransactionDate', 'CustLocation'], source=self.source)
+        location = df['CustLocation'].value_counts().index[0]
+        rows = columnar.select_rows(self.source, date(2016, 8, 1), date(2016, 8, 31), [location])
+        expected = ((df['TransactionDate'] >= '2016-08-01') & (df['TransactionDate'] <= '2016-08-31')
+                    & (df['CustLocation'] == location))
+        self.assertEqual(sorted(rows), list(np.flatnonzero(expected)))
+
+    def test_sample_is_repeatable_and_filtered(self):
+        filters = TransactionFilter(start=date(2016, 8, 1), end=date(2016, 8, 31))
+        first = figures.DashboardData(self.source, filters).df
+        second = figures.DashboardData(self.source, filters).df
+        self.assertGreater(len(first), 0)
+        pd.testing.assert_frame_equal(first, second)
+        self.assertTrue(first['TransactionDate'].between('2016-08-01', '2016-08-31').all())
+
+
+class ColumnarCacheTests(GrowingSourceMixin, SimpleTestCase):
+    def test_columns_match_the_source(self):
+        columnar.ensure_cache(self.source)
+        cached = columnar.with_ids_formatted(columnar.load_columns(source=self.source), self.source)
+        parsed = pd.read_csv(self.source)
+        self.assertEqual(len(cached), self.initial)
+        self.assertEqual(list(cached['TransactionID']), list(parsed['TransactionID'].astype(str)))
+        np.testing.assert_allclose(cached['TransactionAmount (INR)'], parsed['TransactionAmount (INR)'], rtol=1e-6)
+
+    def test_unchanged_source_is_not_rebuilt(self):
+        manifest = columnar.ensure_cache(self.source)
+        os.utime(self.source)
+        with mock.patch.object(columnar, '_write_columns') as write, \
+                mock.patch.object(transactions_refreshed, 'send') as send:
+            self.assertEqual(columnar.ensure_cache(self.source)['sha256'], manifest['sha256'])
+        write.assert_not_called()
+        send.assert_not_called()
+
+    def test_one_process_builds_a_changed_source(self):
+        log = os.path.join(self.tmp, 'builds.log')
+        with multiprocessing.get_context('fork').Pool(3) as pool:
+            versions = pool.starmap(_ensure_cache_logged, [(self.source, log)] * 3)
+        self.assertEqual(len(set(versions)), 1)
+        with open(log) as f:
+            self.assertEqual(len(f.readlines()), 1)
+
+    def test_changed_source_is_rebuilt(self):
+        manifest = columnar.ensure_cache(self.source)
+        self.append_rest()
+        with mock.patch.object(transactions_refreshed, 'send') as send:
+            rebuilt = columnar.ensure_cache(self.source)
+        self.assertNotEqual(rebuilt['sha256'], manifest['sha256'])
+        self.assertEqual(rebuilt['rows'], self.rows)
+        self.assertEqual(len(columnar.load_columns(['TransactionID'], source=self.source)), self.rows)
+        send.assert_called_once()
+        # Readers that picked up the old manifest can still finish
+        self.assertTrue(os.path.isdir(os.path.join(columnar._cache_root(self.source), manifest['sha256'])))
+
+
+def _ensure_cache_logged(source, log):
+    # Runs in a forked worker; appends a line to ``log`` for every build it does
+    build = columnar._build
+
+    def logged(*args):
+        with open(log, 'a') as f:
+            f.write(f'{os.getpid()}\n')
+        return build(*args)
+
+    with mock.patch.object(columnar, '_build', logged):
+        return columnar.ensure_cache(source)['sha256']
+
+
+class SketchTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.keys = rng.choice([f'K{i}' for i in range(50)], 20_000, p=np.arange(50, 0, -1) / 1275)
+        self.weights = rng.uniform(1, 100, len(self.keys))
+        self.values = rng.normal(0, 1, 100_000)
+
+    def test_space_saving_merge_matches_one_pass(self):
+        exact = pd.Series(self.weights).groupby(self.keys).sum().nlargest(5)
+        half = len(self.keys) // 2
+        merged = sketches.SpaceSaving(100).update(self.keys[:half], self.weights[:half]).merge(
+            sketches.SpaceSaving(100).update(self.keys[half:], self.weights[half:]))
+        top = merged.top(5)
+        self.assertEqual(list(top['key']), list(exact.index))
+        np.testing.assert_allclose(top['total'], exact.to_numpy())
+        self.assertTrue(top['guaranteed'].all())
+
+    def test_space_saving_bounds_its_errors(self):
+        sketch = sketches.SpaceSaving(10).update(self.keys, self.weights)
+        exact = pd.Series(self.weights).groupby(self.keys).sum()
+        top = sketch.top(10)
+        self.assertTrue((top['total'].to_numpy() >= exact[top['key']].to_numpy() - 1e-6).all())
+        self.assertTrue((top['error'] <= sketch.total / sketch.capacity + 1e-6).all())
+
+    def test_kll_merge_stays_within_its_error(self):
+        half = len(self.values) // 2
+        merged = sketches.KLL(200, seed=0).update(self.values[:half]).merge(
+            sketches.KLL(200, seed=1).update(self.values[half:]))
+        self.assertEqual(merged.n, len(self.values))
+        for q in (0.1, 0.5, 0.9):
+            rank = (self.values < merged.quantile(q)).mean()
+            self.assertAlmostEqual(rank, q, delta=0.02)
+
+    def test_overall_quantiles_include_undated_rows(self):
+        amounts = np.arange(1000, dtype=np.float64)
+        months = np.where(amounts < 500, '2016-08', None)
+        chunk = pd.DataFrame({'TransactionAmount (INR)': amounts, 'CustLocation': 'DELHI', 'CustomerID': 'C1',
+                              'TransactionMonth': pd.Categorical(months)})
+        summary = sketches.summarize([chunk.iloc[:600], chunk.iloc[600:]])
+        self.assertEqual(summary['amounts'].n, 1000)
+        self.assertEqual(summary['amounts_by_month']['2016-08'].n, 500)
+        self.assertAlmostEqual(summary['amounts'].quantile(0.9), 900, delta=20)
+
+    def test_summary_round_trips_through_json(self):
+        chunk = pd.DataFrame({
+            'TransactionAmount (INR)': self.weights,
+            'CustLocation': self.keys,
+            'CustomerID': self.keys,
+            'TransactionMonth': np.where(np.arange(len(self.keys)) % 2, '2016-08', '2016-09'),
+        })
+        summary = sketches.summarize([chunk])
+        restored = sketches.from_dict(json.loads(json.dumps(sketches.to_dict(summary))))
+        pd.testing.assert_frame_equal(restored['locations'].top(10), summary['locations'].top(10))
+        self.assertEqual(restored['amounts'].quantile(0.9), summary['amounts'].quantile(0.9))
+        self.assertEqual(sorted(restored['amounts_by_month']), ['2016-08', '2016-09'])
+
+
+class RollupRefreshTests(GrowingSourceMixin, TestCase):
+    def expected_totals(self, source):
+        df = pd.read_csv(source)
+        hours = features.seconds_of_day(df['TransactionTime']) // 3600
+        df = df[df['CustLocation'].notna() & df['CustomerID'].notna() & df['TransactionDate'].notna() & (hours >= 0)]
+        return df.groupby('CustLocation', observed=True)['TransactionAmount (INR)'].sum()
+
+    def assertTotalsMatch(self, source=None):
+        totals = rollups.location_totals().set_index('CustLocation')['TransactionAmount']
+        expected = self.expected_totals(source or self.source)
+        pd.testing.assert_series_equal(totals.sort_index(), expected.sort_index(), check_names=False,
+                                       check_index_type=False, check_categorical=False)
+
+    def test_refresh_builds_then_appends(self):
+        self.assertEqual(rollups.refresh(self.source), self.initial)
+        self.assertTrue(rollups.available(self.source))
+        self.assertTotalsMatch()
+        self.assertEqual(rollups.refresh(self.source), 0)
+
+        self.append_rest()
+        with mock.patch.object(transactions_appended, 'send') as appended:
+            self.assertEqual(rollups.refresh(self.source), self.rows - self.initial)
+        self.assertEqual(len(appended.call_args.kwargs['rows']), self.rows - self.initial)
+        self.assertTotalsMatch()
+
+    def test_rollups_belong_to_their_source(self):
+        other = os.path.join(self.tmp, 'other.csv')
+        rollups.refresh(self.source)
+        self.assertFalse(rollups.available(other))
+        self.assertEqual(rollups.version(other), 'none')
+        self.assertNotEqual(rollups.version(self.source), 'none')
+
+        with open(other, 'w') as f:
+            f.writelines(self.lines[:1] + self.lines[self.initial + 1:])
+        rollups.refresh(other)
+        # Refreshing another source replaces the rollups rather than adding to them
+        self.assertFalse(rollups.available(self.source))
+        self.assertTotalsMatch(other)
+
+    def test_rewritten_source_is_rebuilt(self):
+        rollups.refresh(self.source)
+        with open(self.source, 'w') as f:
+            f.writelines(self.lines[:1] + self.lines[self.initial + 1:])
+        with mock.patch.object(transactions_appended, 'send') as appended:
+            self.assertEqual(rollups.refresh(self.source), self.rows - self.initial)
+        self.assertIsNone(appended.call_args.kwargs['rows'])
+        self.assertTotalsMatch()
+
+
+class ParallelRebuildTests(SyntheticSourceMixin, TestCase):
+    def rollup_tables(self):
+        buckets = pd.DataFrame(TransactionRollup.objects.values(
+            'date', 'location', 'hour', 'transaction_count', 'amount_total'))
+        customers = pd.DataFrame(CustomerRollup.objects.values(
+            'customer_id', 'transaction_count', 'amount_total', 'first_transaction', 'last_transaction'))
+        state = RollupState.objects.values_list('rows_processed', 'last_transaction_id').get()
+        return (buckets.sort_values(['date', 'location', 'hour'], ignore_index=True),
+                customers.sort_values('customer_id', ignore_index=True), state)
+
+    def test_ranges_end_on_line_boundaries(self):
+        with open(self.source, 'rb') as f:
+            data = f.read()
+        ranges = engine.byte_ranges(self.source, 1000)
+        self.assertEqual(ranges[0][0], data.index(b'\n') + 1)
+        self.assertEqual(ranges[-1][1], len(data))
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+            self.assertEqual(data[end - 1:end], b'\n')
+        # The nominal cut points land inside lines, so the ranges had to run on
+        self.assertTrue(any(data[start + 999:start + 1000] != b'\n' for start, _ in ranges[:-1]))
+
+    def test_rebuild_matches_incremental_refresh(self):
+        rollups.refresh(self.source)
+        buckets, customers, state = self.rollup_tables()
+        self.assertGreater(len(buckets), 0)
+        for workers, range_bytes in ((1, 1000), (2, 4099), (2, engine.RANGE_BYTES)):
+            with self.subTest(workers=workers, range_bytes=range_bytes):
+                rollups.replace(engine.aggregate(self.source, workers, range_bytes), self.source)
+                rebuilt_buckets, rebuilt_customers, rebuilt_state = self.rollup_tables()
+                pd.testing.assert_frame_equal(rebuilt_buckets, buckets)
+                pd.testing.assert_frame_equal(rebuilt_customers, customers)
+                self.assertEqual(rebuilt_state, state)
+
+
+class FigureCacheTests(SimpleTestCase):
+    def setUp(self):
+        figure_cache.invalidate()
+        self.build = mock.Mock(return_value='{"data": []}')
+
+    def test_builds_once_per_version_name_and_params(self):
+        for _ in range(2):
+            figure_cache.get_or_build('v1', 'fig', self.build, {'start': None})
+        figure_cache.get_or_build('v1', 'fig', self.build, {'start': '2016-08-01'})
+        figure_cache.get_or_build('v2', 'fig', self.build, {'start': None})
+        self.assertEqual(self.build.call_count, 3)
+
+    def test_refresh_drops_cached_figures(self):
+        figure_cache.get_or_build('v1', 'fig', self.build)
+        transactions_refreshed.send(sender=None, source='transactions.csv')
+        figure_cache.get_or_build('v1', 'fig', self.build)
+        self.assertEqual(self.build.call_count, 2)
+
+
+class LiveDeltaTests(SyntheticSourceMixin, TestCase):
+    def setUp(self):
+        rollups.refresh(self.source)
+        df = columnar.load_columns(rollups.SOURCE_COLUMNS, source=self.source)
+        self.rows = columnar.with_ids_formatted(df.tail(300), self.source)
+
+    def test_delta_summarises_the_new_rows(self):
+        update = live.delta(self.rows, self.source)
+        self.assertEqual(update['type'], 'delta')
+        self.assertEqual(update['rows'], 300)
+        hours = self.rows['TransactionHour']
+        self.assertEqual(sum(update['hours']['y']), int((hours >= 0).sum()))
+        self.assertNotIn(-1, update['hours']['x'])
+
+        totals = rollups.location_totals().set_index('CustLocation')['TransactionAmount']
+        for location, total in zip(update['locations']['y'], update['locations']['x']):
+            self.assertAlmostEqual(total, totals[location])
+        self.assertEqual(update['locations']['x'], sorted(update['locations']['x'], reverse=True))
+
+        high = update['high_value']
+        amounts = self.rows['TransactionAmount (INR)']
+        self.assertEqual(sum(high['months']['y']),
+                         int(((amounts >= high['threshold']) & self.rows['TransactionDate'].notna()).sum()))
+        self.assertTrue(all(row['amount'] >= high['threshold'] for row in high['transactions']))
+
+    def test_appends_are_broadcast_only_when_enabled(self):
+        with mock.patch.object(live, 'broadcast') as broadcast:
+            transactions_appended.send(sender=None, source=self.source, rows=None)
+            broadcast.assert_not_called()
+            with mock.patch.object(live, 'ENABLED', True):
+                transactions_appended.send(sender=None, source=self.source, rows=None)
+                transactions_appended.send(sender=None, source=self.source, rows=self.rows)
+        self.assertEqual(broadcast.call_args_list[0].args[0], {'type': 'reload'})
+        self.assertEqual(broadcast.call_args_list[1].args[0]['type'], 'delta')
+
+
+def nssf_standin(path, days, rows=300, unmatched=0.1, seed=0):
+    """SQLite stand-in for the NSSF queries with ``rows`` collections on each of ``days``.
+
+    A fraction ``unmatched`` of each day's statement entries has no EOD
+    record.
+    """
+    rng = np.random.default_rng(seed)
+    conn = nssf.connect_sqlite(path, create=True)
+    conn.execute("INSERT INTO PRFPRD.bank_parameters VALUES ('CENTENARY BANK')")
+    conn.execute("INSERT INTO PRFPRD.generic_detail VALUES ('WSDES', 'NSSF')")
+    conn.execute("INSERT INTO PRFPRD.currency VALUES (1, 'UGX')")
+    for agreement, account in ((61, 5001), (10084, 5002)):
+        conn.execute("INSERT INTO PRFPRD.cp_agreement VALUES (?, ?)", (agreement, account))
+        conn.execute("INSERT INTO PRFPRD.deposit_account VALUES (?, 1)", (account,))
+        conn.execute("INSERT INTO PRFPRD.profits_account VALUES (?, ?, '0', ?)",
+                     (f'31000{agreement:05d}', account, agreement))
+        conn.execute("INSERT INTO PRFPRD.customer VALUES (?, ?)", (agreement, f'NSSF {agreement}'))
+    conn.execute("INSERT INTO PRFPRD.profits_account VALUES (?, 9000, '0', 3)", (nssf.STATEMENT_ACCOUNT,))
+    balance = 1_000_000.0
+    for day in days:
+        day = day.strftime('%Y-%m-%d')
+        recordings, entries, collections = [], [], []
+        for i in range(1, rows + 1):
+            account = 5001 if i % 3 else 5002
+            reference = f'NSSF{i + 10 ** 9:010d}'
+            amount = float(rng.integers(1_000, 500_000))
+            timestamp = f'{day} {8 + i * 9 // rows:02d}:{i % 60:02d}:{i * 7 % 60:02d}'
+            recordings.append((day, 101, 'USR1', i, i))
+            entries.append((day, 101, 'USR1', i, account, i, 1, float(i), 'N', day, '2', amount, reference, 0,
+                            timestamp, 1, 2, '', '', '', ''))
+            collections.append((day, 101, 'USR1', i, '61' if account == 5001 else '10084', f'D{i:08d}',
+                                f'XYZ REF{i} '))
+            comments = reference if rng.random() >= unmatched else f'MISS{i + 10 ** 9:010d}'
+            flag = '2' if rng.random() > 0.1 else '1'
+            entries.append((day, 102, 'USR2', 100_000 + i, 9000, 500_000 + i, 1, balance, 'N', day, flag, amount,
+                            comments, 0, timestamp, 3, 4, 'X', 'Y', '', ''))
+            balance += amount if flag == '2' else -amount
+        conn.executemany("INSERT INTO PRFPRD.cp_trx_recording VALUES (?, ?, ?, ?, ?)", recordings)
+        conn.executemany(f"INSERT INTO PRFPRD.fst_demand_extrait VALUES ({', '.join('?' * 21)})", entries)
+        conn.executemany("INSERT INTO PRFPRD.cp_ol_collection VALUES (?, ?, ?, ?, ?, ?, ?)", collections)
+    conn.commit()
+    conn.close()
+
+
+class BackfillTests(SimpleTestCase):
+    days = [datetime(2025, 3, 10), datetime(2025, 3, 11), datetime(2025, 3, 12)]
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.database = os.path.join(self.tmp, 'prfprd.db')
+        nssf_standin(self.database, self.days)
+        self.output = os.path.join(self.tmp, 'NSSFCRDB-{date:%Y%m%d}.csv')
+
+    def backfill(self, first, last, **kwargs):
+        return nssf.backfill(first, last, connect=lambda: nssf.connect_sqlite(self.database), workers=2,
+                             output=self.output, **kwargs)
+
+    def test_writes_one_file_per_day(self):
+        results = self.backfill(self.days[0], self.days[-1])
+        self.assertEqual([result['date'] for result in results], ['2025-03-10', '2025-03-11', '2025-03-12'])
+        for day, result in zip(self.days, results):
+            self.assertNotIn('error', result)
+            self.assertGreater(result['unmatched'], 0)
+            with open(self.output.format(date=day)) as f:
+                self.assertEqual(len(f.readlines()), result['records'])
+
+    def test_skip_existing_leaves_written_days(self):
+        existing = self.output.format(date=self.days[1])
+        with open(existing, 'w') as f:
+            f.write('kept\n')
+        results = self.backfill(self.days[0], self.days[-1], skip_existing=True)
+        self.assertTrue(results[1]['skipped'])
+        with open(existing) as f:
+            self.assertEqual(f.read(), 'kept\n')
+        self.assertTrue(os.path.exists(self.output.format(date=self.days[2])))
+
+    def test_failed_day_does_not_stop_the_rest(self):
+        # No statement entries on the 13th
+        results = self.backfill(self.days[1], datetime(2025, 3, 13))
+        self.assertNotIn('error', results[0])
+        self.assertNotIn('error', results[1])
+        self.assertIn('LookupError', results[2]['error'])
+        self.assertFalse(os.path.exists(self.output.format(date=datetime(2025, 3, 13))))
+
+
+def merge_eod(conn, day, path):
+    """The EOD file as ok.py wrote it before the pipeline: both queries read
+    whole, an outer merge for the unmatched entries, then a second pass to
+    strip trailing commas."""
+    data = pd.read_sql(nssf.EOD_QUERY, conn, params={'trxdate_from': day.strftime('%Y/%m/%d')})
+    data.columns = ['HEAD', 'CRDB', 'BANK', 'ACCOUNT_NUMBER', 'SURNAME', "TO_CHAR(T.STATEMENT_DATE,'YYYYMMDD')",
+                    "TO_CHAR(G.PREV_ACC_BALANCE,'999999999990.00')", 'CURRENCY_CODE', "''"]
+    data_st = pd.read_sql(nssf.STATEMENT_QUERY, conn,
+                          params={'trxdate_to': day.strftime('%d-%m-%Y'), 'account': nssf.STATEMENT_ACCOUNT})
+    data_st.columns = [column.upper() for column in data_st.columns]
+    data_st['BANK'] = data_st['COMMENTS'].str[:14]
+    outer_merge = pd.merge(data, data_st, on='BANK', how='outer', indicator=True)
+    tx_nssf = outer_merge.query("_merge=='right_only'").reset_index(drop=True)
+    tx_nssf = tx_nssf[['TRANS_SER_NUM', 'UNIT', 'TRANSACTIONDATE', 'TIMESTAMP', 'USERID', 'TRANSACTIONS',
+                       'JUSTIFICATION', 'ENTRYAMOUNT', 'BALANCE', 'DRCR', 'CHEQUENO', 'COMMENTS', '_merge']]
+    dates = pd.to_datetime(tx_nssf['TIMESTAMP'], dayfirst=True)
+    tx_nssf['bank_transaction_number'] = (dates.apply(lambda x: x.strftime('%Y%m%d'))
+                                          + tx_nssf['TRANS_SER_NUM'].astype(int).astype(str))
+    tx_nssf['Date'] = dates.apply(lambda x: x.strftime('%Y%m%d'))
+    nssf_eod = tx_nssf
+    nssf_eod['HEAD'] = 'D'
+    nssf_eod['ACCOUNT_NUMBER '] = ''
+    nssf_eod['CRDB'] = tx_nssf['bank_transaction_number'].apply(lambda x: x.strip())
+    nssf_eod['BANK'] = nssf_eod['COMMENTS'].str[:14].apply(lambda x: x.strip())
+    nssf_eod['SURNAME'] = nssf_eod['ENTRYAMOUNT'].astype('int64')
+    nssf_eod["TO_CHAR(T.STATEMENT_DATE,'YYYYMMDD')"] = nssf_eod['DRCR']
+    nssf_eod["TO_CHAR(G.PREV_ACC_BALANCE,'999999999990.00')"] = nssf_eod['Date']
+    nssf_eod['CURRENCY_CODE'] = nssf_eod['Date']
+    nssf_eod = nssf_eod[['HEAD', 'CRDB', 'BANK', 'ACCOUNT_NUMBER ', 'SURNAME', "TO_CHAR(T.STATEMENT_DATE,'YYYYMMDD')",
+                         "TO_CHAR(G.PREV_ACC_BALANCE,'999999999990.00')", 'CURRENCY_CODE']]
+    df1 = data.query("HEAD=='T'").reset_index(drop=True)
+    df2 = data.query("HEAD=='D'").reset_index(drop=True)
+    df3 = data.query("CRDB=='CRDB'").reset_index(drop=True)
+    union = pd.concat([df2, nssf_eod], ignore_index=True)
+    df1['CRDB'] = union[union.columns[1]].count()
+    df1['BANK'] = data_st.tail(1).iloc[0]['BALANCE']
+    union1 = pd.concat([df3, df2, nssf_eod, df1], ignore_index=True).drop_duplicates()
+    union1 = union1.apply(lambda x: pd.Series([y.strip() if isinstance(y, str) else y for y in x]))
+    union1.to_csv(path + '.tmp', index=False, header=False)
+    with open(path + '.tmp') as infile, open(path, 'w') as outfile:
+        for line in infile:
+            outfile.write(line.rstrip(',\n') + '\n')
+
+
+class ReconcileEquivalenceTests(SimpleTestCase):
+    day = datetime(2025, 3, 10)
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def assertSameAsMerge(self, **standin):
+        database = os.path.join(self.tmp, 'prfprd.db')
+        nssf_standin(database, [self.day], **standin)
+        conn = nssf.connect_sqlite(database)
+        self.addCleanup(conn.close)
+        expected = os.path.join(self.tmp, 'merge.csv')
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            merge_eod(conn, self.day, expected)
+        with open(expected, 'rb') as f:
+            expected = f.read()
+        # Small batches split the EOD and statement rows across many fetches
+        for arraysize in (50, nssf.ARRAYSIZE):
+            output = os.path.join(self.tmp, f'anti-join-{arraysize}.csv')
+            nssf.run(conn, self.day, output, arraysize)
+            with open(output, 'rb') as f:
+                self.assertEqual(f.read(), expected, f"arraysize={arraysize}")
+
+    def test_some_entries_unmatched(self):
+        self.assertSameAsMerge(rows=600, unmatched=0.1)
+
+    def test_every_entry_matched(self):
+        self.assertSameAsMerge(rows=200, unmatched=0)
+
+    def test_most_entries_unmatched(self):
+        self.assertSameAsMerge(rows=300, unmatched=0.6, seed=2)
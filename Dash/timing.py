@@ -0,0 +1,152 @@
+"""Per-stage timings of dashboard requests.
+
+Code on the request path wraps its stages in ``stage(name)`` (or decorates
+them with ``timed(name)``). With ``DASHBOARD_TIMING`` enabled each stage is
+
+* appended to the current request's timings, which ``ServerTimingMiddleware``
+  sends back as a ``Server-Timing`` header (shown in the browser's network
+  panel), and
+* observed into a per-process latency histogram, exposed with the figure
+  cache counters in Prometheus' text format by ``metrics`` (``/metrics``).
+
+Stages run for one figure pass ``figure=name`` and go to a separate histogram
+labelled by figure. Disabled, ``stage`` does nothing but check a flag and
+the middleware removes itself at startup.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import Http404, HttpResponse
+
+from . import figure_cache
+
+ENABLED = getattr(settings, 'DASHBOARD_TIMING', False)
+
+# Upper bounds (seconds) of the histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Timings of the request being served; None outside a request
+_request_timings = contextvars.ContextVar('dashboard_timings', default=None)
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def _observe(key, seconds):
+    with _histograms_lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0}
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram['buckets'][i] += 1
+        histogram['sum'] += seconds
+        histogram['count'] += 1
+
+
+def record(name, seconds, figure=None):
+    """Record a stage timed elsewhere."""
+    timings = _request_timings.get()
+    if timings is not None:
+        # list.append is atomic, so figure builds in worker threads can share it
+        timings.append((f'{figure}.{name}' if figure else name, seconds))
+    if figure:
+        _observe(('dashboard_figure_seconds', (('figure', figure), ('stage', name))), seconds)
+    else:
+        _observe(('dashboard_stage_seconds', (('stage', name),)), seconds)
+
+
+@contextmanager
+def stage(name, figure=None):
+    """Time the enclosed block as stage ``name`` (of ``figure``, if given)."""
+    if not ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started, figure)
+
+
+def timed(name):
+    """Decorator form of ``stage``."""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def server_timing(timings):
+    """``Server-Timing`` header value for ``[(name, seconds)]``."""
+    return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in timings)
+
+
+class ServerTimingMiddleware:
+    """Collects the stages of each request into a ``Server-Timing`` header."""
+
+    def __init__(self, get_response):
+        if not ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = []
+        token = _request_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_timings.reset(token)
+        total = time.perf_counter() - started
+        _observe(('dashboard_request_seconds', (('view', getattr(request.resolver_match, 'url_name', None) or ''),)), total)
+        response['Server-Timing'] = server_timing(timings + [('total', total)])
+        return response
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}'
+
+
+HELP = {
+    'dashboard_request_seconds': "Time to serve a dashboard request, by view.",
+    'dashboard_stage_seconds': "Time spent in each stage of serving the dashboard.",
+    'dashboard_figure_seconds': "Time spent building and serialising each figure.",
+}
+
+
+def render_metrics():
+    """Histograms and figure cache counters in Prometheus' text format."""
+    with _histograms_lock:
+        histograms = {key: {**h, 'buckets': list(h['buckets'])} for key, h in _histograms.items()}
+    lines = []
+    for family in HELP:
+        series = sorted((labels, h) for (name, labels), h in histograms.items() if name == family)
+        lines.append(f'# HELP {family} {HELP[family]}')
+        lines.append(f'# TYPE {family} histogram')
+        for labels, h in series:
+            for bound, count in zip(BUCKETS, h['buckets']):
+                lines.append(f'{family}_bucket{_labels(labels, le=bound)} {count}')
+            lines.append(f'{family}_bucket{_labels(labels, le="+Inf")} {h["count"]}')
+            lines.append(f'{family}_sum{_labels(labels)} {h["sum"]:.6f}')
+            lines.append(f'{family}_count{_labels(labels)} {h["count"]}')
+    lines.append('# HELP dashboard_figure_cache_total Figure cache lookups and invalidations.')
+    lines.append('# TYPE dashboard_figure_cache_total counter')
+    for event, count in figure_cache.stats().items():
+        lines.append(f'dashboard_figure_cache_total{{event="{event}"}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics(request):
+    if not ENABLED:
+        raise Http404("Timing is disabled")
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
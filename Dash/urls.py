@@ -1,9 +1,13 @@
 from django.urls import path
-from . import views 
+from . import timing, views
 from django.shortcuts import redirect
 
 urlpatterns = [
     path('', lambda request: redirect('/tms/dashboard/', permanent=False)),
     path('tms/dashboard/', views.dashboard, name='dashboard'),
+    path('tms/dashboard/stream/', views.dashboard_stream, name='dashboard_stream'),
+    path('tms/api/figures/<str:name>/', views.figure_json, name='figure_json'),
+    path('tms/api/locations/', views.location_options, name='location_options'),
+    path('metrics', timing.metrics, name='metrics'),
    
 ]
@@ -1,262 +1,285 @@
-
-import plotly.express as px
-import pandas as pd
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache, partial
+import hashlib
+import json
+import logging
 import os
-from django.shortcuts import render
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.http import Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.template import loader
 from django.conf import settings
-from datetime import datetime
-import random
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.html import format_html
 
+from . import columnar, figure_cache, figures, live, precompressed, scheduler, snapshots, timing
+from .filters import TransactionFilter
 
 
 Transactions = os.path.join(settings.BASE_DIR, 'data', "bank_transactions.csv")
 
+# Send only the page shell and let the browser fetch each chart from
+# figure_json as it scrolls into view
+LAZY_CHARTS = getattr(settings, 'DASHBOARD_LAZY_CHARTS', True)
+
+TEMPLATE = 'visualization/plotly_chart.html'
+HTML = 'text/html; charset=utf-8'
+
+logger = logging.getLogger(__name__)
+
+# Figure builds of streamed pages, shared by all requests so concurrent
+# pages don't multiply the threads
+_stream_executor = ThreadPoolExecutor(max_workers=scheduler.WORKERS, thread_name_prefix='stream-figures')
+
+
+def _figure_params(filters):
+    return {
+        'sample_rate': figures.SAMPLE_RATE,
+        'seed': figures.SAMPLE_SEED,
+        'plotlyjs': figures.PLOTLYJS_MODE,
+        'filters': filters.as_params(),
+    }
+
+
+def _placeholder(name, filters):
+    url = reverse('figure_json', args=[name])
+    if filters:
+        url = f"{url}?{filters.querystring()}"
+    return format_html(
+        '<div class="lazy-figure" data-figure-url="{}"><div class="figure-status">Loading chart&hellip;</div></div>',
+        url,
+    )
+
+
+@lru_cache(maxsize=1)
+def _template_version():
+    # Part of the page ETags, so a deploy that changes the templates isn't
+    # answered with 304s for the old page
+    sources = ''.join(loader.get_template(name).template.source for name in (TEMPLATE, 'base.html'))
+    return hashlib.sha1(sources.encode()).hexdigest()[:12]
+
+
+def _source_version(filters):
+    """``(version, snapshot, last_modified)`` of the data behind a response.
+
+    Unfiltered responses come from the current snapshot when snapshots are
+    enabled (``snapshot`` is None otherwise, and so is ``last_modified``,
+    since the live version also covers the rollup and Transaction tables).
+    ``version`` is None when nothing has been published yet.
+    """
+    if snapshots.ENABLED and not filters:
+        snapshot = snapshots.current(Transactions)
+        if snapshot is None:
+            return None, None, None
+        return snapshot.version, snapshot, datetime.fromisoformat(snapshot.meta['created']).timestamp()
+    with timing.stage('version'):
+        return figures.current_version(Transactions), None, None
+
+
 def dashboard(request):
-    with open(Transactions, "r") as f:
-        total_lines = sum(1 for _ in f)
-
-    # Calculate lines to skip (99% of total)
-    n = total_lines - 1
-    skip_count = int(n * 0.99)
-    skip = sorted(random.sample(range(1, n + 1), skip_count))
-    # Read just 1% of rows randomly
-    df = pd.read_csv(Transactions, skiprows=skip)
-    
-    
-   
-
-    
-    df.rename(columns={
-        'TransactionAmount (INR)': 'TransactionAmount',
-        'CustAccountBalance': 'AccountBalance'
-    }, inplace=True)
-
-   
-    df['TransactionDate'] = pd.to_datetime(df['TransactionDate'])
-    df['TransactionMonth'] = df['TransactionDate'].dt.to_period('M').astype(str) 
-    df['TransactionDayOfWeek'] = df['TransactionDate'].dt.dayofweek
-    df['TransactionHour'] = df['TransactionTime'].str.split(':').str[0].astype(int)
-    df['AccountBalanceChange'] = df.groupby('CustomerID')['AccountBalance'].diff().fillna(0)
-
-    
-   
-    # Top Locations by Transaction Amount
-    transaction_amount_per_location = df.groupby('CustLocation')['TransactionAmount'].sum().reset_index()
-    top_20_transaction_amounts = transaction_amount_per_location.nlargest(20, 'TransactionAmount')
-    fig = px.bar(top_20_transaction_amounts,
-                 x='TransactionAmount',
-                 y='CustLocation',
-                 orientation='h',
-                 color='TransactionAmount',
-                 color_continuous_scale='Blues',
-                 title='Top 20 Customer Locations by Total Transaction Amount',
-                 labels={'TransactionAmount': 'Total Transaction Amount (INR)', 'CustLocation': 'Customer Location'},
-                 height=600)
-    fig.update_layout(plot_bgcolor='white')
-
-    # Top Customers by Transaction Amount
-    top_customers = df.groupby('CustomerID')['TransactionAmount'].sum().nlargest(20).reset_index()
-    fig1 = px.bar(top_customers,
-                 x='CustomerID',
-                 y='TransactionAmount',
-                 title='Top 20 Customers by Total Transaction Amount',
-                 labels={'TransactionAmount': 'Total Transaction Amount (INR)', 'CustomerID': 'Customer ID'},
-                 color='TransactionAmount',
-                 color_continuous_scale='Blues')
-    fig1.update_layout(plot_bgcolor='white', xaxis_tickangle=-45)
-
-    # Temporal Patterns (Filtered for top locations)
-    filtered_df = df[df['CustLocation'].isin(['MUMBAI', 'NEW DELHI', 'DELHI', 'BANGALORE', 'GURGAON'])]
-   
-    # Monthly Transactions
-    month_counts = filtered_df['TransactionMonth'].value_counts().sort_index().reset_index()
-    month_counts.columns = ['Month', 'TotalTransactions']
-    fig_month = px.bar(month_counts, x='Month', y='TotalTransactions',
-                      title='Monthly Transaction Count (Top Locations)',
-                      color='TotalTransactions',
-                      color_continuous_scale='Blues')
-    fig_month.update_layout(plot_bgcolor='white')
-
-    # Daily Transactions
-    day_map = {0: 'Monday', 1: 'Tuesday', 2: 'Wednesday',
-              3: 'Thursday', 4: 'Friday', 5: 'Saturday', 6: 'Sunday'}
-    # filtered_df['DayOfWeek'] = filtered_df['TransactionDayOfWeek'].map(day_map)
-    filtered_df.loc[:, 'DayOfWeek'] = filtered_df['TransactionDayOfWeek'].map(day_map)
-
-    day_counts = filtered_df['DayOfWeek'].value_counts().loc[list(day_map.values())].reset_index()
-    day_counts.columns = ['DayOfWeek', 'TotalTransactions']
-    fig_day = px.bar(day_counts, x='DayOfWeek', y='TotalTransactions',
-                    title='Daily Transaction Pattern (Top Locations)',
-                    color='TotalTransactions',
-                    color_continuous_scale='Blues')
-    fig_day.update_layout(plot_bgcolor='white')
-
-    # Hourly Transactions for top locations
-    hour_counts = filtered_df['TransactionHour'].value_counts().sort_index().reset_index()
-    hour_counts.columns = ['Hour', 'TotalTransactions']
-    fig_hour = px.bar(hour_counts, x='Hour', y='TotalTransactions',
-                     title='Hourly Transaction Pattern (Top Locations)',
-                     color='TotalTransactions',
-                     color_continuous_scale='Blues')
-    fig_hour.update_layout(plot_bgcolor='white')
-
-    # Hourly Transactions (Entire Bank)
-    hour_counts_e = df['TransactionHour'].value_counts().sort_index().reset_index()
-    hour_counts_e.columns = ['Hour', 'TotalTransactions']
-    fig_hour_e = px.bar(hour_counts_e, x='Hour', y='TotalTransactions',
-                       title='Hourly Transaction Pattern (All Locations)',
-                       color='TotalTransactions',
-                       color_continuous_scale='Blues')
-    fig_hour_e.update_layout(plot_bgcolor='white')
-
-    # Peak Hours Analysis
-    peak_hours = list(range(9, 21))  
-    
-    peak_hour_transactions = df[df['TransactionHour'].isin(peak_hours)]
-    peak_hour_balance_change = peak_hour_transactions.groupby('TransactionHour')['AccountBalanceChange'].mean().reset_index()
-    fig_peak_hours = px.bar(peak_hour_balance_change,
-                           x='TransactionHour',
-                           y='AccountBalanceChange',
-                           title='Average Account Balance change During Peak Hours (9AM-9PM)',
-                           color='AccountBalanceChange',
-                           color_continuous_scale='Blues')
-    fig_peak_hours.update_layout(plot_bgcolor='white')
-
-    # Peak Days Analysis
-    peak_day_balance_change = df.groupby('TransactionDayOfWeek')['AccountBalanceChange'].mean().reset_index()
-    peak_day_balance_change['DayOfWeek'] = peak_day_balance_change['TransactionDayOfWeek'].map(day_map)
-    fig_peak_days = px.bar(peak_day_balance_change,
-                          x='DayOfWeek',
-                          y='AccountBalanceChange',
-                          title='Average Account Balance change by Day of Week',
-                          color='AccountBalanceChange',
-                          color_continuous_scale='Blues')
-    fig_peak_days.update_layout(plot_bgcolor='white')
-
-    # Heatmap by Hour and Day
-    peak_hour_day_balance_change = df.groupby(['TransactionHour', 'TransactionDayOfWeek'])['AccountBalanceChange'].mean().reset_index()
-    peak_hour_day_balance_change['DayOfWeek'] = peak_hour_day_balance_change['TransactionDayOfWeek'].map(day_map)
-    fig_peak_hour_day = px.density_heatmap(peak_hour_day_balance_change,
-                                         x='TransactionHour',
-                                         y='DayOfWeek',
-                                         z='AccountBalanceChange',
-                                         title='Account Balance change Heatmap by Hour and Day',
-                                         color_continuous_scale='Blues')
-    fig_peak_hour_day.update_layout(plot_bgcolor='white')
-
-    
-
-    # Calculate metrics for new visualizations
-    customer_stats = df.groupby('CustomerID').agg(
-        TotalTransactions=('TransactionID', 'count'),
-        TotalAmount=('TransactionAmount', 'sum'),
-        AverageTransactionAmount=('TransactionAmount', 'mean'),
-        LastTransactionDate=('TransactionDate', 'max')
-    ).reset_index()
-
-    # Calculate CLV 
-    customer_stats['CLV'] = customer_stats['TotalAmount']
-   
-    # High Value Transactions flag (top 20%)
-    high_value_threshold = customer_stats['TotalAmount'].quantile(0.8)
-    customer_stats['HighValueCustomer'] = (customer_stats['TotalAmount'] >= high_value_threshold).astype(int)
-
-    # Customer Lifetime Value
-    fig_clv = px.bar(customer_stats.nlargest(20, 'CLV'),
-                    x='CustomerID',
-                    y='CLV',
-                    title='Top 20 Customers by Lifetime Value',
-                    color='HighValueCustomer',
-                    color_continuous_scale='Blues')
-    fig_clv.update_layout(plot_bgcolor='white')
-
-    # High Value Transactions Over Time
-    df['HighValueTransaction'] = (df['TransactionAmount'] >= df['TransactionAmount'].quantile(0.9)).astype(int)
-    high_value_monthly = df[df['HighValueTransaction'] == 1].groupby('TransactionMonth')['HighValueTransaction'].count().reset_index()
-    high_value_monthly.columns = ['Month', 'HighValueTransactions']
-    high_value_monthly['Month'] = high_value_monthly['Month'].astype(str)  
-    fig_high_value = px.line(high_value_monthly,
-                            x='Month',
-                            y='HighValueTransactions',
-                            title='High-Value Transactions Over Time',
-                            markers=True)
-    fig_high_value.update_layout(plot_bgcolor='white')
-
-    # High Value Customer Segmentation
-    fig_pie = px.pie(customer_stats,
-                    names='HighValueCustomer',
-                    title='High-Value Customer Segmentation',
-                    color='HighValueCustomer',
-                    color_discrete_map={0: 'lightgray', 1: 'gold'})
-    fig_pie.update_layout(plot_bgcolor='white')
-
-    # Revenue vs Transactions
-    monthly_data = df.groupby('TransactionMonth').agg(
-        TotalRevenue=('TransactionAmount', 'sum'),
-        TotalTransactions=('TransactionID', 'count')
-    ).reset_index()
-    monthly_data['TransactionMonth'] = monthly_data['TransactionMonth'].astype(str)  
-    fig_revenue_transactions = px.line(monthly_data,
-                                     x='TransactionMonth',
-                                     y=['TotalRevenue', 'TotalTransactions'],
-                                     title='Revenue vs Transactions Over Time',
-                                     markers=True)
-    fig_revenue_transactions.update_layout(plot_bgcolor='white')
-
-    # Customer Tenure Analysis
-    df['CustomerTenure'] = (df['TransactionDate'] - df.groupby('CustomerID')['TransactionDate'].transform('min')).dt.days
-    tenure_data = df.groupby('CustomerTenure')['TransactionAmount'].sum().reset_index()
-    fig_tenure_trans = px.line(tenure_data,
-                              x='CustomerTenure',
-                              y='TransactionAmount',
-                              title='Transaction Volume by Customer Tenure')
-    fig_tenure_trans.update_layout(plot_bgcolor='white')
-
-    # Customer Segmentation
-    fig_segmentation = px.scatter(customer_stats,
-                                x='TotalTransactions',
-                                y='AverageTransactionAmount',
-                                size='CLV',
-                                color='HighValueCustomer',
-                                title='Customer Segmentation',
-                                hover_data=['CustomerID'])
-    fig_segmentation.update_layout(plot_bgcolor='white')
-
-    # Age Group Analysis 
-    if 'CustAge' in df.columns:
-        df['AgeGroup'] = pd.cut(df['CustAge'], bins=[0, 25, 40, 55, 100],
-                               labels=['<25', '25-40', '40-55', '55+'])
-        age_data = df.groupby('AgeGroup').agg(
-            AvgTransactionAmount=('TransactionAmount', 'mean'),
-            TotalCustomers=('CustomerID', 'nunique')
-        ).reset_index()
-        fig_age = px.bar(age_data,
-                        x='AgeGroup',
-                        y='AvgTransactionAmount',
-                        title='Average Transaction Amount by Age Group')
-        fig_age.update_layout(plot_bgcolor='white')
-
-    # Convert all figures to HTML
+    try:
+        filters = TransactionFilter.from_request(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
     context = {
-        'fig': fig.to_html(full_html=False),
-        'fig1': fig1.to_html(full_html=False),
-        'fig_month': fig_month.to_html(full_html=False),
-        'fig_day': fig_day.to_html(full_html=False),
-        'fig_hour': fig_hour.to_html(full_html=False),
-        'fig_hour_e': fig_hour_e.to_html(full_html=False),
-        'fig_peak_hours': fig_peak_hours.to_html(full_html=False),
-        'fig_peak_days': fig_peak_days.to_html(full_html=False),
-        'fig_peak_hour_day': fig_peak_hour_day.to_html(full_html=False),
-        'fig_clv': fig_clv.to_html(full_html=False),
-        'fig_high_value': fig_high_value.to_html(full_html=False),
-        'fig_pie': fig_pie.to_html(full_html=False),
-        'fig_revenue_transactions': fig_revenue_transactions.to_html(full_html=False),
-        'fig_tenure_trans': fig_tenure_trans.to_html(full_html=False),
-        'fig_segmentation': fig_segmentation.to_html(full_html=False),
+        'plotlyjs_static': LAZY_CHARTS or figures.PLOTLYJS_MODE == 'static',
+        'filters': filters,
+        # Live updates describe the whole bank, so only unfiltered pages get them
+        'live_updates': live.ENABLED and not filters,
     }
+    params = {**_figure_params(filters), 'template': _template_version(), 'live': context['live_updates']}
+
+    def render_page():
+        with timing.stage('template'):
+            return loader.render_to_string(TEMPLATE, context, request)
+
+    if LAZY_CHARTS:
+        # The shell holds no data, so it only changes with the filters
+        for name in figures.FIGURES:
+            context[name] = _placeholder(name, filters)
+        return precompressed.respond(request, 'shell', 'dashboard', params, render_page, HTML)
+
+    try:
+        version, snapshot, last_modified = _source_version(filters)
+    except columnar.NotBuilt:
+        return snapshots.not_published()
+    if version is None:
+        return snapshots.not_published()
+
+    def build():
+        if snapshot is not None:
+            # Pre-rendered by `manage.py refresh_snapshots`
+            with timing.stage('snapshot'):
+                context.update(snapshot.page('dashboard'))
+            return render_page()
+
+        # Figures are only built (and the data only loaded) on a cache miss;
+        # misses are built concurrently
+        data = figures.DashboardData(Transactions, filters)
+        builds = {
+            name: partial(figure_cache.get_or_build, version, name, partial(figures.to_html, name, data),
+                          _figure_params(filters))
+            for name in figures.FIGURES
+        }
+        with timing.stage('figures'):
+            rendered, _ = scheduler.run(builds)
+        for name, html in rendered.items():
+            if html:
+                context[name] = html
+        return render_page()
+
+    try:
+        return precompressed.respond(request, version, 'dashboard', params, build, HTML, last_modified)
+    except columnar.NotBuilt:
+        return snapshots.not_published()
+
+
+def figure_json(request, name):
+    """Plotly figure spec (``data`` and ``layout``) for a single chart."""
+    if name not in figures.FIGURES:
+        raise Http404(f"Unknown figure {name!r}")
+    try:
+        filters = TransactionFilter.from_request(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    try:
+        version, snapshot, last_modified = _source_version(filters)
+    except columnar.NotBuilt:
+        return snapshots.not_published()
+    if version is None:
+        return snapshots.not_published()
+
+    def build():
+        if snapshot is not None:
+            with timing.stage('snapshot'):
+                return snapshot.read('dashboard', f'{name}.json')
+        return figures.to_json(name, figures.DashboardData(Transactions, filters))
+
+    try:
+        response = precompressed.respond(request, version, f'{name}.json', _figure_params(filters), build,
+                                         'application/json', last_modified)
+    except columnar.NotBuilt:
+        return snapshots.not_published()
+    if response.status_code == 200 and not response.content:
+        raise Http404(f"No data for figure {name!r}")
+    return response
+
+
+def _stream_placeholder(name):
+    return format_html(
+        '<div class="streamed-figure" data-figure="{}"><div class="figure-status">Loading chart&hellip;</div></div>',
+        name,
+    )
+
+
+def _figure_script(name, spec='', failed=False):
+    # '<' is escaped (it only occurs inside JSON strings) so the spec can't
+    # close the script element
+    payload = (spec or 'null').replace('<', '\\u003c')
+    return f'<script>showStreamedFigure({json.dumps(name)}, {payload}, {json.dumps(failed)});</script>\n'
+
+
+def _build_in_thread(build, name):
+    try:
+        return build(name)
+    finally:
+        # Executor threads get their own database connections; don't leak them
+        connections.close_all()
+
+
+async def _stream_page(head, tail, build):
+    loop = asyncio.get_running_loop()
+    yield head
+    # Each build runs in a copy of the request's context (see scheduler.run)
+    pending = {
+        loop.run_in_executor(_stream_executor, contextvars.copy_context().run, _build_in_thread, build, name): name
+        for name in figures.FIGURES
+    }
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    spec = future.result()
+                except Exception:
+                    logger.exception("Failed to build %s for a streamed dashboard", name)
+                    yield _figure_script(name, failed=True)
+                else:
+                    yield _figure_script(name, spec)
+        yield tail
+    finally:
+        # The client went away: drop the builds that haven't started
+        for future in pending:
+            future.cancel()
+
+
+async def dashboard_stream(request):
+    """``dashboard``, streamed: the page at once, then each chart as it's ready.
+
+    The shell (filters, KPI cards and a placeholder per chart) is sent
+    before any figure is built. The figures are built in
+    ``_stream_executor`` threads and each is sent, in the order they finish,
+    as a script that draws it, so a slow chart holds up only itself.
+    """
+    try:
+        filters = TransactionFilter.from_request(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    try:
+        version, snapshot, last_modified = await sync_to_async(_source_version)(filters)
+    except columnar.NotBuilt:
+        return snapshots.not_published()
+    if version is None:
+        return snapshots.not_published()
+    params = {**_figure_params(filters), 'template': _template_version(), 'live': live.ENABLED and not filters}
+    tag = precompressed.etag(version, 'dashboard.stream', params)
+    response = get_conditional_response(request, etag=tag, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    context = {'plotlyjs_static': True, 'filters': filters, 'live_updates': params['live']}
+    for name in figures.FIGURES:
+        context[name] = _stream_placeholder(name)
+    page = await sync_to_async(loader.render_to_string)(TEMPLATE, context, request)
+    # Chart scripts go at the end of the body, after the page's own scripts
+    split = page.rfind('</body>')
+    if split < 0:
+        split = len(page)
+
+    if snapshot is not None:
+        def build(name):
+            return snapshot.read('dashboard', f'{name}.json')
+    else:
+        data = figures.DashboardData(Transactions, filters)
+
+        def build(name):
+            return figure_cache.get_or_build(version, f'{name}.json', partial(figures.to_json, name, data),
+                                             _figure_params(filters))
+
+    response = StreamingHttpResponse(_stream_page(page[:split], page[split:], build), content_type=HTML)
+    response['ETag'] = tag
+    # Ask proxies (nginx) to pass each chunk on as it comes
+    response['X-Accel-Buffering'] = 'no'
+    patch_cache_control(response, no_cache=True)
+    return response
 
-   
-    if 'CustAge' in df.columns:
-        context['fig_age'] = fig_age.to_html(full_html=False)
 
-    return render(request, 'visualization/plotly_chart.html', context)
\ No newline at end of file
+def location_options(request):
+    """Location search for the filter box, in select2's ``results`` format."""
+    term = request.GET.get('q', '').strip().upper()
+    try:
+        locations = columnar.distinct_values(columnar.LOCATION_COLUMN, source=Transactions)
+    except columnar.NotBuilt:
+        return snapshots.not_published()
+    if term:
+        locations = locations[np.char.find(np.char.upper(locations), term) >= 0]
+    return JsonResponse({'results': [{'id': location, 'text': location} for location in locations[:50].tolist()]})
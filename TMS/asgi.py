@@ -13,4 +13,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TMS.settings')
 
-application = get_asgi_application()
+# Set up Django before importing the consumers, which use the models
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.security.websocket import AllowedHostsOriginValidator  # noqa: E402
+
+from Dash.routing import websocket_urlpatterns  # noqa: E402
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+    # Live dashboard updates (see Dash.live)
+    'websocket': AllowedHostsOriginValidator(URLRouter(websocket_urlpatterns)),
+})
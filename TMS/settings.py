@@ -49,6 +49,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'Dash.timing.ServerTimingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -57,7 +58,15 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
    
 ]
-STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    # Fingerprinted, precompressed static assets served by whitenoise
+    "staticfiles": {
+        "BACKEND": "TMS.storage.StaticFilesStorage",
+    },
+}
 ROOT_URLCONF = 'TMS.urls'
 
 TEMPLATES = [
@@ -77,6 +86,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'TMS.wsgi.application'
+ASGI_APPLICATION = 'TMS.asgi.application'
 
 
 # Database
@@ -90,6 +100,26 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Serialised dashboard figures: LRU-evicted past MAX_ENTRIES, expired after TIMEOUT seconds
+    'figures': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'dashboard-figures',
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 256,
+            'CULL_FREQUENCY': 8,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -135,3 +165,61 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+
+# strftime format of the dates in the transactions file, used to parse them
+# as the file is read rather than guessing per value
+TRANSACTION_DATE_FORMAT = '%d/%m/%y'
+
+# Dashboard row sampling: fraction of transactions kept per request and the
+# seed used to pick them (None draws a fresh sample on every request)
+DASHBOARD_SAMPLE_RATE = 0.01
+DASHBOARD_SAMPLE_SEED = 42
+
+# How dashboard charts get plotly.js: 'static' loads js/plotly.min.js once per
+# page, 'inline' embeds the full library in every chart
+DASHBOARD_PLOTLYJS = 'static'
+
+# Render the dashboard as a page shell and fetch each chart's JSON from
+# /tms/api/figures/<name>/ when it scrolls into view
+DASHBOARD_LAZY_CHARTS = True
+
+# Threads used to build the charts of a (non-lazy) dashboard page
+# concurrently; 1 builds them one after another
+DASHBOARD_FIGURE_WORKERS = 4
+
+# Processes used for full-file aggregation (`refresh_rollups --rebuild`);
+# None uses every core
+AGGREGATION_WORKERS = None
+
+# Serve the dashboards only from snapshots published by
+# `manage.py refresh_snapshots --interval N`, so requests never read the CSV
+DASHBOARD_SNAPSHOTS = False
+
+# Customers above which the segmentation chart is binned into a grid (plus the
+# top customers by CLV) instead of drawing one marker per customer
+DASHBOARD_SEGMENTATION_MAX_POINTS = 2000
+
+# Time each stage of dashboard requests: Server-Timing response headers plus
+# per-stage latency histograms at /metrics (Prometheus text format)
+DASHBOARD_TIMING = False
+
+# How often (seconds) open StaffDashboard pages check the workbook for changes
+STAFF_DASHBOARD_REFRESH_SECONDS = 60
+
+# Push chart updates to open (unfiltered) dashboard pages over a WebSocket as
+# rollup refreshes append transactions; needs the ASGI application
+DASHBOARD_LIVE_UPDATES = False
+
+# Carries live dashboard updates from the refresh commands to the web server.
+# The in-memory layer only works within one process; for separate processes
+# use a shared layer such as channels_redis.core.RedisChannelLayer
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    },
+}
+
+# Seconds a web process trusts the data version it last recorded. Refreshes
+# drop it straight away from a shared cache; with local-memory caches, pages
+# see a refresh made by another process after at most this long
+DASHBOARD_VERSION_TIMEOUT = 60
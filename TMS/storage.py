@@ -0,0 +1,13 @@
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class StaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """Compressed, fingerprinted static files.
+
+    Vendored JS bundles (popper, plotly) point at source maps we don't ship,
+    so only CSS references are rewritten during post-processing.
+    """
+    patterns = tuple(
+        (extension, rules) for extension, rules in CompressedManifestStaticFilesStorage.patterns
+        if extension != '*.js'
+    )